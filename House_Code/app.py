@@ -1,98 +1,324 @@
+import gzip
+import hashlib
 import os
-from flask import Flask, render_template, send_from_directory
-from dotenv import load_dotenv
+import sys
+import threading
+from flask import Flask, make_response, render_template, request
+
+from asset_manifest import (IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL, build_asset_manifest,
+                            chapters_with_urls, layer_load_manifest, layers_with_urls, parse_fingerprint,
+                            preload_link_header, preload_urls)
+from asset_store import AssetStore, LRUCache, content_type_for
+import metrics
+from site_data import CHAPTERS, LAYERS, normalize_layer_ids
+from svg_compose import compose_layers, inline_layers
+from svg_index import layer_element_indexes
+from svg_optimize import svg_transform
+from render_pipeline import page_pipeline
+from template_cache import bytecode_cache
+
+try:
+    import brotli
+except ImportError:
+    # Brotli is optional; without it we only keep the gzip variant
+    brotli = None
 
 # Load environment variables from the root .env file
-# This will look for .env in the parent directory from where the app is running
-load_dotenv(dotenv_path='../.env')
+# This will look for .env in the parent directory from where the app is running.
+# Containers get their settings from the environment, so dotenv is only
+# imported when there is a file to read.
+if os.path.exists('../.env'):
+    from dotenv import load_dotenv
+    load_dotenv(dotenv_path='../.env')
 
 app = Flask(__name__)
 
+# Compiled templates come from the cache generate_static_site.py shares,
+# so a fresh worker or container doesn't compile index.html again
+app.jinja_options = dict(app.jinja_options, bytecode_cache=bytecode_cache())
+
+# Latency histograms, Server-Timing headers and /metrics; HOUSE_METRICS=0 turns them off
+metrics.init_app(app)
+
+# SVG and image assets, packed once at startup. static/svg takes
+# precedence over the shared _svg_assets directory. SVGs are minified the
+# same way generate_static_site.py does it, so dev and production match;
+# set OPTIMIZE_SVG=0 to serve them as authored.
+SVG_SOURCE_DIRS = [
+    os.path.join(app.root_path, 'static', 'svg'),
+    os.path.join(app.root_path, '..', '_svg_assets')
+]
+asset_store = AssetStore(
+    SVG_SOURCE_DIRS,
+    pack_path=os.getenv('ASSET_PACK_PATH'),
+    transform=svg_transform() if os.getenv('OPTIMIZE_SVG', '1') != '0' else None)
+
+# Fingerprinted names (house-structure.<hash>.svg) for the packed assets,
+# matching the ones generate_static_site.py writes
+asset_manifest = build_asset_manifest({name: asset_store.digest(name) for name in asset_store.index})
+
+# Layer URLs for the page. The layers visible on first paint are inlined
+# into the HTML; the page fetches the others the first time they are shown,
+# using the load manifest. A default layer that can't be inlined gets a
+# <link rel="preload"> in the page's head, as in the static build, and the
+# same hint as a Link header (and as 103 Early Hints when the server
+# supports them) so its fetch starts before the HTML arrives.
+index_layers = layers_with_urls(LAYERS, asset_manifest, '/svg/')
+INDEX_INLINE_LAYERS = inline_layers(index_layers, asset_store.get)
+INDEX_LAYER_MANIFEST = layer_load_manifest(index_layers, INDEX_INLINE_LAYERS)
+INDEX_PRELOAD_URLS = preload_urls(index_layers, INDEX_INLINE_LAYERS)
+INDEX_PRELOAD_LINK = preload_link_header(INDEX_PRELOAD_URLS)
+
+# Preset buttons load the chapter's composed SVG, /svg/compose/<preset>.svg,
+# the same path the static build writes
+index_chapters = chapters_with_urls(CHAPTERS, '/svg/')
+CHAPTERS_BY_PRESET = {chapter['preset']: chapter for chapter in CHAPTERS}
+
+# Element index of each packed layer (ids, classes, hierarchy, text and
+# bounding boxes) as (JSON body, ETag), so the page can hit-test and search
+# labels without walking the layer documents
+LAYER_ELEMENT_INDEXES = {layer_id: (body, hashlib.sha256(body).hexdigest()[:32])
+                         for layer_id, body in layer_element_indexes(LAYERS, asset_store.get).items()}
+
+# Placeholder bodies for names that aren't in the pack
+_placeholder_cache = LRUCache(maxsize=256)
+
+# Composed layer documents, keyed on the layer set and the source hashes.
+# Seven layers give at most 127 distinct sets.
+_compose_cache = LRUCache(maxsize=128)
+
+# Rendered index page, keyed on (template mtime, GitHub config).
+# The page only changes when one of those does, so it is rendered once
+# and the identity, gzip and brotli bodies are reused for every request.
+_index_cache = {}
+_index_cache_lock = threading.Lock()
+
+# MINIFY_HTML=1 minifies the page (with its inline CSS and JS) before it is
+# cached, using the same pipeline as generate_static_site.py.
+PAGE_TRANSFORM = page_pipeline(minify=True) if os.getenv('MINIFY_HTML', '0') == '1' else None
+
+def get_github_config():
+    """Return (github_username, repo_name, github_pages_url) from the environment"""
+    github_username = os.getenv('GITHUB_USERNAME', 'your-username')
+    repo_name = os.getenv('REPO_NAME', 'your-repo-name')
+    github_pages_url = os.getenv('GITHUB_PAGES_URL', f'https://{github_username}.github.io/{repo_name}')
+    return github_username, repo_name, github_pages_url
+
+def _template_mtime(template_name):
+    """Modification time of a template, or None if it can't be found"""
+    path = os.path.join(app.root_path, app.template_folder, template_name)
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def _compress_variants(body):
+    """Build the encoded bodies we can offer for Accept-Encoding negotiation"""
+    variants = {'identity': body, 'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(body, quality=11)
+    return variants
+
+def _index_context():
+    """Return (cache key, template context) for the index page"""
+    github_username, repo_name, github_pages_url = get_github_config()
+    key = (_template_mtime('index.html'), github_username, repo_name, github_pages_url)
+    context = {
+        'layers': index_layers,
+        'inline_layers': INDEX_INLINE_LAYERS,
+        'layer_manifest': INDEX_LAYER_MANIFEST,
+        'preload_urls': INDEX_PRELOAD_URLS,
+        'chapters': index_chapters,
+        'github_username': github_username,
+        'repo_name': repo_name,
+        'github_pages_url': github_pages_url
+    }
+    return key, context
+
+def _store_index_page(key, body):
+    """Cache a rendered index body with its ETag and compressed variants"""
+    with metrics.phase('compress'):
+        variants = _compress_variants(body)
+    entry = {
+        'etag': hashlib.sha256(body).hexdigest()[:32],
+        'variants': variants
+    }
+    # Only the current key is ever requested again
+    _index_cache.clear()
+    _index_cache[key] = entry
+    return entry
+
+def get_index_page():
+    """Return the cached index page entry, rendering it if the key changed"""
+    key, context = _index_context()
+    
+    entry = _index_cache.get(key)
+    if entry is None:
+        with _index_cache_lock:
+            entry = _index_cache.get(key)
+            if entry is None:
+                with metrics.phase('render'):
+                    body = render_template('index.html', **context)
+                if PAGE_TRANSFORM is not None:
+                    with metrics.phase('minify'):
+                        body = PAGE_TRANSFORM(body)
+                entry = _store_index_page(key, body.encode('utf-8'))
+    return entry
+
 @app.route('/')
 def index():
-    # Layer information
-    layers = [
-        {"id": "environment-layer", "name": "Environment", "default": True},
-        {"id": "house-structure", "name": "House Structure", "default": True},
-        {"id": "html-tags-layer", "name": "HTML Tags", "default": False},
-        {"id": "structure-layer", "name": "HTML Structure", "default": False},
-        {"id": "css-design-layer", "name": "CSS Design", "default": False},
-        {"id": "interactive-layer", "name": "JavaScript Interactivity", "default": False},
-        {"id": "systems-layer", "name": "Backend Systems", "default": False}
-    ]
+    # 103 Early Hints, for servers that expose them to WSGI apps
+    send_early_hints = request.environ.get('wsgi.early_hints')
+    if send_early_hints is not None and INDEX_PRELOAD_LINK:
+        send_early_hints([('Link', INDEX_PRELOAD_LINK)])
     
-    # Chapter presets
-    chapters = [
-        {
-            "name": "Base House",
-            "preset": "base",
-            "description": "The complete house with all visual elements",
-            "layers": ["environment-layer", "house-structure"]
-        },
-        {
-            "name": "Chapter 1: HTML Tags",
-            "preset": "html-tags",
-            "description": "The blueprint layer showing HTML tags",
-            "layers": ["environment-layer", "house-structure", "html-tags-layer"]
-        },
-        {
-            "name": "Chapter 2: HTML Structure",
-            "preset": "html-structure",
-            "description": "The structural framing of the house",
-            "layers": ["environment-layer", "structure-layer"]
-        },
-        {
-            "name": "Chapter 3: CSS Design",
-            "preset": "css-design",
-            "description": "The design layer with visual styling",
-            "layers": ["environment-layer", "house-structure", "css-design-layer"]
-        },
-        {
-            "name": "Chapter 4: JavaScript",
-            "preset": "javascript",
-            "description": "The interactive elements that respond to events",
-            "layers": ["environment-layer", "house-structure", "interactive-layer"]
-        },
-        {
-            "name": "Chapter 5: Backend",
-            "preset": "backend",
-            "description": "The internal systems that power the house",
-            "layers": ["environment-layer", "house-structure", "systems-layer"]
-        }
-    ]
+    # The page isn't streamed: a miss renders into the cache first, so every
+    # response has its ETag and precompressed variants. Rendering happens
+    # once per template or config change, and the hints above already let
+    # the browser start on the layers before the body arrives.
+    with metrics.phase('lookup'):
+        key, _ = _index_context()
+        page = _index_cache.get(key)
+    if page is None:
+        page = get_index_page()
+    variants = page['variants']
     
-    # Access environment variables to display GitHub info if needed
-    github_username = os.getenv('GITHUB_USERNAME', 'your-username')
-    repo_name = os.getenv('REPO_NAME', 'your-repo-name')
-    github_pages_url = os.getenv('GITHUB_PAGES_URL', f'https://{github_username}.github.io/{repo_name}')
+    # Prefer brotli, then gzip, then the plain body
+    encoding = request.accept_encodings.best_match(
+        [name for name in ('br', 'gzip', 'identity') if name in variants],
+        default='identity')
+    
+    response = make_response(variants[encoding])
+    response.content_type = 'text/html; charset=utf-8'
+    response.vary.add('Accept-Encoding')
+    # The page names the current fingerprinted assets, so it must revalidate
+    response.headers['Cache-Control'] = REVALIDATE_CACHE_CONTROL
+    if INDEX_PRELOAD_LINK:
+        response.headers['Link'] = INDEX_PRELOAD_LINK
+    
+    # Each encoding is a different representation, so it gets its own strong ETag
+    etag = page['etag']
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+        etag = f"{etag}-{encoding}"
+    response.set_etag(etag)
+    
+    # Answers If-None-Match with a bodiless 304
+    return response.make_conditional(request)
+
+def _composed_response(layer_ids):
+    """Response with ``layer_ids`` (canonical order) merged into one SVG, cached per layer set"""
+    filenames = [f'{layer_id}.svg' for layer_id in layer_ids]
+    key = (layer_ids, tuple(asset_store.digest(filename) for filename in filenames))
+    
+    with metrics.phase('lookup'):
+        entry = _compose_cache.get(key)
+    if entry is None:
+        with metrics.phase('compose'):
+            sources = []
+            for layer_id, filename in zip(layer_ids, filenames):
+                body = asset_store.get(filename)
+                sources.append((layer_id, bytes(body) if body is not None else _placeholder(filename)))
+            body = compose_layers(sources)
+            entry = (body, hashlib.sha256(body).hexdigest()[:32])
+        _compose_cache.put(key, entry)
+    
+    body, etag = entry
+    response = app.response_class(body, content_type='image/svg+xml')
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
+@app.route('/svg/compose')
+def compose_svg():
+    """Merge the requested layers into one SVG, e.g. ?layers=environment-layer,house-structure"""
+    try:
+        layer_ids = normalize_layer_ids(request.args.get('layers', '').split(','))
+    except ValueError as e:
+        return str(e), 400, {'Content-Type': 'text/plain; charset=utf-8'}
+    if not layer_ids:
+        return 'No layers requested', 400, {'Content-Type': 'text/plain; charset=utf-8'}
+    return _composed_response(layer_ids)
+
+@app.route('/svg/compose/<preset>.svg')
+def compose_chapter_svg(preset):
+    """A chapter's layers merged into one SVG, at the same path as the static build's file"""
+    chapter = CHAPTERS_BY_PRESET.get(preset)
+    if chapter is None:
+        return f'Unknown chapter: {preset}', 404, {'Content-Type': 'text/plain; charset=utf-8'}
+    return _composed_response(normalize_layer_ids(chapter['layers']))
+
+@app.route('/api/layers/<layer_id>/elements')
+@app.route('/api/layers/<layer_id>/elements.json')
+def layer_elements(layer_id):
+    """Element index of one layer; the .json name matches the static build's file"""
+    entry = LAYER_ELEMENT_INDEXES.get(layer_id)
+    if entry is None:
+        return f'Unknown layer: {layer_id}', 404, {'Content-Type': 'text/plain; charset=utf-8'}
     
-    return render_template('index.html', 
-                          layers=layers, 
-                          chapters=chapters,
-                          github_username=github_username,
-                          repo_name=repo_name,
-                          github_pages_url=github_pages_url)
+    body, etag = entry
+    response = app.response_class(body, content_type='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = REVALIDATE_CACHE_CONTROL
+    return response.make_conditional(request)
 
 @app.route('/svg/<path:filename>')
 def serve_svg(filename):
-    # First try to look in static/svg
-    try:
-        return send_from_directory('static/svg', filename)
-    except:
-        # If not found, try to get from _svg_assets
-        try:
-            return send_from_directory('../_svg_assets', filename)
-        except:
-            # Return a placeholder SVG if all else fails
-            return f'''
+    with metrics.phase('lookup'):
+        content_type = content_type_for(filename)
+        body = asset_store.get(filename) if content_type else None
+        cache_control = REVALIDATE_CACHE_CONTROL
+        
+        if body is None and content_type:
+            # Fingerprinted names can be cached forever while the hash matches.
+            # An outdated hash still gets the current content, but must revalidate.
+            fingerprint = parse_fingerprint(filename)
+            if fingerprint and fingerprint[0] in asset_store:
+                filename = fingerprint[0]
+                body = asset_store.get(filename)
+                if asset_store.digest(filename).startswith(fingerprint[1]):
+                    cache_control = IMMUTABLE_CACHE_CONTROL
+    
+    if body is None:
+        # Return a placeholder SVG if the asset isn't in the pack
+        metrics.count_svg(filename, 'miss')
+        with metrics.phase('placeholder'):
+            placeholder = _placeholder(filename)
+        return placeholder, 200, {'Content-Type': 'image/svg+xml'}
+    
+    # Files from the shared _svg_assets directory are the fallback hits
+    metrics.count_svg(filename, 'hit' if asset_store.sources[filename] == 0 else 'fallback')
+    
+    # The pack hands out memoryviews, but WSGI servers only accept bytes
+    response = app.response_class(content_type=content_type)
+    response.set_data(bytes(body))
+    response.set_etag(asset_store.digest(filename)[:32])
+    response.headers['Cache-Control'] = cache_control
+    return response.make_conditional(request)
+
+def _placeholder(filename):
+    """Placeholder SVG bytes, remembered per name so repeated probes stay in memory"""
+    placeholder = _placeholder_cache.get(filename)
+    if placeholder is None:
+        placeholder = _placeholder_svg(filename).encode('utf-8')
+        _placeholder_cache.put(filename, placeholder)
+    return placeholder
+
+def _placeholder_svg(filename):
+    return f'''
             <svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 800 600">
               <rect width="800" height="600" fill="none" stroke="#ccc" stroke-width="1"/>
               <text x="400" y="300" font-family="Arial" font-size="24" text-anchor="middle" fill="#999">
                 {filename} (not found)
               </text>
             </svg>
-            ''', 200, {'Content-Type': 'image/svg+xml'}
+            '''
 
 if __name__ == '__main__':
+    # `python app.py serve` or SERVER_MODE=production runs the multi-worker
+    # production server (see serve.py); anything else is the dev server
+    if sys.argv[1:2] == ['serve'] or os.getenv('SERVER_MODE') == 'production':
+        from serve import main
+        sys.exit(main(sys.argv[2:] if sys.argv[1:2] == ['serve'] else [], application=app))
+    
     # Listen on all interfaces so the container is accessible externally
     app.run(debug=True, host='0.0.0.0')
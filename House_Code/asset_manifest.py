@@ -0,0 +1,66 @@
+"""
+Content-hash fingerprinted asset names, shared by app.py and the generator.
+
+A fingerprinted name embeds a prefix of the file's sha256, e.g.
+house-structure.svg -> house-structure.3fa9c1d2.svg, so its URL changes
+whenever the content does and responses can be cached forever.
+"""
+import os
+import re
+
+FINGERPRINT_LENGTH = 8
+
+# Cache-Control for fingerprinted URLs and for everything that must revalidate
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+_FINGERPRINTED = re.compile(r'^(?P<stem>.+)\.(?P<hash>[0-9a-f]{%d})(?P<ext>\.[A-Za-z0-9]+)$' % FINGERPRINT_LENGTH)
+
+def fingerprint_name(name, digest):
+    """house-structure.svg + sha256 -> house-structure.<hash>.svg"""
+    stem, ext = os.path.splitext(name)
+    return f'{stem}.{digest[:FINGERPRINT_LENGTH]}{ext}'
+
+def parse_fingerprint(name):
+    """Split a fingerprinted name into (original name, hash), or None if it isn't one"""
+    match = _FINGERPRINTED.match(name)
+    if match is None:
+        return None
+    return match.group('stem') + match.group('ext'), match.group('hash')
+
+def build_asset_manifest(digests):
+    """Map each asset name to its fingerprinted name, given {name: sha256}"""
+    return {name: fingerprint_name(name, digest) for name, digest in sorted(digests.items()) if digest}
+
+def layers_with_urls(layers, manifest, prefix):
+    """
+    Copy of ``layers`` with a ``url`` for each layer's SVG, fingerprinted
+    when the manifest knows the file (prefix is '/svg/' or 'svg/').
+    """
+    result = []
+    for layer in layers:
+        filename = f"{layer['id']}.svg"
+        result.append(dict(layer, url=prefix + manifest.get(filename, filename)))
+    return result
+
+def chapters_with_urls(chapters, prefix):
+    """
+    Copy of ``chapters`` with a ``url`` for each chapter's composed SVG,
+    compose/<preset>.svg under the same prefix as the layers.
+    """
+    return [dict(chapter, url=f"{prefix}compose/{chapter['preset']}.svg") for chapter in chapters]
+
+def preload_urls(layers, inlined=()):
+    """URLs of the layers visible on first paint, in drawing order, except the ``inlined`` ones"""
+    return [layer['url'] for layer in layers if layer.get('default') and layer['id'] not in inlined]
+
+def layer_load_manifest(layers, inlined=()):
+    """
+    {layer id: {url, inline}} telling the page which layers arrived inline
+    with the HTML and where to fetch the others when they are first shown.
+    """
+    return {layer['id']: {'url': layer['url'], 'inline': layer['id'] in inlined} for layer in layers}
+
+def preload_link_header(urls):
+    """Link header value hinting the browser to fetch ``urls`` as SVG images"""
+    return ', '.join(f'<{url}>; rel=preload; as=image; type="image/svg+xml"' for url in urls)
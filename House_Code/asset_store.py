@@ -0,0 +1,166 @@
+"""
+Memory-mapped asset pack for the layer SVGs and images.
+
+All servable files from the asset directories are concatenated into a
+single pack file when the app starts, and the pack is mapped read-only.
+Every worker process maps the same file, so the bytes live once in the
+OS page cache no matter how many workers are running.
+"""
+import hashlib
+import mmap
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+# Files that can be served from the asset directories
+CONTENT_TYPES = {
+    '.svg': 'image/svg+xml',
+    '.png': 'image/png',
+}
+
+class LRUCache:
+    """Small thread-safe mapping that forgets the least recently used entries"""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+def content_type_for(name):
+    """Return the Content-Type for an asset name, or None if it isn't servable"""
+    return CONTENT_TYPES.get(os.path.splitext(name)[1].lower())
+
+def collect_assets(source_dirs):
+    """
+    Map asset names to file paths. Earlier directories win over later ones,
+    the same precedence serve_svg has always used.
+    """
+    files = {}
+    for source_dir in source_dirs:
+        if not os.path.isdir(source_dir):
+            continue
+        for filename in sorted(os.listdir(source_dir)):
+            if filename in files or content_type_for(filename) is None:
+                continue
+            path = os.path.join(source_dir, filename)
+            if os.path.isfile(path):
+                files[filename] = path
+    return files
+
+class AssetStore:
+    """
+    Read-only store serving asset bytes straight out of a shared mmap.
+
+    ``index`` maps each asset name to ``(offset, length, sha256)`` inside
+    the pack, so a lookup is a single dict access with no filesystem work.
+    ``sources`` maps each name to the position of the directory it came from.
+    ``transform(name, data)``, if given, rewrites each file before packing.
+    """
+
+    def __init__(self, source_dirs, pack_path=None, transform=None):
+        self.source_dirs = list(source_dirs)
+        self.pack_path = pack_path
+        self.transform = transform
+        self.index = {}
+        self.sources = {}
+        self._mmap = None
+        self._view = memoryview(b'')
+        self.build()
+
+    def build(self):
+        """Pack the current contents of the source directories and map the pack"""
+        files = collect_assets(self.source_dirs)
+
+        index = {}
+        blobs = []
+        offset = 0
+        for name in sorted(files):
+            with open(files[name], 'rb') as f:
+                data = f.read()
+            if self.transform is not None:
+                data = self.transform(name, data)
+            index[name] = (offset, len(data), hashlib.sha256(data).hexdigest())
+            blobs.append(data)
+            offset += len(data)
+        payload = b''.join(blobs)
+
+        # Name the pack after its contents so every worker that builds the
+        # same assets ends up mapping the very same file
+        pack_path = self.pack_path
+        if pack_path is None:
+            digest = hashlib.sha256(payload).hexdigest()[:16]
+            pack_path = os.path.join(tempfile.gettempdir(), f'house-code-assets-{digest}.pack')
+        _write_pack(pack_path, payload)
+
+        # A previous mapping stays alive until the last view into it is gone
+        mapped = None
+        if payload:
+            with open(pack_path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._mmap = mapped
+        self._view = memoryview(mapped) if mapped is not None else memoryview(b'')
+        self.index = index
+        positions = {os.path.normpath(source_dir): i for i, source_dir in enumerate(self.source_dirs)}
+        self.sources = {name: positions[os.path.normpath(os.path.dirname(path))] for name, path in files.items()}
+        self.path = pack_path
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def get(self, name):
+        """Return a zero-copy memoryview of an asset, or None if it isn't packed"""
+        entry = self.index.get(name)
+        if entry is None:
+            return None
+        offset, length, _ = entry
+        return self._view[offset:offset + length]
+
+    def digest(self, name):
+        """Return the sha256 hex digest of an asset, or None if it isn't packed"""
+        entry = self.index.get(name)
+        return entry[2] if entry else None
+
+def _write_pack(pack_path, payload):
+    """Write the pack atomically, leaving an identical existing pack alone"""
+    if os.path.exists(pack_path) and os.path.getsize(pack_path) == len(payload):
+        with open(pack_path, 'rb') as f:
+            if f.read() == payload:
+                return
+
+    directory = os.path.dirname(pack_path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        os.chmod(temp_path, 0o644)
+        # Readers that already mapped the old pack keep their inode
+        os.replace(temp_path, pack_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the Flask routes and the static site generator.
+
+    python benchmark.py micro                      # route and build timings
+    python benchmark.py load --browsers 20         # concurrent page loads
+    python benchmark.py all --save                 # record a baseline
+    python benchmark.py all --compare              # fail on regressions
+    python benchmark.py startup                    # cold start, against startup_budgets.json
+
+Everything runs on this machine: the load test serves the app on
+127.0.0.1 with werkzeug's threaded server, so no network is needed.
+Baselines are JSON files; --compare exits 1 when a result is slower than
+the baseline by more than the threshold (25% unless the baseline file
+sets its own in "thresholds").
+"""
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import math
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE_PATH = os.path.join(CURRENT_DIR, 'benchmark_baseline.json')
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_STARTUP_BUDGETS_PATH = os.path.join(CURRENT_DIR, 'startup_budgets.json')
+
+# Run in a fresh interpreter per measurement: prints the duration of each
+# startup phase, in the order a new worker or build goes through them
+_STARTUP_SCRIPTS = {
+    'app': """
+import json, time
+start = time.perf_counter()
+timings = {}
+import flask
+timings['import'] = time.perf_counter() - start
+import app
+timings['config'] = time.perf_counter() - start - sum(timings.values())
+app.app.jinja_env.get_template('index.html')
+timings['template_compile'] = time.perf_counter() - start - sum(timings.values())
+response = app.app.test_client().get('/', headers={'Accept-Encoding': 'br, gzip'})
+response.get_data()
+timings['first_request'] = time.perf_counter() - start - sum(timings.values())
+print(json.dumps(timings))
+""",
+    'generator': """
+import json, time
+start = time.perf_counter()
+timings = {}
+import generate_static_site
+timings['import'] = time.perf_counter() - start
+generate_static_site.load_template(generate_static_site.find_templates_dir())
+timings['template_compile'] = time.perf_counter() - start - sum(timings.values())
+print(json.dumps(timings))
+""",
+}
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of ``values`` (fraction in 0..1)"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+def summarize(timings):
+    """Millisecond summary of a list of durations in seconds"""
+    timings_ms = [timing * 1000 for timing in timings]
+    return {
+        'runs': len(timings_ms),
+        'min_ms': round(min(timings_ms), 4),
+        'median_ms': round(statistics.median(timings_ms), 4),
+        'p95_ms': round(percentile(timings_ms, 0.95), 4),
+    }
+
+def time_calls(func, repeat, warmup=1):
+    """Call func() warmup + repeat times; return the timed durations in seconds"""
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def _get(client, path, **kwargs):
+    response = client.get(path, **kwargs)
+    response.get_data()
+    response.close()
+    if response.status_code >= 400:
+        raise RuntimeError(f"GET {path} returned {response.status_code}")
+    return response
+
+def route_benchmarks(repeat=200):
+    """Time the index page and SVG routes through the Flask test client"""
+    import app as app_module
+
+    client = app_module.app.test_client()
+    layer_url = app_module.index_layers[1]['url']
+    compose_url = '/svg/compose?layers=environment-layer,house-structure,css-design-layer'
+    misses = iter(range(10 ** 9))
+
+    def render_index():
+        app_module._index_cache.clear()
+        with app_module.app.test_request_context('/'):
+            app_module.get_index_page()
+
+    benchmarks = {
+        'index_cached': lambda: _get(client, '/', headers={'Accept-Encoding': 'br, gzip'}),
+        'index_render': render_index,
+        'svg_hit': lambda: _get(client, '/svg/house-structure.svg'),
+        'svg_fingerprinted_hit': lambda: _get(client, layer_url),
+        # Only in ../_svg_assets, behind the static/svg directory
+        'svg_fallback_hit': lambda: _get(client, '/svg/houseCodePrints.png'),
+        # A new name each time, so the placeholder is built rather than cached
+        'svg_miss': lambda: _get(client, f'/svg/missing-{next(misses)}.svg'),
+        'svg_compose': lambda: _get(client, compose_url),
+    }
+    results = {}
+    for name, func in benchmarks.items():
+        # Rendering compresses at maximum settings, so it gets fewer runs
+        runs = max(3, repeat // 20) if name == 'index_render' else repeat
+        results[name] = summarize(time_calls(func, runs))
+    return results
+
+def build_benchmarks(repeat=3, workers=None):
+    """Time a full static build and an incremental build with nothing to do"""
+    from generate_static_site import generate_static_site
+
+    work_dir = tempfile.mkdtemp(prefix='house-code-bench-')
+    output_dir = os.path.join(work_dir, 'gh-pages')
+    try:
+        def build(incremental):
+            # The generator reports every step; keep the benchmark output readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                generate_static_site(output_dir=output_dir, incremental=incremental,
+                                     workers=workers, budgets=False)
+
+        return {
+            'build_full': summarize(time_calls(lambda: build(False), repeat)),
+            'build_noop': summarize(time_calls(lambda: build(True), repeat)),
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def _measure_startup(entry_point, cache_dir):
+    """Phase durations (seconds) of one fresh process, plus its total wall time"""
+    env = dict(os.environ, TEMPLATE_CACHE_DIR=cache_dir)
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-c', _STARTUP_SCRIPTS[entry_point]], cwd=CURRENT_DIR,
+                               env=env, capture_output=True, text=True, check=True)
+    total = time.perf_counter() - start
+    # The last line: the generator prints on its own while loading the template
+    timings = json.loads(completed.stdout.strip().splitlines()[-1])
+    timings['total'] = total
+    return timings
+
+def startup_benchmarks(repeat=5):
+    """
+    Start each entry point in fresh interpreters and time its startup
+    phases in milliseconds. The first start of each has an empty template
+    cache ('cold'); the medians of ``repeat`` more ('warm') are what a
+    scaled-up container sees once the cache is baked into the image.
+    """
+    results = {}
+    for entry_point in _STARTUP_SCRIPTS:
+        cache_dir = tempfile.mkdtemp(prefix='house-code-templates-')
+        try:
+            cold = _measure_startup(entry_point, cache_dir)
+            warm = [_measure_startup(entry_point, cache_dir) for _ in range(repeat)]
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+        results[entry_point] = {
+            phase: {'cold_ms': round(cold[phase] * 1000, 3),
+                    'warm_ms': round(statistics.median(run[phase] for run in warm) * 1000, 3)}
+            for phase in cold
+        }
+    return results
+
+def check_startup_budgets(startup, budgets):
+    """Messages for warm startup phases over their {entry point: {phase: ms}} budget"""
+    overruns = []
+    for entry_point, phases in budgets.items():
+        for phase, budget_ms in phases.items():
+            timing = startup.get(entry_point, {}).get(phase)
+            if timing and timing['warm_ms'] > budget_ms:
+                overruns.append(f"{entry_point} {phase}: {timing['warm_ms']:.1f} ms "
+                                f"(budget {budget_ms} ms)")
+    return overruns
+
+def page_paths(app_module):
+    """What a browser fetches for one page view: the HTML and all seven layers"""
+    return ['/'] + [layer['url'] for layer in app_module.index_layers]
+
+def _browser(port, paths, page_loads, results, errors):
+    """One simulated browser: a keep-alive connection loading the page repeatedly"""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    headers = {'Accept-Encoding': 'br, gzip'}
+    try:
+        for _ in range(page_loads):
+            page_start = time.perf_counter()
+            for path in paths:
+                start = time.perf_counter()
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                results['requests'].append(time.perf_counter() - start)
+                if response.status != 200:
+                    errors.append(f"GET {path} returned {response.status}")
+            results['pages'].append(time.perf_counter() - page_start)
+    except (OSError, http.client.HTTPException) as e:
+        errors.append(str(e))
+    finally:
+        connection.close()
+
+def load_test(browsers=10, page_loads=20):
+    """
+    Serve the app on a loopback port and have ``browsers`` concurrent
+    clients each load the page ``page_loads`` times. Returns throughput and
+    latency percentiles for single requests and whole page loads.
+    """
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    import app as app_module
+    from serve import warm_up
+
+    class QuietHandler(WSGIRequestHandler):
+        # An access log line per request would dominate the timings
+        def log_request(self, *args, **kwargs):
+            pass
+
+    warm_up(app_module.app)
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True,
+                         request_handler=QuietHandler)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+
+    paths = page_paths(app_module)
+    results = {'requests': [], 'pages': []}
+    errors = []
+    clients = [threading.Thread(target=_browser, args=(server.server_port, paths, page_loads, results, errors))
+               for _ in range(browsers)]
+    start = time.perf_counter()
+    try:
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+    finally:
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+        server.server_close()
+
+    requests_ms = [timing * 1000 for timing in results['requests']]
+    pages_ms = [timing * 1000 for timing in results['pages']]
+    return {
+        'browsers': browsers,
+        'page_loads': len(pages_ms),
+        'requests': len(requests_ms),
+        'errors': len(errors),
+        'requests_per_s': round(len(requests_ms) / elapsed, 1),
+        'pages_per_s': round(len(pages_ms) / elapsed, 1),
+        'request_p50_ms': round(percentile(requests_ms, 0.50), 3),
+        'request_p95_ms': round(percentile(requests_ms, 0.95), 3),
+        'request_p99_ms': round(percentile(requests_ms, 0.99), 3),
+        'page_p50_ms': round(percentile(pages_ms, 0.50), 3),
+        'page_p95_ms': round(percentile(pages_ms, 0.95), 3),
+        'page_p99_ms': round(percentile(pages_ms, 0.99), 3),
+    }
+
+def comparable_metrics(results):
+    """
+    Flatten results into {name: (value, higher_is_better)} for comparison:
+    the median of each microbenchmark plus load-test latency and throughput.
+    """
+    metrics = {}
+    for name, summary in results.get('micro', {}).items():
+        metrics[name] = (summary['median_ms'], False)
+    for entry_point, phases in results.get('startup', {}).items():
+        metrics[f'startup_{entry_point}_total'] = (phases['total']['warm_ms'], False)
+    load = results.get('load')
+    if load:
+        for key in ('request_p50_ms', 'request_p95_ms', 'request_p99_ms', 'page_p95_ms'):
+            metrics[f'load_{key}'] = (load[key], False)
+        metrics['load_requests_per_s'] = (load['requests_per_s'], True)
+    return metrics
+
+def compare_results(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Return a list of regression messages for ``results`` against a baseline.
+    The baseline's "thresholds" map overrides the threshold per metric.
+    """
+    overrides = baseline.get('thresholds', {})
+    current = comparable_metrics(results)
+    regressions = []
+    for name, (old_value, higher_is_better) in comparable_metrics(baseline).items():
+        if name not in current or not old_value:
+            continue
+        new_value = current[name][0]
+        allowed = overrides.get(name, threshold)
+        change = (new_value - old_value) / old_value
+        if higher_is_better:
+            change = -change
+        if change > allowed:
+            regressions.append(f"{name}: {old_value} -> {new_value} "
+                               f"({change:+.0%} worse, threshold {allowed:.0%})")
+    return regressions
+
+def print_micro(results):
+    print(f"{'benchmark':<24}{'runs':>6}{'min ms':>11}{'median ms':>11}{'p95 ms':>11}")
+    for name, summary in results.items():
+        print(f"{name:<24}{summary['runs']:>6}{summary['min_ms']:>11.3f}"
+              f"{summary['median_ms']:>11.3f}{summary['p95_ms']:>11.3f}")
+
+def print_load(load):
+    print(f"{load['browsers']} browsers, {load['page_loads']} page loads, "
+          f"{load['requests']} requests, {load['errors']} errors")
+    print(f"Throughput: {load['requests_per_s']} requests/s, {load['pages_per_s']} pages/s")
+    print(f"Request latency: p50 {load['request_p50_ms']} ms, p95 {load['request_p95_ms']} ms, "
+          f"p99 {load['request_p99_ms']} ms")
+    print(f"Page load latency: p50 {load['page_p50_ms']} ms, p95 {load['page_p95_ms']} ms, "
+          f"p99 {load['page_p99_ms']} ms")
+
+def print_startup(startup):
+    print(f"{'startup phase':<34}{'cold ms':>11}{'warm ms':>11}")
+    for entry_point, phases in startup.items():
+        for phase, timing in phases.items():
+            print(f"{entry_point + ' ' + phase:<34}{timing['cold_ms']:>11.1f}{timing['warm_ms']:>11.1f}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Flask routes and the static site generator")
+    parser.add_argument("suite", nargs="?", choices=["micro", "load", "startup", "all"], default="all",
+                        help="what to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=200,
+                        help="timed runs per route benchmark (default: 200)")
+    parser.add_argument("--build-repeat", type=int, default=3,
+                        help="timed runs per build benchmark (default: 3)")
+    parser.add_argument("--no-build", dest="build", action="store_false",
+                        help="skip the static site build benchmarks")
+    parser.add_argument("--browsers", type=int, default=10,
+                        help="concurrent simulated browsers in the load test (default: 10)")
+    parser.add_argument("--page-loads", type=int, default=20,
+                        help="page loads per browser in the load test (default: 20)")
+    parser.add_argument("--startup-repeat", type=int, default=5,
+                        help="warm starts per entry point in the startup benchmark (default: 5)")
+    parser.add_argument("--startup-budgets", default=DEFAULT_STARTUP_BUDGETS_PATH,
+                        help="JSON file with warm startup budgets in ms (default: startup_budgets.json)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH,
+                        help="baseline JSON file (default: benchmark_baseline.json)")
+    parser.add_argument("--save", action="store_true",
+                        help="write the results as the new baseline")
+    parser.add_argument("--compare", action="store_true",
+                        help="exit 1 if results regress against the baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown as a fraction (default: 0.25)")
+    parser.add_argument("--json", dest="json_path",
+                        help="also write the results to this file")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = {'python': sys.version.split()[0], 'cpus': os.cpu_count()}
+
+    if args.suite in ('micro', 'all'):
+        results['micro'] = route_benchmarks(repeat=args.repeat)
+        if args.build:
+            results['micro'].update(build_benchmarks(repeat=args.build_repeat))
+        print_micro(results['micro'])
+    if args.suite in ('load', 'all'):
+        results['load'] = load_test(browsers=args.browsers, page_loads=args.page_loads)
+        print_load(results['load'])
+    if args.suite in ('startup', 'all'):
+        results['startup'] = startup_benchmarks(repeat=args.startup_repeat)
+        print_startup(results['startup'])
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    status = 0
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"ERROR: No baseline at {args.baseline}; record one with --save")
+            return 1
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            status = 1
+        else:
+            print(f"No regressions against {args.baseline}")
+
+    if args.save:
+        # Keep hand-tuned thresholds from the previous baseline
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                thresholds = json.load(f).get('thresholds')
+            if thresholds:
+                results['thresholds'] = thresholds
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+    if 'startup' in results and args.startup_budgets and os.path.exists(args.startup_budgets):
+        with open(args.startup_budgets) as f:
+            overruns = check_startup_budgets(results['startup'], json.load(f))
+        for overrun in overruns:
+            print(f"OVER BUDGET: {overrun}")
+        if overruns:
+            status = 1
+    if results.get('load', {}).get('errors'):
+        print("ERROR: The load test saw failed requests")
+        status = 1
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+Output directory bookkeeping for generate_static_site.py.
+
+Every file the generator produces goes through BuildOutput, which keeps
+a manifest of content hashes in the output directory. On an incremental
+build, outputs whose inputs haven't changed are left untouched, and only
+files the previous build wrote but this one didn't are removed.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+MANIFEST_NAME = '.build-manifest.json'
+MANIFEST_VERSION = 1
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def inputs_key(*parts):
+    """Combine input hashes and settings into one key for up_to_date()"""
+    return hash_bytes(json.dumps(parts, sort_keys=True, default=str).encode('utf-8'))
+
+class BuildOutput:
+    """
+    Writes build outputs and records them in the manifest.
+
+    With ``incremental=False`` the output directory is wiped first, as
+    the generator always did. With ``hardlink=True`` copied files are
+    hardlinked to their sources when the filesystem allows it.
+    """
+
+    def __init__(self, output_dir, incremental=False, hardlink=False):
+        self.output_dir = output_dir
+        self.incremental = incremental
+        self.hardlink = hardlink
+
+        previous = self._load_manifest() if incremental else {}
+        self.previous_files = previous.get('files', {})
+        # Source path -> [mtime_ns, size, sha256], so unchanged sources aren't re-read
+        self.previous_sources = previous.get('sources', {})
+
+        self.files = {}
+        self.sources = {}
+        self.written = []
+        self.skipped = []
+        self.removed = []
+
+        if not incremental and os.path.exists(output_dir):
+            shutil.rmtree(output_dir)
+        os.makedirs(output_dir, exist_ok=True)
+
+    def _load_manifest(self):
+        try:
+            with open(os.path.join(self.output_dir, MANIFEST_NAME)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if manifest.get('version') != MANIFEST_VERSION:
+            return {}
+        return manifest
+
+    def path(self, relpath):
+        return os.path.join(self.output_dir, *relpath.split('/'))
+
+    def source_digest(self, path):
+        """sha256 of a source file, reusing the manifest's hash while its mtime and size match"""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        cached = self.sources.get(path) or self.previous_sources.get(path)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            digest = cached[2]
+        else:
+            digest = hash_file(path)
+        self.sources[path] = [stat.st_mtime_ns, stat.st_size, digest]
+        return digest
+
+    def up_to_date(self, relpath, inputs):
+        """
+        True if the previous build wrote ``relpath`` from the same inputs and
+        the file is still there. The output is then kept as it is.
+        """
+        record = self.previous_files.get(relpath)
+        if not record or record.get('inputs') != inputs:
+            return False
+        try:
+            if os.path.getsize(self.path(relpath)) != record['size']:
+                return False
+        except OSError:
+            return False
+
+        self.files[relpath] = record
+        self.skipped.append(relpath)
+        return True
+
+    def write_bytes(self, relpath, data, inputs=None):
+        """Write generated content, skipping the write if identical bytes are already there"""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        digest = hash_bytes(data)
+        inputs = inputs or digest
+
+        if self._unchanged(relpath, digest):
+            self.files[relpath] = {'sha256': digest, 'size': len(data), 'inputs': inputs}
+            self.skipped.append(relpath)
+            return False
+
+        dest_path = self.path(relpath)
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(dest_path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, dest_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+        self.files[relpath] = {'sha256': digest, 'size': len(data), 'inputs': inputs}
+        self.written.append(relpath)
+        return True
+
+    def copy_file(self, relpath, src_path, digest=None):
+        """Copy (or hardlink) a source file unless the output already has its content"""
+        digest = digest or self.source_digest(src_path)
+        size = os.path.getsize(src_path)
+
+        if self._unchanged(relpath, digest):
+            self.files[relpath] = {'sha256': digest, 'size': size, 'inputs': digest}
+            self.skipped.append(relpath)
+            return False
+
+        dest_path = self.path(relpath)
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        if os.path.lexists(dest_path):
+            # Never write through an old hardlink into someone else's file
+            os.unlink(dest_path)
+        if self.hardlink:
+            try:
+                os.link(src_path, dest_path)
+            except OSError:
+                # Cross-device or unsupported filesystem
+                shutil.copy2(src_path, dest_path)
+        else:
+            shutil.copy2(src_path, dest_path)
+
+        self.files[relpath] = {'sha256': digest, 'size': size, 'inputs': digest}
+        self.written.append(relpath)
+        return True
+
+    def _unchanged(self, relpath, digest):
+        record = self.previous_files.get(relpath)
+        if not record or record.get('sha256') != digest:
+            return False
+        try:
+            return os.path.getsize(self.path(relpath)) == record['size']
+        except OSError:
+            return False
+
+    def finish(self):
+        """Remove stale outputs from the previous build and save the manifest"""
+        for relpath in sorted(set(self.previous_files) - set(self.files)):
+            try:
+                os.unlink(self.path(relpath))
+            except FileNotFoundError:
+                pass
+            self.removed.append(relpath)
+            self._prune_empty_dirs(os.path.dirname(self.path(relpath)))
+
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'files': dict(sorted(self.files.items())),
+            'sources': dict(sorted(self.sources.items())),
+        }
+        with open(os.path.join(self.output_dir, MANIFEST_NAME), 'w') as f:
+            json.dump(manifest, f, indent=1)
+
+    def _prune_empty_dirs(self, directory):
+        root = os.path.abspath(self.output_dir)
+        directory = os.path.abspath(directory)
+        while directory != root and directory.startswith(root + os.sep):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                return
+            directory = os.path.dirname(directory)
@@ -0,0 +1,179 @@
+"""
+Per-stage profile of a static site build (generate_static_site.py --profile).
+
+Each stage of the build records its wall time, CPU time, bytes read and
+written, the bytes of output files it wrote, and peak memory:
+
+- CPU time counts the build process and, separately, the worker
+  processes that finished during the stage. Every pool is shut down
+  inside the stage that started it.
+- Bytes read and written come from /proc/self/io. They include pipe
+  traffic to and from the workers, but not the workers' own file I/O,
+  and are None where /proc isn't available.
+- Peak memory is the build process's peak RSS during the stage. Linux
+  resets the high-water mark when a stage starts. Elsewhere it is the
+  peak so far. Workers are reported as the largest finished one.
+
+The report is JSON, so build costs can be compared across commits and
+tenants. With cprofile=True every stage runs under cProfile, and the
+stats of the slowest one are kept for dumping. The timings then include
+the profiler's overhead. cProfile only sees this process, so the command
+line builds with a single worker when asked for the stats.
+"""
+import contextlib
+import cProfile
+import json
+import os
+import platform
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    # Windows has no getrusage(); builds run unprofiled there
+    resource = None
+
+# Bump when the report's fields change meaning
+REPORT_VERSION = 1
+
+def _proc_io():
+    """(rchar, wchar) of this process, or (None, None) without /proc"""
+    try:
+        with open('/proc/self/io') as f:
+            fields = dict(line.split(':') for line in f)
+    except (OSError, ValueError):
+        return None, None
+    return int(fields['rchar']), int(fields['wchar'])
+
+def _reset_peak_rss():
+    """Reset the peak RSS (Linux only); True if it worked"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def _peak_rss_kb(reset):
+    if reset:
+        try:
+            with open('/proc/self/status') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+    return _kb(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+def _kb(maxrss):
+    # ru_maxrss is in kB on Linux and in bytes on macOS
+    return maxrss // 1024 if sys.platform == 'darwin' else maxrss
+
+def _cpu_seconds(before, after):
+    seconds = after.ru_utime + after.ru_stime - before.ru_utime - before.ru_stime
+    return round(max(seconds, 0.0), 4)
+
+def _delta(before, after):
+    return None if before is None or after is None else after - before
+
+class BuildProfile:
+    """Stage measurements of one build; see the module docstring"""
+
+    def __init__(self, cprofile=False):
+        if resource is None:
+            raise RuntimeError("Build profiles need the resource module, which this platform lacks")
+        self.cprofile = cprofile
+        self.stages = []
+        # BuildOutputs whose new files count as a stage's outputs; a batch
+        # build adds each site's as it creates them
+        self.outputs = []
+        self._profiles = {}
+        self._started = time.time()
+        self._start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Measure the code run inside the block as stage ``name``"""
+        written_before = {id(output): len(output.written) for output in self.outputs}
+        read_before, write_before = _proc_io()
+        reset = _reset_peak_rss()
+        self_before = resource.getrusage(resource.RUSAGE_SELF)
+        children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        profiler = cProfile.Profile() if self.cprofile else None
+        start = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        record = {'name': name}
+        try:
+            yield record
+        finally:
+            if profiler:
+                profiler.disable()
+            wall = time.perf_counter() - start
+            self_after = resource.getrusage(resource.RUSAGE_SELF)
+            children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+            read_after, write_after = _proc_io()
+            new_outputs = [(output, relpath) for output in self.outputs
+                           for relpath in output.written[written_before.get(id(output), 0):]]
+            record.update({
+                'wall_s': round(wall, 4),
+                'cpu_s': _cpu_seconds(self_before, self_after),
+                'workers_cpu_s': _cpu_seconds(children_before, children_after),
+                'read_bytes': _delta(read_before, read_after),
+                'write_bytes': _delta(write_before, write_after),
+                'outputs_written': len(new_outputs),
+                'output_bytes': sum(output.files[relpath]['size'] for output, relpath in new_outputs
+                                    if relpath in output.files),
+                'peak_rss_kb': _peak_rss_kb(reset),
+                'workers_peak_rss_kb': _kb(children_after.ru_maxrss),
+            })
+            self.stages.append(record)
+            if profiler:
+                self._profiles[name] = profiler
+
+    def slowest(self):
+        """The stage record with the longest wall time, or None"""
+        return max(self.stages, key=lambda record: record['wall_s'], default=None)
+
+    def report(self, **details):
+        """The JSON-ready report, with ``details`` (output dir, options, ...) at the top level"""
+        slowest = self.slowest()
+        totals = {key: round(sum(record[key] or 0 for record in self.stages), 4)
+                  for key in ('cpu_s', 'workers_cpu_s', 'read_bytes', 'write_bytes', 'output_bytes')}
+        return dict(details, **{
+            'version': REPORT_VERSION,
+            'started': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self._started)),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'wall_s': round(time.perf_counter() - self._start, 4),
+            'totals': totals,
+            'peak_rss_kb': max((record['peak_rss_kb'] for record in self.stages), default=None),
+            'slowest_stage': slowest['name'] if slowest else None,
+            'stages': self.stages
+        })
+
+    def write_report(self, path, **details):
+        report = self.report(**details)
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        return report
+
+    def dump_slowest(self, path):
+        """Write the cProfile stats of the slowest stage; returns its name, or None"""
+        slowest = self.slowest()
+        if slowest is None or slowest['name'] not in self._profiles:
+            return None
+        self._profiles[slowest['name']].dump_stats(path)
+        return slowest['name']
+
+    def print_summary(self):
+        print(f"{'stage':<16}{'wall s':>9}{'cpu s':>9}{'workers s':>11}{'written':>12}{'peak MB':>9}")
+        for record in self.stages:
+            print(f"{record['name']:<16}{record['wall_s']:>9.3f}{record['cpu_s']:>9.3f}"
+                  f"{record['workers_cpu_s']:>11.3f}{record['output_bytes']:>12,}"
+                  f"{record['peak_rss_kb'] / 1024:>9.1f}")
+
+def stage(profile, name):
+    """profile.stage(name), or a no-op block when the build isn't profiled"""
+    return profile.stage(name) if profile is not None else contextlib.nullcontext({})
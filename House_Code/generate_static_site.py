@@ -1,223 +1,663 @@
 #!/usr/bin/env python3
+import argparse
+import contextlib
+import io
+import json
 import os
-import shutil
 import sys
-from jinja2 import Environment, FileSystemLoader
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from asset_manifest import (build_asset_manifest, chapters_with_urls, layer_load_manifest, layers_with_urls,
+                            preload_urls)
+from build_output import BuildOutput, inputs_key
+from build_profile import BuildProfile, stage
+from image_pipeline import ImageCache, image_entry, job_key, run_jobs, variant_halvings, variant_name
+from site_data import CHAPTERS, LAYERS, layers_for_chapter, normalize_layer_ids
+from svg_compose import compose_layers, inline_layers
+from svg_index import INDEX_VERSION, layer_element_indexes
+from svg_optimize import DEFAULT_PRECISION, optimize_svg
+from precompress import (SizeBudgetError, check_budgets, compress_bodies, load_budgets, precompress_outputs,
+                         siblings_up_to_date, write_siblings)
+from render_pipeline import github_pages_pipeline
+from service_worker import SERVICE_WORKER_NAME, precache_entries, render_service_worker
+from template_cache import template_environment
 
 # Don't import from app.py as it might not work in GitHub Actions
 # from app import app
 
-def generate_static_site():
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BUDGETS_PATH = os.path.join(CURRENT_DIR, "size_budgets.json")
+
+# Everything a build reads; --watch rebuilds when any of these change
+SVG_SOURCE_DIRS = [
+    os.path.join(CURRENT_DIR, "static", "svg"),  # House_Code/static/svg
+    os.path.join(CURRENT_DIR, "..", "_svg_assets")  # Parent repo's _svg_assets
+]
+WATCHED_DIRS = [os.path.join(CURRENT_DIR, "templates")] + SVG_SOURCE_DIRS
+
+# Processed images by source hash, kept between builds (IMAGE_CACHE_DIR overrides)
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR") or os.path.join(CURRENT_DIR, ".image-cache")
+
+# The social media preview, and the card rasterized when it is missing
+PREVIEW_IMAGE = "houseCodePrints_02.png"
+PREVIEW_CARD_SIZE = (1200, 630)
+
+# Where a batch build (--sites) keeps the assets its sites hardlink
+SHARED_ASSETS_DIR = "_shared"
+
+def generate_static_site(output_dir="gh-pages", incremental=False, hardlink=False,
+                         optimize_svgs=True, svg_precision=DEFAULT_PRECISION,
+                         precompress=True, workers=None, budgets=None, minify_html=True,
+                         image_cache_dir=IMAGE_CACHE_DIR, profile=None):
     """
-    Generate a static version of the Flask site for GitHub Pages deployment
+    Generate a static version of the Flask site for GitHub Pages deployment.
+    
+    With incremental=True, outputs whose inputs haven't changed since the
+    last build are kept and only stale files are removed, instead of
+    wiping output_dir. hardlink=True links copied assets to their sources.
+    optimize_svgs writes minified layer SVGs (the same bytes app.py serves).
+    Pages and compression use a pool of `workers` processes. precompress
+    writes .gz/.br siblings for text assets, and budgets (see
+    precompress.load_budgets) fails the build on overruns. minify_html
+    minifies the pages with their inline CSS and JavaScript. Processed
+    images are cached in image_cache_dir (None disables the cache).
+    A BuildProfile passed as profile measures each stage of the build.
     """
     print("Generating static site for GitHub Pages...")
     
-    # Create output directory
-    output_dir = "gh-pages"
-    if os.path.exists(output_dir):
-        shutil.rmtree(output_dir)
-    os.makedirs(output_dir)
+    # Create output directory (wiped unless the build is incremental)
+    output = BuildOutput(output_dir, incremental=incremental, hardlink=hardlink)
+    if profile is not None:
+        profile.outputs.append(output)
+    assets = build_assets(output, optimize_svgs=optimize_svgs, svg_precision=svg_precision,
+                          workers=workers, image_cache_dir=image_cache_dir, profile=profile)
+    source_image_filename = assets['source_image_filename']
     
-    # Create output directories
-    svg_dir = os.path.join(output_dir, "svg")
-    os.makedirs(svg_dir)
+    # index.html plus one prerendered page per chapter preset, so deep
+    # links paint with the right layers before any JavaScript runs
+    with stage(profile, 'render') as record:
+        templates_dir = find_templates_dir()
+        pages = site_pages(assets['asset_manifest'], output_svg_reader(output), github_config())
+        timings = {}
+        rendered = write_pages(output, templates_dir, pages, source_image_filename, workers=workers,
+                               minify=minify_html, timings=timings)
+        record.update({f'{name}_s': round(seconds, 4) for name, seconds in timings.items()})
+    print(f"Rendered {len(rendered)} of {len(pages)} pages: {', '.join(rendered) or 'all up to date'}")
     
-    # Create static directory for assets like preview images
-    static_dir = os.path.join(output_dir, "static")
-    os.makedirs(static_dir)
+    # Service worker precaching what was just written, by content hash
+    with stage(profile, 'service_worker'):
+        worker_template = template_environment(templates_dir).get_template(SERVICE_WORKER_NAME)
+        _, precached = write_service_worker(output, worker_template, source_image_filename)
+    print(f"Service worker precaches {len(precached)} files")
     
+    # Precompressed .gz/.br siblings for static hosts and the CDN origin
+    if precompress:
+        with stage(profile, 'precompress'):
+            compressed = precompress_outputs(output, workers=workers)
+        print(f"Precompressed {len(compressed)} files")
+    
+    with stage(profile, 'finish'):
+        output.finish()
+    
+    # Fail the build if a change pushed transfer sizes past the budget
+    if budgets:
+        with stage(profile, 'budgets'):
+            check_budgets(output, budgets)
+    
+    print(f"Static site generated in {output_dir}/")
+    print(f"SVG files: {assets['svg_files_copied']} copied, {assets['placeholders']} placeholders created")
+    print(f"Preview image created at {output.path(f'static/{source_image_filename}')}")
+    print(f"Outputs: {len(output.written)} written, {len(output.skipped)} unchanged, {len(output.removed)} removed")
+    return output
+
+def build_assets(output, optimize_svgs=True, svg_precision=DEFAULT_PRECISION, workers=None,
+                 image_cache_dir=IMAGE_CACHE_DIR, profile=None):
+    """
+    Write everything but the pages into ``output``: layer SVGs (with
+    placeholders for missing ones), composed chapters, fingerprinted copies
+    and images. Returns the asset manifest, the preview image filename and
+    SVG counts for the build summary.
+    """
     # Copy SVG files from both possible locations
     # Make paths more robust for GitHub Actions
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    svg_sources = [
-        os.path.join(current_dir, "static", "svg"),  # House_Code/static/svg
-        os.path.join(current_dir, "..", "_svg_assets")  # Parent repo's _svg_assets
-    ]
+    svg_sources = SVG_SOURCE_DIRS
     
     print(f"Checking SVG sources: {svg_sources}")
     
-    svg_files_copied = []
+    with stage(profile, 'svg'):
+        svg_digests = copy_svg_assets(output, svg_sources, optimize=optimize_svgs, precision=svg_precision)
+        svg_files_copied = list(svg_digests)
+        
+        # Create placeholders for any missing SVG files
+        placeholders = 0
+        for layer in LAYERS:
+            svg_file = f"{layer['id']}.svg"
+            if svg_file not in svg_files_copied:
+                layer_name = svg_file.replace('.svg', '').replace('-', ' ').title()
+                output.write_bytes(f"svg/{svg_file}", placeholder_svg(layer_name))
+                svg_digests[svg_file] = output.files[f"svg/{svg_file}"]['sha256']
+                placeholders += 1
+                print(f"Created placeholder for: {svg_file}")
     
-    for svg_source in svg_sources:
-        if os.path.exists(svg_source):
-            for filename in os.listdir(svg_source):
-                if filename.endswith(".svg"):
-                    src_path = os.path.join(svg_source, filename)
-                    dest_path = os.path.join(svg_dir, filename)
-                    shutil.copy2(src_path, dest_path)
-                    svg_files_copied.append(filename)
-                    print(f"Copied SVG: {filename}")
+    # Precompose each chapter's layers into one SVG, matching /svg/compose
+    with stage(profile, 'compose'):
+        write_composed_chapters(output, svg_digests, CHAPTERS)
+    
+    # Fingerprinted copies (svg/<name>.<hash>.svg) from the shared asset
+    # manifest, so hosts and CDNs can cache them forever
+    with stage(profile, 'fingerprint'):
+        asset_manifest = write_fingerprinted_assets(output, svg_digests)
+    
+    # Element indexes for hit-testing and label search, as /api/layers/<id>/elements serves them
+    with stage(profile, 'element_index'):
+        write_element_indexes(output, svg_digests)
     
-    # Get data from Flask app
-    # These are same data structures used in app.py to render the template
-    layers = [
-        {"id": "environment-layer", "name": "Environment", "default": True},
-        {"id": "house-structure", "name": "House Structure", "default": True},
-        {"id": "html-tags-layer", "name": "HTML Tags", "default": False},
-        {"id": "structure-layer", "name": "HTML Structure", "default": False},
-        {"id": "css-design-layer", "name": "CSS Design", "default": False},
-        {"id": "interactive-layer", "name": "JavaScript Interactivity", "default": False},
-        {"id": "systems-layer", "name": "Backend Systems", "default": False}
-    ]
-    
-    chapters = [
-        {
-            "name": "Base House",
-            "preset": "base",
-            "description": "The complete house with all visual elements",
-            "layers": ["environment-layer", "house-structure"]
-        },
-        {
-            "name": "Chapter 1: HTML Tags",
-            "preset": "html-tags",
-            "description": "The blueprint layer showing HTML tags",
-            "layers": ["environment-layer", "house-structure", "html-tags-layer"]
-        },
-        {
-            "name": "Chapter 2: HTML Structure",
-            "preset": "html-structure",
-            "description": "The structural framing of the house",
-            "layers": ["environment-layer", "structure-layer"]
-        },
-        {
-            "name": "Chapter 3: CSS Design",
-            "preset": "css-design",
-            "description": "The design layer with visual styling",
-            "layers": ["environment-layer", "house-structure", "css-design-layer"]
-        },
-        {
-            "name": "Chapter 4: JavaScript",
-            "preset": "javascript",
-            "description": "The interactive elements that respond to events",
-            "layers": ["environment-layer", "house-structure", "interactive-layer"]
-        },
-        {
-            "name": "Chapter 5: Backend",
-            "preset": "backend",
-            "description": "The internal systems that power the house",
-            "layers": ["environment-layer", "house-structure", "systems-layer"]
-        }
-    ]
-    
-    # Check if we need to create any missing SVG placeholder files
-    required_svg_files = []
-    for layer in layers:
-        required_svg_files.append(f"{layer['id']}.svg")
-    
-    # Create placeholders for any missing SVG files
-    for svg_file in required_svg_files:
-        if svg_file not in svg_files_copied:
-            layer_name = svg_file.replace('.svg', '').replace('-', ' ').title()
-            create_placeholder_svg(svg_dir, svg_file, layer_name)
-            print(f"Created placeholder for: {svg_file}")
-    
-    # Get environment variables for GitHub info
-    github_username = os.getenv('GITHUB_USERNAME', 'TortoiseWolfe')
-    repo_name = os.getenv('REPO_NAME', 'The_House_that_Code_Built')
-    github_pages_url = os.getenv('GITHUB_PAGES_URL', f'https://{github_username}.github.io/{repo_name}')
-    
-    # Prepare template data
-    template_data = {
-        'layers': layers,
-        'chapters': chapters,
+    # Optimized PNGs with responsive variants, including the social media preview
+    print("Optimizing images...")
+    with stage(profile, 'images'):
+        image_cache = ImageCache(image_cache_dir) if image_cache_dir else None
+        source_image_filename = write_images(output, svg_sources, cache=image_cache, workers=workers)
+    
+    return {
+        'asset_manifest': asset_manifest,
+        'source_image_filename': source_image_filename,
+        'svg_files_copied': len(svg_files_copied),
+        'placeholders': placeholders
+    }
+
+def github_config(github_username=None, repo_name=None, github_pages_url=None):
+    """GitHub fields of the template data, defaulting to the environment"""
+    github_username = github_username or os.getenv('GITHUB_USERNAME', 'TortoiseWolfe')
+    repo_name = repo_name or os.getenv('REPO_NAME', 'The_House_that_Code_Built')
+    github_pages_url = github_pages_url or os.getenv('GITHUB_PAGES_URL', f'https://{github_username}.github.io/{repo_name}')
+    return {
         'github_username': github_username,
         'repo_name': repo_name,
         'github_pages_url': github_pages_url
     }
-    
-    # Set up Jinja2 environment with absolute path
-    templates_dir = os.path.join(current_dir, 'templates')
+
+def find_templates_dir():
+    """House_Code/templates, or FileNotFoundError with some context for CI logs"""
+    templates_dir = os.path.join(CURRENT_DIR, 'templates')
     print(f"Looking for templates in: {templates_dir}")
     
     if not os.path.exists(templates_dir):
         print("ERROR: Templates directory not found!")
-        print(f"Current directory: {current_dir}")
-        print(f"Files in current directory: {os.listdir(current_dir)}")
+        print(f"Current directory: {CURRENT_DIR}")
+        print(f"Files in current directory: {os.listdir(CURRENT_DIR)}")
         raise FileNotFoundError(f"Templates directory not found at {templates_dir}")
-        
-    env = Environment(loader=FileSystemLoader(templates_dir))
-    template = env.get_template('index.html')
+    return templates_dir
+
+def site_pages(asset_manifest, read_svg, github):
+    """(relpath, template data) for index.html and every chapter page"""
+    # Same data structures used in app.py to render the template
+    template_data = dict({
+        'layers': layers_with_urls(LAYERS, asset_manifest, 'svg/'),
+        'chapters': chapters_with_urls(CHAPTERS, 'svg/'),
+        # Relative to the <base href>, so the worker's scope is the whole site
+        'service_worker_url': SERVICE_WORKER_NAME
+    }, **github)
+    # Visible layers are inlined from the optimized SVGs already written
+    template_data.update(layer_loading_data(template_data['layers'], read_svg))
+    return [('index.html', template_data)] + chapter_pages(template_data, read_svg)
+
+def load_site_configs(path):
+    """
+    Read the sites of a batch build from JSON: a list, or {"sites": [...]},
+    of objects with github_username and repo_name, and optionally
+    github_pages_url and output_dir (relative to the batch output root,
+    default <github_username>/<repo_name>). Returns [(output_dir, github)].
+    """
+    with open(path) as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get('sites')
+    if not isinstance(data, list):
+        raise ValueError(f"{path}: expected a list of sites or {{\"sites\": [...]}}")
     
-    # Render template with data
-    output = template.render(**template_data)
+    sites = []
+    seen = set()
+    for number, site in enumerate(data, 1):
+        if not isinstance(site, dict):
+            raise ValueError(f"{path}: site {number} is not an object")
+        missing = [key for key in ('github_username', 'repo_name') if not site.get(key)]
+        if missing:
+            raise ValueError(f"{path}: site {number} is missing {', '.join(missing)}")
+        username, repo = site['github_username'], site['repo_name']
+        output_dir = os.path.normpath(site.get('output_dir') or f"{username}/{repo}")
+        if os.path.isabs(output_dir) or output_dir.split(os.sep)[0] in ('.', '..', SHARED_ASSETS_DIR):
+            raise ValueError(f"{path}: site {number} has an invalid output_dir: {output_dir}")
+        if output_dir in seen:
+            raise ValueError(f"{path}: more than one site writes to {output_dir}")
+        seen.add(output_dir)
+        # The environment only describes the single-site build, so it isn't consulted here
+        github_pages_url = site.get('github_pages_url') or f'https://{username}.github.io/{repo}'
+        sites.append((output_dir, github_config(username, repo, github_pages_url)))
+    return sites
+
+def generate_site_variants(sites, output_root="gh-pages-sites", incremental=False,
+                           optimize_svgs=True, svg_precision=DEFAULT_PRECISION,
+                           precompress=True, workers=None, budgets=None, minify_html=True,
+                           image_cache_dir=IMAGE_CACHE_DIR, profile=None):
+    """
+    Build one site per (output_dir, github) entry of ``sites`` (see
+    load_site_configs) under output_root.
     
-    # Fix SVG paths to be relative instead of absolute for GitHub Pages
-    # Change `/svg/layer-name.svg` to `svg/layer-name.svg` (without leading slash)
-    output = output.replace('svgObject.data = `/svg/', 'svgObject.data = `svg/')
+    The assets are built, optimized and compressed once into
+    output_root/_shared and every site hardlinks them, so only the pages
+    differ between sites. All of them are rendered in one process pool
+    sharing one compiled template. Each distinct page body is compressed
+    once, however many sites it appears in. Returns {output_dir: BuildOutput}.
+    A BuildProfile passed as profile measures each stage, across all sites.
+    """
+    start = time.perf_counter()
+    print(f"Generating {len(sites)} static sites in {output_root}/...")
     
-    # Add base tag for better path resolution on GitHub Pages
-    # Insert it right after the <head> tag
-    base_tag = f'<base href="{github_pages_url}/">'
-    output = output.replace('<head>', '<head>\n  ' + base_tag)
+    shared = BuildOutput(os.path.join(output_root, SHARED_ASSETS_DIR), incremental=incremental)
+    if profile is not None:
+        profile.outputs.append(shared)
+    assets = build_assets(shared, optimize_svgs=optimize_svgs, svg_precision=svg_precision,
+                          workers=workers, image_cache_dir=image_cache_dir, profile=profile)
+    if precompress:
+        with stage(profile, 'precompress'):
+            precompress_outputs(shared, workers=workers)
+    source_image_filename = assets['source_image_filename']
     
-    # Write rendered template to index.html
-    with open(os.path.join(output_dir, 'index.html'), 'w') as f:
-        f.write(output)
-        
-    print("Fixed SVG paths in rendered HTML to be relative for GitHub Pages compatibility")
+    # The pages without their GitHub fields, keyed once rather than per site
+    templates_dir = find_templates_dir()
+    base_pages = site_pages(assets['asset_manifest'], output_svg_reader(shared), {})
+    template_digest = shared.source_digest(os.path.join(templates_dir, 'index.html'))
+    page_keys = [inputs_key(template_digest, template_data, source_image_filename, 'minify' if minify_html else None)
+                 for _, template_data in base_pages]
+    
+    outputs = {}
+    pending = []
+    with stage(profile, 'link'):
+        for output_dir, github in sites:
+            output = BuildOutput(os.path.join(output_root, output_dir), incremental=incremental, hardlink=True)
+            outputs[output_dir] = output
+            if profile is not None:
+                profile.outputs.append(output)
+            for relpath, record in shared.files.items():
+                output.copy_file(relpath, shared.path(relpath), digest=record['sha256'])
+            for page, (relpath, _) in enumerate(base_pages):
+                inputs = inputs_key(page_keys[page], github)
+                if output.up_to_date(relpath, inputs) and (not precompress or siblings_up_to_date(output, relpath)):
+                    continue
+                pending.append((output, relpath, inputs, page, github))
+    
+    with stage(profile, 'render'):
+        jobs = [(page, github) for _, _, _, page, github in pending]
+        results = render_batch_pages(templates_dir, base_pages, jobs, source_image_filename,
+                                     workers=workers, minify=minify_html)
+        for (output, relpath, inputs, _, _), html in zip(pending, results):
+            output.write_bytes(relpath, html, inputs=inputs)
     
-    # Use existing image for social media preview with original filename
-    print("Copying existing image for social media metadata...")
+    worker_template = template_environment(templates_dir).get_template(SERVICE_WORKER_NAME)
+    with stage(profile, 'service_worker'):
+        scripts = [(output, write_service_worker(output, worker_template, source_image_filename)[0])
+                   for output in outputs.values()]
     
-    # Look for houseCodePrints_02.png in _svg_assets
-    source_image_path = os.path.join(current_dir, "..", "_svg_assets", "houseCodePrints_02.png")
-    source_image_filename = os.path.basename(source_image_path)
-    preview_image_path = os.path.join(static_dir, source_image_filename)
+    if precompress:
+        with stage(profile, 'page_precompress'):
+            # Sites only share a page body when their URLs match, but then
+            # it is compressed once rather than once per site
+            compressed = [(output, relpath, html) for (output, relpath, _, _, _), html in zip(pending, results)]
+            compressed += [(output, SERVICE_WORKER_NAME, script) for output, script in scripts
+                           if not siblings_up_to_date(output, SERVICE_WORKER_NAME)]
+            bodies = {}
+            for output, relpath, body in compressed:
+                bodies.setdefault(output.files[relpath]['sha256'], body)
+            variants = dict(zip(bodies, compress_bodies(list(bodies.values()), workers=workers)))
+            for output, relpath, _ in compressed:
+                write_siblings(output, relpath, variants[output.files[relpath]['sha256']])
+        print(f"Compressed {len(bodies)} distinct files for {len(compressed)} pages and service workers")
     
-    if os.path.exists(source_image_path):
-        # If the image exists, copy it to our output directory with original filename
-        shutil.copy2(source_image_path, preview_image_path)
-        print(f"Copied existing image from {source_image_path} to {preview_image_path}")
+    with stage(profile, 'finish'):
+        shared.finish()
+        for output in outputs.values():
+            output.finish()
+    if budgets:
+        with stage(profile, 'budgets'):
+            for output in outputs.values():
+                check_budgets(output, budgets)
+    
+    elapsed = time.perf_counter() - start
+    print(f"Rendered {len(pending)} of {len(sites) * len(base_pages)} pages for {len(sites)} sites in {elapsed:.1f}s")
+    print(f"Shared assets: {len(shared.files)} files in {shared.path('')}, hardlinked into every site")
+    return outputs
+
+def copy_svg_assets(output, svg_sources, optimize=True, precision=DEFAULT_PRECISION):
+    """
+    Copy SVGs into svg/, deduplicated by name and content hash.
+    Earlier sources win, the same precedence the Flask app uses.
+    With optimize=True the minified SVG is written instead of a copy.
+    Returns {filename: sha256 of the output} for every SVG written.
+    """
+    svg_digests = {}
+    svg_sources_seen = {}
+    size_report = []
+    
+    for svg_source in svg_sources:
+        if not os.path.exists(svg_source):
+            continue
+        for filename in sorted(os.listdir(svg_source)):
+            if not filename.endswith(".svg"):
+                continue
+            src_path = os.path.join(svg_source, filename)
+            digest = output.source_digest(src_path)
+            
+            if filename in svg_digests:
+                if svg_sources_seen[filename] != digest:
+                    print(f"Skipped SVG: {src_path} (shadowed by an earlier source)")
+                continue
+            svg_sources_seen[filename] = digest
+            
+            relpath = f"svg/{filename}"
+            if not optimize:
+                if output.copy_file(relpath, src_path, digest=digest):
+                    print(f"Copied SVG: {filename}")
+            else:
+                inputs = inputs_key(digest, 'optimize_svg', precision)
+                if not output.up_to_date(relpath, inputs):
+                    with open(src_path, 'rb') as f:
+                        output.write_bytes(relpath, optimize_svg(f.read(), precision), inputs=inputs)
+                    print(f"Optimized SVG: {filename}")
+                size_report.append((filename, os.path.getsize(src_path), output.files[relpath]['size']))
+            
+            svg_digests[filename] = output.files[relpath]['sha256']
+    
+    if size_report:
+        print_size_report("SVG optimization", size_report)
+    
+    return svg_digests
+
+def print_size_report(title, rows):
+    """Print a before/after size table for (name, before, after) rows"""
+    width = max(len(name) for name, _, _ in rows)
+    print(f"{title}:")
+    for name, before, after in rows:
+        saved = 100 * (before - after) / before if before else 0
+        print(f"  {name:<{width}}  {before:>8,} B -> {after:>8,} B  ({saved:5.1f}% smaller)")
+    before_total = sum(before for _, before, _ in rows)
+    after_total = sum(after for _, _, after in rows)
+    saved = 100 * (before_total - after_total) / before_total if before_total else 0
+    print(f"  {'total':<{width}}  {before_total:>8,} B -> {after_total:>8,} B  ({saved:5.1f}% smaller)")
+
+def write_fingerprinted_assets(output, svg_digests):
+    """
+    Write svg/<name>.<hash>.svg next to every SVG plus asset-manifest.json
+    mapping plain paths to fingerprinted ones. Returns {name: fingerprinted name}.
+    """
+    asset_manifest = build_asset_manifest(svg_digests)
+    for name, fingerprinted in asset_manifest.items():
+        output.copy_file(f"svg/{fingerprinted}", output.path(f"svg/{name}"), digest=svg_digests[name])
+    
+    output.write_bytes("asset-manifest.json", json.dumps(
+        {f"svg/{name}": f"svg/{fingerprinted}" for name, fingerprinted in asset_manifest.items()},
+        indent=2, sort_keys=True))
+    return asset_manifest
+
+def write_composed_chapters(output, svg_digests, chapters):
+    """Write svg/compose/<preset>.svg with the chapter's layers merged in canonical order"""
+    for chapter in chapters:
+        layer_ids = normalize_layer_ids(chapter['layers'])
+        relpath = f"svg/compose/{chapter['preset']}.svg"
+        inputs = inputs_key([(layer_id, svg_digests.get(f"{layer_id}.svg")) for layer_id in layer_ids])
+        if output.up_to_date(relpath, inputs):
+            continue
+    
+        sources = []
+        for layer_id in layer_ids:
+            with open(output.path(f"svg/{layer_id}.svg"), 'rb') as f:
+                sources.append((layer_id, f.read()))
+    
+        output.write_bytes(relpath, compose_layers(sources), inputs=inputs)
+        print(f"Composed SVG: compose/{chapter['preset']}.svg ({', '.join(layer_ids)})")
+
+def write_element_indexes(output, svg_digests):
+    """api/layers/<id>/elements.json for every layer, indexing the SVG the site serves"""
+    read_svg = output_svg_reader(output)
+    for layer in LAYERS:
+        relpath = f"api/layers/{layer['id']}/elements.json"
+        inputs = inputs_key(svg_digests.get(f"{layer['id']}.svg"), INDEX_VERSION)
+        if output.up_to_date(relpath, inputs):
+            continue
+        index = layer_element_indexes([layer], read_svg).get(layer['id'])
+        if index is not None:
+            output.write_bytes(relpath, index, inputs=inputs)
+            print(f"Indexed elements: {relpath}")
+
+def write_images(output, svg_sources, cache=None, workers=None):
+    """
+    Write the PNGs from the SVG source directories to static/, losslessly
+    optimized, each with downscaled variants next to it, and list them all
+    in image-manifest.json. Without a preview image a 1200x630 card is
+    rasterized from preview_image_svg(). Returns the preview's filename.
+    """
+    jobs = {}
+    source_sizes = {}
+    for svg_source in svg_sources:
+        if not os.path.exists(svg_source):
+            continue
+        for filename in sorted(os.listdir(svg_source)):
+            relpath = f"static/{filename}"
+            if filename.endswith(".png") and relpath not in jobs:
+                with open(os.path.join(svg_source, filename), 'rb') as f:
+                    jobs[relpath] = ('optimize', f.read())
+                source_sizes[relpath] = len(jobs[relpath][1])
+    
+    preview_filename = PREVIEW_IMAGE
+    if f"static/{PREVIEW_IMAGE}" not in jobs:
+        preview_filename = "house-preview.png"
+        output.write_bytes("static/house-preview.svg", preview_image_svg())
+        jobs[f"static/{preview_filename}"] = ('rasterize', preview_image_svg(), *PREVIEW_CARD_SIZE)
+        print(f"Preview image {PREVIEW_IMAGE} not found, rasterizing a preview card instead")
+    
+    # Full-size images first, then variants scaled down from the optimized ones
+    manifest = {}
+    written = _write_image_jobs(output, jobs, cache, workers)
+    variant_jobs = {}
+    for relpath in jobs:
+        with open(output.path(relpath), 'rb') as f:
+            data = f.read()
+        entry = image_entry(data)
+        if entry is None:
+            print(f"Skipped variants for {relpath}: not a PNG")
+            continue
+        manifest[relpath] = dict(entry, variants={})
+        for halvings in variant_halvings(entry['width']):
+            variant_jobs[variant_name(relpath, entry['width'] >> halvings)] = ('downscale', data, halvings)
+    written += _write_image_jobs(output, variant_jobs, cache, workers)
+    
+    for relpath, entry in manifest.items():
+        for halvings in variant_halvings(entry['width']):
+            variant = variant_name(relpath, entry['width'] >> halvings)
+            with open(output.path(variant), 'rb') as f:
+                entry['variants'][variant] = image_entry(f.read())
+    output.write_bytes("image-manifest.json", json.dumps(manifest, indent=2, sort_keys=True))
+    
+    if written:
+        print(f"Processed images: {', '.join(written)}" + (
+            f" ({cache.hits} from the cache)" if cache else ""))
+    size_report = [(relpath, source_sizes[relpath], output.files[relpath]['size'])
+                   for relpath in jobs if relpath in source_sizes]
+    if size_report:
+        print_size_report("PNG optimization", size_report)
+    return preview_filename
+
+def _write_image_jobs(output, jobs, cache, workers):
+    """Run the {relpath: image job} jobs whose outputs are out of date; returns the relpaths written"""
+    keys = {relpath: job_key(job) for relpath, job in jobs.items()}
+    stale = [relpath for relpath in jobs if not output.up_to_date(relpath, keys[relpath])]
+    for relpath, data in zip(stale, run_jobs([jobs[relpath] for relpath in stale], cache, workers)):
+        output.write_bytes(relpath, data, inputs=keys[relpath])
+    return stale
+
+# Compiled index.html template shared by every page render. It is loaded
+# in the parent before the render pool forks, so workers reuse it.
+_TEMPLATE = None
+
+def load_template(templates_dir):
+    """Load index.html, compiled or from the shared bytecode cache, and keep it for render_page()"""
+    global _TEMPLATE
+    _TEMPLATE = template_environment(templates_dir).get_template('index.html')
+    return _TEMPLATE
+
+def _init_render_worker(templates_dir):
+    # Workers started with fork already have the template; spawned ones compile it once
+    if _TEMPLATE is None:
+        load_template(templates_dir)
+
+def _render_job(job):
+    template_data, source_image_filename, minify = job
+    timings = {}
+    html = render_page(template_data, source_image_filename, minify=minify, timings=timings)
+    return html, timings
+
+# Pages of a batch build without their GitHub fields. Like _TEMPLATE they
+# are set up once per worker, so a job is only a page index and one site.
+_BATCH_PAGES = None
+
+def _init_batch_worker(templates_dir, pages):
+    global _BATCH_PAGES
+    _init_render_worker(templates_dir)
+    _BATCH_PAGES = pages
+
+def _render_batch_job(job):
+    page, github, source_image_filename, minify = job
+    _, template_data = _BATCH_PAGES[page]
+    return render_page(dict(template_data, **github), source_image_filename, minify=minify).encode('utf-8')
+
+def render_batch_pages(templates_dir, pages, jobs, source_image_filename, workers=None, minify=True):
+    """
+    Render the (page index, github) jobs over the (relpath, template data)
+    ``pages``. Returns the html bytes of each job.
+    """
+    load_template(templates_dir)
+    job_args = [(page, github, source_image_filename, minify) for page, github in jobs]
+    if workers == 1 or len(jobs) <= 1:
+        _init_batch_worker(templates_dir, pages)
+        return [_render_batch_job(job) for job in job_args]
+    # Hundreds of sites make thousands of small jobs, so hand them out in chunks
+    chunksize = max(1, len(jobs) // (4 * (workers or os.cpu_count() or 1)))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker,
+                             initargs=(templates_dir, pages)) as executor:
+        return list(executor.map(_render_batch_job, job_args, chunksize=chunksize))
+
+def output_svg_reader(output):
+    """read(filename) returning the bytes of svg/<filename> in the output, or None"""
+    def read(filename):
+        try:
+            with open(output.path(f"svg/{filename}"), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+    return read
+
+def layer_loading_data(layers, read_svg):
+    """
+    Template data for loading ``layers``: inline markup for the visible
+    ones, the load manifest for the rest, and preload hints for visible
+    layers that couldn't be inlined.
+    """
+    inlined = inline_layers(layers, read_svg)
+    return {
+        'inline_layers': inlined,
+        'layer_manifest': layer_load_manifest(layers, inlined),
+        # Static hosts can't send Link headers, so the page carries the hints
+        'preload_urls': preload_urls(layers, inlined)
+    }
+
+def chapter_pages(template_data, read_svg):
+    """(relpath, template data) for chapters/<preset>/index.html of every chapter"""
+    pages = []
+    for chapter in template_data['chapters']:
+        layers = layers_for_chapter(chapter, template_data['layers'])
+        pages.append((f"chapters/{chapter['preset']}/index.html", dict(
+            template_data,
+            layers=layers,
+            active_preset=chapter['preset'],
+            **layer_loading_data(layers, read_svg)
+        )))
+    return pages
+
+def write_pages(output, templates_dir, pages, source_image_filename, workers=None, minify=True,
+                timings=None):
+    """
+    Render the (relpath, template data) pages whose inputs changed, in a
+    process pool sharing one compiled template. Returns the rendered relpaths.
+    ``timings``, if given, accumulates the seconds spent loading the
+    template, rendering it ('jinja') and post-processing the HTML.
+    """
+    template_digest = output.source_digest(os.path.join(templates_dir, 'index.html'))
+    pending = []
+    for relpath, template_data in pages:
+        inputs = inputs_key(template_digest, template_data, source_image_filename, 'minify' if minify else None)
+        if not output.up_to_date(relpath, inputs):
+            pending.append((relpath, template_data, inputs))
+    if not pending:
+        return []
+    
+    start = time.perf_counter()
+    load_template(templates_dir)
+    if timings is not None:
+        timings['template_load'] = timings.get('template_load', 0.0) + time.perf_counter() - start
+    jobs = [(template_data, source_image_filename, minify) for _, template_data, _ in pending]
+    if workers == 1 or len(jobs) == 1:
+        results = [_render_job(job) for job in jobs]
     else:
-        # Fallback to creating a placeholder with a generic name
-        fallback_path = os.path.join(static_dir, "house-preview.png")
-        create_preview_image(fallback_path)
-        preview_image_path = fallback_path
-        source_image_filename = "house-preview.png"
-        print(f"Source image not found at {source_image_path}, created placeholder instead")
-    
-    # Fix og:image path in HTML
-    output_html_path = os.path.join(output_dir, 'index.html')
-    with open(output_html_path, 'r') as f:
-        html_content = f.read()
-    
-    # Update og:image and twitter:image to use relative paths with the original filename
-    html_content = html_content.replace(
-        'content="{{ github_pages_url }}/static/house-preview.png"', 
-        f'content="static/{source_image_filename}"'
-    )
-    
-    # Also update Twitter card image
-    html_content = html_content.replace(
-        'content="{{ github_pages_url }}/static/house-preview.png"', 
-        f'content="static/{source_image_filename}"'
-    )
-    
-    with open(output_html_path, 'w') as f:
-        f.write(html_content)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker,
+                                 initargs=(templates_dir,)) as executor:
+            results = list(executor.map(_render_job, jobs))
     
-    print(f"Static site generated in {output_dir}/")
-    print(f"SVG files: {len(svg_files_copied)} copied, {len(required_svg_files) - len(svg_files_copied)} placeholders created")
-    print(f"Preview image created at {preview_image_path}")
+    for (relpath, _, inputs), (html, page_timings) in zip(pending, results):
+        output.write_bytes(relpath, html, inputs=inputs)
+        if timings is not None:
+            for name, seconds in page_timings.items():
+                timings[name] = timings.get(name, 0.0) + seconds
+    return [relpath for relpath, _, _ in pending]
+
+def write_service_worker(output, template, preview_image):
+    """
+    Write service-worker.js precaching the pages and assets recorded in
+    ``output`` so far. Returns the script bytes and the precache entries.
+    """
+    entries = precache_entries(output.files, preview_image)
+    script = render_service_worker(template, entries).encode('utf-8')
+    output.write_bytes(SERVICE_WORKER_NAME, script)
+    return script, entries
+
+def render_page(template_data, source_image_filename, template=None, minify=True, timings=None):
+    """
+    Render the compiled template and adjust the result for GitHub Pages.
+    The rewrites and minification all run in memory on the rendered page,
+    which is then written once. ``timings``, if given, accumulates the
+    seconds spent in 'jinja' and in 'postprocess'.
+    """
+    transform = github_pages_pipeline(template_data["github_pages_url"], source_image_filename, minify=minify)
+    start = time.perf_counter()
+    html = (template or _TEMPLATE).render(**template_data)
+    rendered = time.perf_counter()
+    html = transform(html)
+    if timings is not None:
+        timings['jinja'] = timings.get('jinja', 0.0) + rendered - start
+        timings['postprocess'] = timings.get('postprocess', 0.0) + time.perf_counter() - rendered
+    return html
 
-def create_placeholder_svg(directory, filename, layer_name):
-    """Create a placeholder SVG file for missing layers"""
-    svg_content = f'''<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 800 600">
+def placeholder_svg(layer_name):
+    """Placeholder SVG content for a missing layer"""
+    return f'''<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 800 600">
   <rect width="800" height="600" fill="none" stroke="#ccc" stroke-width="1"/>
   <text x="400" y="300" font-family="Arial" font-size="24" text-anchor="middle" fill="#999">
     {layer_name} (Placeholder)
   </text>
 </svg>'''
-    
-    with open(os.path.join(directory, filename), 'w') as f:
-        f.write(svg_content)
-        
-def create_preview_image(output_path):
-    """Create a preview image for social media cards"""
-    # Create a simple PNG with house preview for social media
-    # This is a basic SVG that will be saved as house-preview.png
-    preview_svg = '''<svg xmlns="http://www.w3.org/2000/svg" width="1200" height="630" viewBox="0 0 1200 630">
+
+def preview_image_svg():
+    """SVG source of the social media preview image"""
+    return '''<svg xmlns="http://www.w3.org/2000/svg" width="1200" height="630" viewBox="0 0 1200 630">
   <!-- Background -->
   <rect width="1200" height="630" fill="#4CAF50" />
   
@@ -234,27 +674,169 @@ def create_preview_image(output_path):
   <text x="600" y="580" font-family="Arial" font-size="32" text-anchor="middle" fill="#fff">Interactive Web Development Visualization</text>
 </svg>'''
 
-    # Write the SVG to a temporary file
-    temp_svg_path = output_path.replace('.png', '.svg')
-    with open(temp_svg_path, 'w') as f:
-        f.write(preview_svg)
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the static GitHub Pages site")
+    parser.add_argument("--output-dir", default="gh-pages",
+                        help="directory to write the site into (default: gh-pages)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="keep unchanged outputs and remove only stale files instead of wiping the output directory")
+    parser.add_argument("--hardlink", action="store_true",
+                        help="hardlink copied assets to their sources instead of copying them")
+    parser.add_argument("--no-optimize-svg", dest="optimize_svgs", action="store_false",
+                        help="copy layer SVGs as authored instead of minifying them")
+    parser.add_argument("--svg-precision", type=int, default=DEFAULT_PRECISION,
+                        help=f"decimal places kept in SVG coordinates (default: {DEFAULT_PRECISION})")
+    parser.add_argument("--no-precompress", dest="precompress", action="store_false",
+                        help="don't write .gz/.br siblings for text assets")
+    parser.add_argument("--no-minify", dest="minify_html", action="store_false",
+                        help="write the HTML pages without minifying them")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes for page rendering and compression (default: one per CPU)")
+    parser.add_argument("--budgets", default=DEFAULT_BUDGETS_PATH,
+                        help="JSON file with per-file and total transfer size budgets (default: size_budgets.json)")
+    parser.add_argument("--max-total-size", type=int, default=None,
+                        help="override the total transfer size budget, in bytes")
+    parser.add_argument("--no-budgets", dest="check_budgets", action="store_false",
+                        help="skip the size budget check")
+    parser.add_argument("--image-cache", default=IMAGE_CACHE_DIR,
+                        help="directory caching processed images between builds (default: .image-cache)")
+    parser.add_argument("--no-image-cache", dest="image_cache", action="store_const", const=None,
+                        help="process every image without the cache")
+    parser.add_argument("--profile", nargs="?", const="build-profile.json", default=None,
+                        help="write per-stage timings, I/O and peak memory as JSON (default: build-profile.json)")
+    parser.add_argument("--cprofile", default=None,
+                        help="run each stage under cProfile and dump the slowest one's stats here "
+                             "(implies --profile and --workers 1)")
+    parser.add_argument("--sites", default=None,
+                        help="JSON file listing sites to build side by side under --output-dir, sharing one set of assets")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and rebuild incrementally when templates or SVGs change")
+    parser.add_argument("--debounce", type=float, default=0.1,
+                        help="with --watch, seconds of quiet before rebuilding (default: 0.1)")
+    parser.add_argument("--poll", action="store_true",
+                        help="with --watch, poll for changes instead of using inotify")
+    return parser.parse_args(argv)
+
+def watch_site(build_options, debounce=0.1, polling=False):
+    """
+    Rebuild incrementally whenever a template or source asset changes.
+    The build manifest works out what each change affects: an edited layer
+    SVG rewrites that SVG and the outputs derived from it, while a template
+    edit only rerenders the HTML pages.
+    """
+    from watch import watch
     
-    # Convert SVG to PNG using a simple text file
-    # Since we can't rely on having convert or other tools in GitHub Actions
-    with open(output_path, 'w') as f:
-        f.write("Preview image for social media")
+    def rebuild(changed):
+        start = time.perf_counter()
+        try:
+            # The full build log would bury the summary on every save
+            with contextlib.redirect_stdout(io.StringIO()):
+                output = generate_static_site(incremental=True, **build_options)
+        except Exception as e:
+            print(f"ERROR: Rebuild failed: {str(e)}")
+            return None
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        
+        reason = ', '.join(os.path.relpath(path, CURRENT_DIR) for path in changed) or 'initial build'
+        print(f"[{time.strftime('%H:%M:%S')}] {reason}: rebuilt in {elapsed_ms:.0f} ms "
+              f"({len(output.written)} written, {len(output.skipped)} unchanged, {len(output.removed)} removed)")
+        if changed:
+            # Precompressed siblings follow their originals, so leave them out
+            for relpath in output.written:
+                if not relpath.endswith(('.gz', '.br')):
+                    print(f"  wrote {relpath}")
+            for relpath in output.removed:
+                if not relpath.endswith(('.gz', '.br')):
+                    print(f"  removed {relpath}")
+        return output
     
-    print(f"Created preview image placeholder at {output_path}")
-    # In a real scenario, you'd use a library like cairosvg or wand to convert SVG to PNG
-    # But for simplicity, we're just creating a text file for now
+    rebuild([])
+    watch(WATCHED_DIRS, rebuild, debounce=debounce, polling=polling)
+
+def write_profile(profile, args):
+    """Save and summarize the --profile report, and the slowest stage's cProfile stats"""
+    profile.print_summary()
+    cprofile_stage = profile.dump_slowest(args.cprofile) if args.cprofile else None
+    report_path = args.profile or "build-profile.json"
+    report = profile.write_report(report_path,
+                                  output_dir=args.output_dir,
+                                  commit=os.getenv('GITHUB_SHA'),
+                                  options={name: value for name, value in vars(args).items()
+                                           if name not in ('profile', 'cprofile', 'watch', 'debounce', 'poll')},
+                                  cprofile={'stage': cprofile_stage, 'path': args.cprofile} if cprofile_stage else None,
+                                  **github_config())
+    print(f"Build profile written to {report_path} (slowest stage: {report['slowest_stage']})")
+    if cprofile_stage:
+        print(f"cProfile stats of the {cprofile_stage} stage written to {args.cprofile}")
+
+def budgets_from_args(args):
+    """Budgets selected on the command line, or None to skip the check"""
+    if not args.check_budgets:
+        return None
+    budgets = {'total': None, 'files': {}}
+    if args.budgets and os.path.exists(args.budgets):
+        budgets = load_budgets(args.budgets)
+    elif args.budgets != DEFAULT_BUDGETS_PATH:
+        raise FileNotFoundError(f"Budget file not found: {args.budgets}")
+    if args.max_total_size is not None:
+        budgets['total'] = args.max_total_size
+    return budgets
 
 if __name__ == '__main__':
+    args = parse_args()
+    if args.watch and (args.profile or args.cprofile):
+        # Every save would overwrite the report of the one before
+        sys.exit("ERROR: --profile and --cprofile can't be combined with --watch")
+    profile = BuildProfile(cprofile=bool(args.cprofile)) if args.profile or args.cprofile else None
+    if args.cprofile:
+        # cProfile can't see into worker processes
+        args.workers = 1
+    if args.watch:
+        watch_site(dict(output_dir=args.output_dir,
+                        hardlink=args.hardlink,
+                        optimize_svgs=args.optimize_svgs,
+                        svg_precision=args.svg_precision,
+                        precompress=args.precompress,
+                        workers=args.workers,
+                        budgets=budgets_from_args(args),
+                        minify_html=args.minify_html,
+                        image_cache_dir=args.image_cache),
+                   debounce=args.debounce, polling=args.poll)
+        sys.exit(0)
     try:
         print("Starting static site generation...")
-        generate_static_site()
+        if args.sites:
+            generate_site_variants(load_site_configs(args.sites),
+                                   output_root=args.output_dir,
+                                   incremental=args.incremental,
+                                   optimize_svgs=args.optimize_svgs,
+                                   svg_precision=args.svg_precision,
+                                   precompress=args.precompress,
+                                   workers=args.workers,
+                                   budgets=budgets_from_args(args),
+                                   minify_html=args.minify_html,
+                                   image_cache_dir=args.image_cache,
+                                   profile=profile)
+        else:
+            generate_static_site(output_dir=args.output_dir,
+                                 incremental=args.incremental,
+                                 hardlink=args.hardlink,
+                                 optimize_svgs=args.optimize_svgs,
+                                 svg_precision=args.svg_precision,
+                                 precompress=args.precompress,
+                                 workers=args.workers,
+                                 budgets=budgets_from_args(args),
+                                 minify_html=args.minify_html,
+                                 image_cache_dir=args.image_cache,
+                                 profile=profile)
+        if profile is not None:
+            write_profile(profile, args)
         print("Static site generation completed successfully!")
+    except SizeBudgetError as e:
+        print(f"ERROR: Static site generation failed: {str(e)}")
+        sys.exit(1)
     except Exception as e:
         print(f"ERROR: Static site generation failed: {str(e)}")
         import traceback
         traceback.print_exc()
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
@@ -0,0 +1,109 @@
+"""
+Image stage of the static site build.
+
+A job turns one source into one output PNG: a lossless recompression
+('optimize'), a downscaled variant ('downscale') or a rasterized SVG
+('rasterize'). Finished outputs are kept in a cache directory under a
+key made of the job and the sha256 of its source, so an image is only
+ever processed once. Builds into a fresh output directory, as on CI,
+reuse them as long as the cache directory survives.
+"""
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from build_output import hash_bytes, inputs_key
+from png_optimize import PNGError, downscale_png, optimize_png, png_size
+
+# Bump when the same job would now produce different bytes
+IMAGE_PIPELINE_VERSION = 1
+
+# Responsive variants halve the width this many times...
+VARIANT_HALVINGS = (1, 2)
+# ...but stop before they get narrower than this
+MIN_VARIANT_WIDTH = 200
+
+class ImageCache:
+    """Processed images on disk, by job key"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f'{key}.png')
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put(self, key, data):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            # A read-only or full cache only costs the next build some time
+            print(f"Could not cache image {key}: {e}")
+
+def job_key(job):
+    kind, source, *params = job
+    if isinstance(source, str):
+        source = source.encode('utf-8')
+    return inputs_key(kind, hash_bytes(source), params, IMAGE_PIPELINE_VERSION)
+
+def run_job(job):
+    """Output bytes of one (kind, source, *params) job"""
+    kind, source, *params = job
+    if kind == 'optimize':
+        return optimize_png(source)
+    if kind == 'downscale':
+        return downscale_png(source, *params)
+    if kind == 'rasterize':
+        # Only needed when the preview image is missing; probing for cairosvg isn't free
+        from svg_rasterize import rasterize_svg
+        return optimize_png(rasterize_svg(source, *params))
+    raise ValueError(f"Unknown image job: {kind}")
+
+def run_jobs(jobs, cache=None, workers=None):
+    """Outputs of ``jobs`` in order, computing cache misses in a process pool"""
+    keys = [job_key(job) for job in jobs]
+    results = [cache.get(key) if cache else None for key in keys]
+    pending = [position for position, result in enumerate(results) if result is None]
+    if workers == 1 or len(pending) <= 1:
+        computed = [run_job(jobs[position]) for position in pending]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            computed = list(executor.map(run_job, [jobs[position] for position in pending]))
+    for position, data in zip(pending, computed):
+        results[position] = data
+        if cache:
+            cache.put(keys[position], data)
+    return results
+
+def variant_halvings(width):
+    """The VARIANT_HALVINGS that keep an image ``width`` wide at least MIN_VARIANT_WIDTH wide"""
+    return [halvings for halvings in VARIANT_HALVINGS if width >> halvings >= MIN_VARIANT_WIDTH]
+
+def variant_name(relpath, width):
+    """static/photo.png -> static/photo-300w.png"""
+    stem, ext = os.path.splitext(relpath)
+    return f'{stem}-{width}w{ext}'
+
+def image_entry(data):
+    """Manifest entry (width, height, bytes) for PNG data, or None if it isn't a PNG"""
+    try:
+        width, height = png_size(data)
+    except PNGError:
+        return None
+    return {'width': width, 'height': height, 'bytes': len(data)}
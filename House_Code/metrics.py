@@ -0,0 +1,266 @@
+"""
+Request instrumentation for the Flask app.
+
+Keeps per-route latency histograms, per-phase timings (cache lookups,
+rendering, compression, placeholder generation) and SVG lookup counters
+by filename and result. Every response gets a Server-Timing header with
+the phases it went through, and /metrics serves everything in the
+Prometheus text format.
+
+Each worker process keeps its numbers in memory and writes them to its
+own file in METRICS_DIR at most once per FLUSH_INTERVAL; /metrics adds
+up the files of every worker, so any worker can answer a scrape. Without
+METRICS_DIR, a temporary directory is used and removed when the process
+that created it exits.
+
+Set HOUSE_METRICS=0 to switch it all off: the hooks then return at once
+and phase() hands back a shared no-op context manager.
+"""
+import atexit
+import bisect
+import contextlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+ENABLED = os.getenv('HOUSE_METRICS', '1') != '0'
+
+# Seconds; the last bucket (+Inf) is implied
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# How often a worker writes its numbers for the other workers to read
+FLUSH_INTERVAL = 1.0
+
+# Distinct filenames tracked per SVG result; the rest are counted as "other"
+# so probes for random names can't grow the metrics without bound
+MAX_FILENAMES = 200
+
+# Workers forked from one master inherit the master's directory
+DEFAULT_METRICS_DIR = os.path.join(tempfile.gettempdir(), f'house-code-metrics-{os.getpid()}')
+METRICS_DIR = os.getenv('METRICS_DIR') or DEFAULT_METRICS_DIR
+
+METRIC_HELP = {
+    'house_request_duration_seconds': ('histogram', 'Request latency by route'),
+    'house_phase_duration_seconds': ('histogram', 'Time spent in each request phase'),
+    'house_svg_requests_total': ('counter', 'SVG route lookups by filename and result (hit, fallback, miss)'),
+}
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_filenames = {}
+_last_flush = 0.0
+_owner_pid = os.getpid()
+_null_phase = contextlib.nullcontext()
+
+def set_enabled(enabled):
+    global ENABLED
+    ENABLED = bool(enabled)
+
+def reset():
+    """Forget everything this process has recorded, including its file in METRICS_DIR"""
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+        _filenames.clear()
+    # Otherwise the old numbers would still be added up by collect()
+    try:
+        os.remove(_pid_path(os.getpid()))
+    except OSError:
+        pass
+
+def observe(metric, labels, seconds):
+    """Record one duration in a histogram"""
+    key = (metric, tuple(sorted(labels.items())))
+    position = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+    with _lock:
+        entry = _histograms.get(key)
+        if entry is None:
+            entry = _histograms[key] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0]
+        entry[0][position] += 1
+        entry[1] += seconds
+
+def increment(metric, labels, amount=1):
+    key = (metric, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+def count_svg(filename, result):
+    """Count an SVG route lookup; result is 'hit', 'fallback' or 'miss'"""
+    if not ENABLED:
+        return
+    with _lock:
+        seen = _filenames.setdefault(result, set())
+        if filename not in seen:
+            if len(seen) >= MAX_FILENAMES:
+                filename = 'other'
+            else:
+                seen.add(filename)
+    increment('house_svg_requests_total', {'filename': filename, 'result': result})
+
+@contextlib.contextmanager
+def _timed_phase(name):
+    from flask import g, has_app_context
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        observe('house_phase_duration_seconds', {'phase': name}, duration)
+        if has_app_context():
+            g.setdefault('server_timing', []).append((name, duration))
+
+def phase(name):
+    """Context manager timing one phase of the current request"""
+    return _timed_phase(name) if ENABLED else _null_phase
+
+def server_timing_header(phases, total):
+    """Server-Timing value for [(name, seconds)] plus the total, in milliseconds"""
+    entries = [f'{name};dur={duration * 1000:.3f}' for name, duration in phases]
+    entries.append(f'total;dur={total * 1000:.3f}')
+    return ', '.join(entries)
+
+def _snapshot():
+    with _lock:
+        return {
+            'histograms': [[metric, list(labels), list(counts), total]
+                           for (metric, labels), (counts, total) in _histograms.items()],
+            'counters': [[metric, list(labels), value] for (metric, labels), value in _counters.items()],
+        }
+
+def _pid_path(pid):
+    return os.path.join(METRICS_DIR, f'metrics-{pid}.json')
+
+def flush():
+    """Write this process's numbers to its file in METRICS_DIR"""
+    global _last_flush
+    _last_flush = time.monotonic()
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = _pid_path(os.getpid())
+    temp_path = f'{path}.{threading.get_ident()}.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(_snapshot(), f)
+    os.replace(temp_path, path)
+
+def _maybe_flush():
+    if time.monotonic() - _last_flush >= FLUSH_INTERVAL:
+        try:
+            flush()
+        except OSError:
+            # Metrics must never fail a request
+            pass
+
+def collect():
+    """
+    Add up the numbers of every worker: this process's live state plus the
+    files the other workers wrote. Files of exited workers are kept, so
+    counters never go backwards.
+    """
+    snapshots = [_snapshot()]
+    own_file = os.path.basename(_pid_path(os.getpid()))
+    try:
+        names = sorted(os.listdir(METRICS_DIR))
+    except OSError:
+        names = []
+    for name in names:
+        if name == own_file or not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(METRICS_DIR, name)) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+
+    histograms = {}
+    counters = {}
+    for snapshot in snapshots:
+        for metric, labels, counts, total in snapshot['histograms']:
+            key = (metric, tuple(tuple(pair) for pair in labels))
+            entry = histograms.setdefault(key, [[0] * len(counts), 0.0])
+            entry[0] = [a + b for a, b in zip(entry[0], counts)]
+            entry[1] += total
+        for metric, labels, value in snapshot['counters']:
+            key = (metric, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+    return histograms, counters
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def render_prometheus(histograms, counters):
+    """Prometheus text exposition format for collect()'s result"""
+    lines = []
+    for metric, (kind, help_text) in METRIC_HELP.items():
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} {kind}')
+        if kind == 'histogram':
+            for (name, labels), (counts, total) in sorted(histograms.items()):
+                if name != metric:
+                    continue
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{_labels(labels + (("le", bound),))} {cumulative}')
+                lines.append(f'{metric}_sum{_labels(labels)} {total:.6f}')
+                lines.append(f'{metric}_count{_labels(labels)} {cumulative}')
+        else:
+            for (name, labels), value in sorted(counters.items()):
+                if name == metric:
+                    lines.append(f'{metric}{_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+def init_app(app):
+    """Time every request, add Server-Timing headers and serve /metrics"""
+    from flask import g, request
+
+    @app.before_request
+    def start_timer():
+        if ENABLED:
+            g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        if not ENABLED or 'request_start' not in g:
+            return response
+        total = time.perf_counter() - g.request_start
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        observe('house_request_duration_seconds', {'route': route}, total)
+        response.headers['Server-Timing'] = server_timing_header(g.get('server_timing', []), total)
+        _maybe_flush()
+        return response
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        if not ENABLED:
+            return 'Metrics are disabled', 404, {'Content-Type': 'text/plain; charset=utf-8'}
+        flush()
+        body = render_prometheus(*collect())
+        return body, 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8',
+                           'Cache-Control': 'no-store'}
+
+    # Exit handlers run last-registered first, so the flush comes before the cleanup
+    atexit.register(_remove_default_dir)
+    atexit.register(_flush_at_exit)
+
+def _remove_default_dir():
+    # Only the process that picked the default directory removes it; the
+    # workers it forked have exited by then
+    if os.getpid() == _owner_pid and METRICS_DIR == DEFAULT_METRICS_DIR:
+        shutil.rmtree(METRICS_DIR, ignore_errors=True)
+
+def _flush_at_exit():
+    # Leave this worker's last numbers behind for the others
+    if ENABLED and (_histograms or _counters):
+        try:
+            flush()
+        except OSError:
+            pass
@@ -0,0 +1,400 @@
+"""
+Lossless PNG recompression and downscaled variants, in pure Python.
+
+optimize_png() decodes a PNG and applies the lossless reductions that
+apply (an opaque alpha channel is dropped, grey images become greyscale,
+images with at most 256 colours get a palette). It then tries several
+scanline filter strategies at zlib's highest level and keeps the
+smallest result. Metadata chunks (text, timestamps, pHYs, EXIF) are
+dropped; gAMA, cHRM, sRGB and iCCP are kept because they change how
+colours display. The result is never larger than the input.
+
+Row filters work on whole scanlines at once by treating them as big
+integers (SIMD within a register), so only the Average and Paeth
+filters loop over single bytes.
+
+Interlaced images and bit depths other than 8 aren't decoded; they are
+stripped of metadata and their image data is recompressed as it is.
+"""
+import functools
+import itertools
+import struct
+import sys
+import zlib
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Samples per pixel for each colour type
+CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+# Ancillary chunks that affect how the image looks; everything else is metadata
+COLOR_CHUNKS = (b'gAMA', b'cHRM', b'sRGB', b'iCCP')
+
+FILTER_STRATEGIES = ('none', 'sub', 'up', 'average', 'paeth', 'adaptive')
+
+_IHDR = struct.Struct('>IIBBBBB')
+
+# Filtered byte -> distance from zero as a signed byte, for the adaptive heuristic
+_SIGNED_ABS = bytes(min(value, 256 - value) for value in range(256))
+
+class PNGError(ValueError):
+    """Raised for data that isn't a PNG this module can read"""
+
+class PNGImage:
+    """Decoded 8-bit image: unfiltered rows joined into ``pixels``"""
+
+    def __init__(self, width, height, color_type, pixels, palette=None, transparency=None, color_chunks=()):
+        self.width = width
+        self.height = height
+        self.color_type = color_type
+        self.pixels = pixels
+        self.palette = palette
+        self.transparency = transparency
+        self.color_chunks = list(color_chunks)
+
+    @property
+    def bytes_per_pixel(self):
+        return CHANNELS[self.color_type]
+
+    @property
+    def stride(self):
+        return self.width * self.bytes_per_pixel
+
+    def rows(self):
+        stride = self.stride
+        return [self.pixels[offset:offset + stride] for offset in range(0, stride * self.height, stride)]
+
+# ----------------------------------------------------------------------
+# Chunks
+
+def read_chunks(data):
+    """[(chunk type, body)] of a PNG, checking the signature and CRCs"""
+    data = bytes(data)
+    if not data.startswith(PNG_SIGNATURE):
+        raise PNGError('Not a PNG file')
+    chunks = []
+    offset = len(PNG_SIGNATURE)
+    while offset + 12 <= len(data):
+        length, chunk_type = struct.unpack_from('>I4s', data, offset)
+        body = data[offset + 8:offset + 8 + length]
+        crc, = struct.unpack_from('>I', data, offset + 8 + length)
+        if zlib.crc32(chunk_type + body) != crc:
+            raise PNGError(f'Bad CRC in {chunk_type.decode("latin-1")} chunk')
+        chunks.append((chunk_type, body))
+        offset += 12 + length
+        if chunk_type == b'IEND':
+            return chunks
+    raise PNGError('Truncated PNG file')
+
+def _chunk(chunk_type, body):
+    return struct.pack('>I', len(body)) + chunk_type + body + struct.pack('>I', zlib.crc32(chunk_type + body))
+
+def png_size(data):
+    """(width, height) from the IHDR chunk"""
+    if not bytes(data[:8]) == PNG_SIGNATURE or bytes(data[12:16]) != b'IHDR':
+        raise PNGError('Not a PNG file')
+    return struct.unpack_from('>II', data, 16)
+
+# ----------------------------------------------------------------------
+# Byte-wise arithmetic on whole rows
+
+@functools.lru_cache(maxsize=32)
+def _masks(length):
+    """(0x80.., 0x7f.., 0xfe..) masks ``length`` bytes long"""
+    return tuple(int.from_bytes(byte * length, 'big') for byte in (b'\x80', b'\x7f', b'\xfe'))
+
+def _as_int(data):
+    return int.from_bytes(data, 'big')
+
+def _sub(a, b):
+    """(a - b) mod 256 for every byte"""
+    high, low, _ = _masks(len(a))
+    x, y = _as_int(a), _as_int(b)
+    return (((x | high) - (y & low)) ^ ((x ^ ~y) & high)).to_bytes(len(a), 'big')
+
+def _add(a, b):
+    """(a + b) mod 256 for every byte"""
+    high, low, _ = _masks(len(a))
+    x, y = _as_int(a), _as_int(b)
+    return (((x & low) + (y & low)) ^ ((x ^ y) & high)).to_bytes(len(a), 'big')
+
+def _average(a, b):
+    """floor((a + b) / 2) for every byte"""
+    _, _, even = _masks(len(a))
+    x, y = _as_int(a), _as_int(b)
+    return ((x & y) + (((x ^ y) & even) >> 1)).to_bytes(len(a), 'big')
+
+def _average_up(a, b):
+    """ceil((a + b) / 2) for every byte"""
+    _, _, even = _masks(len(a))
+    x, y = _as_int(a), _as_int(b)
+    return ((x | y) - (((x ^ y) & even) >> 1)).to_bytes(len(a), 'big')
+
+# ----------------------------------------------------------------------
+# Decoding
+
+def _unfilter_row(filter_type, row, prior, bpp):
+    if filter_type == 0:
+        return row
+    if filter_type == 1:
+        out = bytearray(len(row))
+        for channel in range(bpp):
+            out[channel::bpp] = bytes(itertools.accumulate(row[channel::bpp], lambda a, b: (a + b) & 255))
+        return bytes(out)
+    if filter_type == 2:
+        return _add(row, prior)
+    out = bytearray(row)
+    if filter_type == 3:
+        for i in range(len(out)):
+            left = out[i - bpp] if i >= bpp else 0
+            out[i] = (out[i] + ((left + prior[i]) >> 1)) & 255
+        return bytes(out)
+    if filter_type == 4:
+        for i in range(len(out)):
+            if i >= bpp:
+                a, c = out[i - bpp], prior[i - bpp]
+            else:
+                a = c = 0
+            b = prior[i]
+            pa, pb, pc = abs(b - c), abs(a - c), abs(a + b - c - c)
+            out[i] = (out[i] + (a if pa <= pb and pa <= pc else b if pb <= pc else c)) & 255
+        return bytes(out)
+    raise PNGError(f'Unknown filter type {filter_type}')
+
+def decode_png(data):
+    """Decode a non-interlaced 8-bit PNG into a PNGImage"""
+    chunks = read_chunks(data)
+    if not chunks or chunks[0][0] != b'IHDR':
+        raise PNGError('Missing IHDR chunk')
+    width, height, bit_depth, color_type, _, _, interlace = _IHDR.unpack(chunks[0][1])
+    if color_type not in CHANNELS:
+        raise PNGError(f'Unknown colour type {color_type}')
+    if bit_depth != 8 or interlace:
+        raise PNGError('Only non-interlaced 8-bit images are decoded')
+
+    palette = transparency = None
+    color_chunks = []
+    for chunk_type, body in chunks:
+        if chunk_type == b'PLTE':
+            palette = body
+        elif chunk_type == b'tRNS':
+            transparency = body
+        elif chunk_type in COLOR_CHUNKS:
+            color_chunks.append((chunk_type, body))
+    try:
+        raw = zlib.decompress(b''.join(body for chunk_type, body in chunks if chunk_type == b'IDAT'))
+    except zlib.error as e:
+        raise PNGError(f'Corrupt image data: {e}') from e
+
+    bpp = CHANNELS[color_type]
+    stride = width * bpp
+    if len(raw) < (stride + 1) * height:
+        raise PNGError('Truncated image data')
+    prior = bytes(stride)
+    rows = []
+    for y in range(height):
+        offset = y * (stride + 1)
+        prior = _unfilter_row(raw[offset], raw[offset + 1:offset + 1 + stride], prior, bpp)
+        rows.append(prior)
+    return PNGImage(width, height, color_type, b''.join(rows), palette, transparency, color_chunks)
+
+# ----------------------------------------------------------------------
+# Encoding
+
+def _filtered_rows(image, strategies=FILTER_STRATEGIES):
+    """{strategy: [filter byte + filtered row]} for each of ``strategies``"""
+    bpp = image.bytes_per_pixel
+    padding = bytes(bpp)
+    prior = bytes(image.stride)
+    every_filter = 'adaptive' in strategies or 'paeth' in strategies
+    candidates = {strategy: [] for strategy in strategies}
+    for row in image.rows():
+        left = padding + row[:-bpp]
+        filtered = {
+            'none': b'\x00' + row,
+            'sub': b'\x01' + _sub(row, left),
+            'up': b'\x02' + _sub(row, prior),
+            'average': b'\x03' + _sub(row, _average(left, prior)),
+        }
+        if every_filter:
+            upper_left = padding + prior[:-bpp]
+            paeth = bytearray(len(row))
+            for i, (x, a, b, c) in enumerate(zip(row, left, prior, upper_left)):
+                pa, pb, pc = abs(b - c), abs(a - c), abs(a + b - c - c)
+                paeth[i] = (x - (a if pa <= pb and pa <= pc else b if pb <= pc else c)) & 255
+            filtered['paeth'] = b'\x04' + bytes(paeth)
+            # The usual heuristic: the filter whose output is closest to zero
+            filtered['adaptive'] = min(filtered.values(), key=lambda line: sum(line[1:].translate(_SIGNED_ABS)))
+        for strategy in strategies:
+            candidates[strategy].append(filtered[strategy])
+        prior = row
+    return candidates
+
+def _deflate(data, strategy=zlib.Z_DEFAULT_STRATEGY):
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 15, 9, strategy)
+    return compressor.compress(data) + compressor.flush()
+
+def encode_png(image, strategies=FILTER_STRATEGIES):
+    """Encode a PNGImage with whichever of the filter ``strategies`` compresses best"""
+    streams = {strategy: b''.join(rows) for strategy, rows in _filtered_rows(image, strategies).items()}
+    compressed = {strategy: _deflate(stream) for strategy, stream in streams.items()}
+    best = min(compressed, key=lambda strategy: len(compressed[strategy]))
+    idat = compressed[best]
+    for zlib_strategy in (zlib.Z_FILTERED, zlib.Z_RLE):
+        retry = _deflate(streams[best], zlib_strategy)
+        if len(retry) < len(idat):
+            idat = retry
+
+    chunks = [_chunk(b'IHDR', _IHDR.pack(image.width, image.height, 8, image.color_type, 0, 0, 0))]
+    chunks.extend(_chunk(chunk_type, body) for chunk_type, body in image.color_chunks)
+    if image.palette is not None:
+        chunks.append(_chunk(b'PLTE', image.palette))
+    if image.transparency is not None:
+        chunks.append(_chunk(b'tRNS', image.transparency))
+    chunks.append(_chunk(b'IDAT', idat))
+    chunks.append(_chunk(b'IEND', b''))
+    return PNG_SIGNATURE + b''.join(chunks)
+
+# ----------------------------------------------------------------------
+# Lossless reductions
+
+def _channels(pixels, bpp, keep):
+    """The ``keep`` channels (by index) of interleaved ``bpp``-byte pixels"""
+    out = bytearray(len(pixels) // bpp * len(keep))
+    for position, channel in enumerate(keep):
+        out[position::len(keep)] = pixels[channel::bpp]
+    return bytes(out)
+
+def expand(image):
+    """Copy of ``image`` as 8-bit RGBA, RGB, greyscale or grey+alpha (palettes are expanded)"""
+    if image.color_type != 3:
+        return image
+    entries = [image.palette[i:i + 3] for i in range(0, len(image.palette), 3)]
+    if image.transparency:
+        alpha = image.transparency + b'\xff' * (len(entries) - len(image.transparency))
+        lookup = [entry + alpha[i:i + 1] for i, entry in enumerate(entries)]
+        color_type = 6
+    else:
+        lookup = entries
+        color_type = 2
+    lookup += [lookup[0]] * (256 - len(lookup))
+    pixels = b''.join(map(lookup.__getitem__, image.pixels))
+    return PNGImage(image.width, image.height, color_type, pixels, color_chunks=image.color_chunks)
+
+def _palette_image(image):
+    """The RGB or RGBA ``image`` with a palette, or None if it has over 256 colours"""
+    bpp = image.bytes_per_pixel
+    if bpp == 4:
+        pixels = memoryview(image.pixels).cast('I')
+    else:
+        pixels = memoryview(_channels(image.pixels, 3, (0, 1, 2)) if bpp == 3 else image.pixels)
+        pixels = [bytes(pixels[i:i + 3]) for i in range(0, len(pixels), 3)]
+    colors = set(pixels)
+    if len(colors) > 256:
+        return None
+
+    if bpp == 4:
+        entries = sorted((color.to_bytes(4, sys.byteorder) for color in colors), key=lambda entry: entry[3])
+        index = {int.from_bytes(entry, sys.byteorder): position for position, entry in enumerate(entries)}
+        # tRNS only needs the entries up to the last translucent one
+        translucent = sum(1 for entry in entries if entry[3] != 255)
+        transparency = bytes(entry[3] for entry in entries[:translucent]) or None
+        palette = b''.join(entry[:3] for entry in entries)
+    else:
+        entries = sorted(colors)
+        index = {entry: position for position, entry in enumerate(entries)}
+        transparency = None
+        palette = b''.join(entries)
+    indices = bytes(map(index.__getitem__, pixels))
+    return PNGImage(image.width, image.height, 3, indices, palette, transparency, image.color_chunks)
+
+def reductions(image):
+    """
+    Lossless variants of ``image`` worth trying, smallest pixel format
+    first: without an opaque alpha channel, as greyscale, and with a palette.
+    """
+    image = expand(image)
+    if image.transparency is not None:
+        # Colour-key transparency (tRNS on grey or RGB) is kept as it is
+        return [image]
+    pixels, color_type, bpp = image.pixels, image.color_type, image.bytes_per_pixel
+
+    if color_type in (4, 6) and pixels[bpp - 1::bpp] == b'\xff' * (len(pixels) // bpp):
+        pixels = _channels(pixels, bpp, range(bpp - 1))
+        color_type -= 4
+        bpp -= 1
+    if color_type in (2, 6) and pixels[0::bpp] == pixels[1::bpp] == pixels[2::bpp]:
+        pixels = _channels(pixels, bpp, (0,) if bpp == 3 else (0, 3))
+        color_type -= 2
+        bpp = CHANNELS[color_type]
+
+    reduced = PNGImage(image.width, image.height, color_type, pixels, color_chunks=image.color_chunks)
+    variants = [reduced]
+    if color_type in (2, 6):
+        paletted = _palette_image(reduced)
+        if paletted is not None:
+            variants.insert(0, paletted)
+    return variants
+
+# ----------------------------------------------------------------------
+# Entry points
+
+def _strip(data):
+    """``data`` without metadata chunks and with its image data recompressed as it is"""
+    chunks = read_chunks(data)
+    idat = b''.join(body for chunk_type, body in chunks if chunk_type == b'IDAT')
+    try:
+        idat = min(idat, _deflate(zlib.decompress(idat)), key=len)
+    except zlib.error as e:
+        raise PNGError(f'Corrupt image data: {e}') from e
+    out = [PNG_SIGNATURE]
+    for chunk_type, body in chunks:
+        if chunk_type == b'IDAT':
+            if idat is not None:
+                out.append(_chunk(b'IDAT', idat))
+                idat = None
+        elif chunk_type in (b'IHDR', b'PLTE', b'tRNS', b'IEND') + COLOR_CHUNKS:
+            out.append(_chunk(chunk_type, body))
+    return b''.join(out)
+
+def optimize_png(data):
+    """Smallest lossless re-encoding of a PNG, or ``data`` itself if nothing is smaller"""
+    data = bytes(data)
+    try:
+        image = decode_png(data)
+    except PNGError:
+        candidates = [_strip(data)]
+    else:
+        candidates = [encode_png(variant) for variant in reductions(image)]
+    return min(candidates + [data], key=len)
+
+def _halve(image):
+    """``image`` at half its width and height, each pixel the average of a 2x2 block"""
+    bpp = image.bytes_per_pixel
+    width, height = image.width // 2, image.height // 2
+    rows = image.rows()
+    out = []
+    for y in range(height):
+        # Rounding down vertically and up horizontally keeps the average unbiased
+        row = _average(rows[2 * y], rows[2 * y + 1])
+        even = bytearray(width * bpp)
+        odd = bytearray(width * bpp)
+        for channel in range(bpp):
+            even[channel::bpp] = row[channel::2 * bpp][:width]
+            odd[channel::bpp] = row[bpp + channel::2 * bpp][:width]
+        out.append(_average_up(bytes(even), bytes(odd)))
+    return PNGImage(width, height, image.color_type, b''.join(out), color_chunks=image.color_chunks)
+
+def downscale_png(data, halvings=1):
+    """
+    The PNG halved in size ``halvings`` times (2x2 box filter each time),
+    optimized. Translucent pixels are averaged without premultiplying.
+    """
+    image = expand(decode_png(data))
+    if image.transparency is not None:
+        raise PNGError('Colour-key transparency is not supported for scaling')
+    for _ in range(halvings):
+        if image.width < 2 or image.height < 2:
+            break
+        image = _halve(image)
+    return min((encode_png(variant) for variant in reductions(image)), key=len)
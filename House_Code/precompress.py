@@ -0,0 +1,184 @@
+"""
+Precompressed siblings and size budgets for the generated site.
+
+Every text asset gets ``.gz`` and ``.br`` files next to it, compressed
+at maximum settings, so a static host or CDN can serve them without
+compressing on the fly. Size budgets are checked against the transfer
+size (the smallest encoding available) and fail the build when exceeded.
+Each file is held to its most specific budget pattern, and the total only
+counts the files a visit loads.
+"""
+import fnmatch
+import gzip
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from build_output import inputs_key
+
+try:
+    import brotli
+except ImportError:
+    # Without brotli only .gz siblings are written
+    brotli = None
+
+TEXT_EXTENSIONS = ('.html', '.svg', '.css', '.js', '.json', '.xml', '.txt', '.webmanifest')
+
+ENCODINGS = {'.gz': 'gzip', '.br': 'brotli'}
+
+# Files whose references to other site files are followed by loaded_files()
+REFERRING_EXTENSIONS = ('.html', '.js', '.css')
+
+# Recorded with each sibling, so a change of settings recompresses everything
+COMPRESSION_SETTINGS = ['gzip-9'] + (['brotli-11'] if brotli is not None else [])
+
+class SizeBudgetError(Exception):
+    """Raised when generated files exceed their configured size budget"""
+
+def is_text_asset(relpath):
+    return relpath.endswith(TEXT_EXTENSIONS)
+
+def compress_variants(data):
+    """Return {suffix: compressed bytes} at maximum compression"""
+    variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data, mode=brotli.MODE_TEXT, quality=11, lgwin=24)
+    return variants
+
+def compress_bodies(bodies, workers=None):
+    """compress_variants() of each of ``bodies``, in a process pool"""
+    if workers == 1 or len(bodies) <= 1:
+        return [compress_variants(body) for body in bodies]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(compress_variants, bodies))
+
+def _compress_file(path):
+    with open(path, 'rb') as f:
+        return compress_variants(f.read())
+
+def siblings_up_to_date(output, relpath):
+    """True if the previous build compressed this exact ``relpath`` and its siblings are still there"""
+    inputs = inputs_key(output.files[relpath]['sha256'], COMPRESSION_SETTINGS)
+    previous = [relpath + suffix for suffix in ENCODINGS
+                if output.previous_files.get(relpath + suffix, {}).get('inputs') == inputs]
+    return bool(previous) and all(output.up_to_date(sibling, inputs) for sibling in previous)
+
+def write_siblings(output, relpath, variants):
+    """
+    Write the compressed ``variants`` of ``relpath`` (from compress_variants)
+    that are smaller than the original. Returns the relpaths written.
+    """
+    inputs = inputs_key(output.files[relpath]['sha256'], COMPRESSION_SETTINGS)
+    original_size = output.files[relpath]['size']
+    written = []
+    for suffix, data in variants.items():
+        if len(data) < original_size:
+            output.write_bytes(relpath + suffix, data, inputs=inputs)
+            written.append(relpath + suffix)
+    return written
+
+def precompress_outputs(output, workers=None):
+    """
+    Write .gz and .br siblings for every text asset recorded in ``output``.
+    Compression runs in a process pool; unchanged assets are skipped on
+    incremental builds. A variant that isn't smaller than the original is
+    left out, since serving it would only cost bytes.
+    """
+    pending = [relpath for relpath in sorted(output.files)
+               if is_text_asset(relpath) and not siblings_up_to_date(output, relpath)]
+
+    paths = [output.path(relpath) for relpath in pending]
+    if workers == 1 or len(paths) <= 1:
+        results = [_compress_file(path) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_compress_file, paths))
+
+    written = []
+    for relpath, variants in zip(pending, results):
+        written.extend(write_siblings(output, relpath, variants))
+    return written
+
+def transfer_sizes(output):
+    """Map each site file to the smallest number of bytes a client needs to fetch it"""
+    sizes = {}
+    for relpath, record in output.files.items():
+        base, suffix = os.path.splitext(relpath)
+        if suffix in ENCODINGS and base in output.files:
+            continue
+        candidates = [record['size']]
+        for encoded_suffix in ENCODINGS:
+            encoded = output.files.get(relpath + encoded_suffix)
+            if encoded:
+                candidates.append(encoded['size'])
+        sizes[relpath] = min(candidates)
+    return sizes
+
+def loaded_files(output):
+    """
+    Relpaths a visit can download: the HTML pages, plus every file that a
+    page, or a script or stylesheet it loads, names by its site path.
+    Unreferenced outputs, like the plain copy of a fingerprinted SVG, are
+    left out.
+    """
+    candidates = transfer_sizes(output)
+    # Whole names only, so svg/a.svg doesn't match inside svg/data.svg;
+    # longest first, so a name never stops short at one it starts with
+    names = sorted(candidates, key=len, reverse=True)
+    reference = re.compile(rf'(?<![\w.-])({"|".join(map(re.escape, names))})(?![\w.-])')
+    loaded = {relpath for relpath in candidates if relpath.endswith('.html')}
+    pending = sorted(loaded)
+    while pending:
+        with open(output.path(pending.pop()), encoding='utf-8', errors='replace') as f:
+            text = f.read()
+        for relpath in set(reference.findall(text)) - loaded:
+            loaded.add(relpath)
+            if relpath.endswith(REFERRING_EXTENSIONS):
+                pending.append(relpath)
+    return loaded
+
+def _specificity(pattern):
+    """Literal characters in an fnmatch pattern; more means more specific"""
+    return len(re.sub(r'\[[^\]]*\]|[*?]', '', pattern))
+
+def budget_for(relpath, patterns):
+    """
+    (pattern, limit) of the most specific pattern in ``patterns`` matching
+    ``relpath``, or None. Ties go to the pattern listed first.
+    """
+    matches = [(pattern, limit) for pattern, limit in patterns.items() if fnmatch.fnmatch(relpath, pattern)]
+    return max(matches, key=lambda match: _specificity(match[0]), default=None)
+
+def load_budgets(path):
+    """
+    Read a budget file, e.g.
+    {"total": 250000, "files": {"index.html": 16000, "svg/*.svg": 8000}}
+    Sizes are transfer sizes in bytes; patterns use fnmatch syntax, and a
+    file only gets the budget of its most specific matching pattern.
+    """
+    with open(path) as f:
+        budgets = json.load(f)
+    return {'total': budgets.get('total'), 'files': budgets.get('files', {})}
+
+def check_budgets(output, budgets):
+    """Print transfer sizes against the budgets; raise SizeBudgetError on any overrun"""
+    sizes = transfer_sizes(output)
+    violations = []
+
+    for relpath, size in sorted(sizes.items()):
+        budget = budget_for(relpath, budgets['files'])
+        if budget is not None and size > budget[1]:
+            violations.append(f"{relpath}: {size:,} B exceeds {budget[1]:,} B budget ({budget[0]})")
+
+    loaded = loaded_files(output)
+    total = sum(sizes[relpath] for relpath in loaded)
+    print(f"Transfer size: {total:,} B across {len(loaded)} loaded files"
+          + (f" (budget {budgets['total']:,} B)" if budgets['total'] else ""))
+    if budgets['total'] and total > budgets['total']:
+        violations.append(f"total: {total:,} B exceeds {budgets['total']:,} B budget")
+
+    if violations:
+        for violation in violations:
+            print(f"ERROR: Size budget exceeded - {violation}")
+        raise SizeBudgetError(f"{len(violations)} size budget(s) exceeded")
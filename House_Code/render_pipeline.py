@@ -0,0 +1,284 @@
+"""
+Post-render transforms for the HTML pages.
+
+A transform takes the page as one string and returns the new string.
+compose() chains transforms into a single callable, so a page is
+rendered, rewritten and minified in memory and then written once.
+
+replace_all() makes any number of literal rewrites in one scan, and
+minify_html() shrinks markup along with its inline <style> and <script>
+blocks. The static generator uses github_pages_pipeline(). The Flask
+app uses page_pipeline() when MINIFY_HTML=1.
+"""
+import re
+
+def compose(*transforms):
+    """Chain str -> str transforms into one, applied left to right"""
+    transforms = [transform for transform in transforms if transform is not None]
+
+    def pipeline(text):
+        for transform in transforms:
+            text = transform(text)
+        return text
+    return pipeline
+
+def replace_all(replacements):
+    """Transform making every literal replacement in a single pass over the text"""
+    replacements = {old: new for old, new in replacements.items() if old and old != new}
+    if not replacements:
+        return None
+    # Longest first, so a pattern never loses to its own prefix
+    pattern = re.compile('|'.join(re.escape(old) for old in sorted(replacements, key=len, reverse=True)))
+    return lambda text: pattern.sub(lambda match: replacements[match.group(0)], text)
+
+# ----------------------------------------------------------------------
+# CSS
+
+_CSS_TOKENS = re.compile(r'/\*.*?\*/|"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|\s+|[^\s"\'/]+|/', re.S)
+
+def minify_css(css):
+    """
+    Drop comments and formatting whitespace from a stylesheet. Strings are
+    kept as written. Spaces before a colon stay, since "a :hover" and
+    "a:hover" select different elements.
+    """
+    out = []
+    pending_space = False
+    for token in _CSS_TOKENS.findall(css):
+        if token.startswith('/*'):
+            pending_space = True
+            continue
+        if token.isspace():
+            pending_space = True
+            continue
+        if pending_space and out:
+            previous = out[-1][-1]
+            if previous not in '{};,:>' and token[0] not in '{};,>':
+                out.append(' ')
+        pending_space = False
+        out.append(token)
+    return ''.join(out).replace(';}', '}').strip()
+
+# ----------------------------------------------------------------------
+# JavaScript
+
+_WHITESPACE = ' \t\r\n\f\v'
+
+# A '/' after these starts a regular expression rather than a division
+_REGEX_AFTER_CHARS = set('(,=:[!&|?{};+-*%<>~^')
+_REGEX_AFTER_WORDS = {'return', 'typeof', 'instanceof', 'in', 'of', 'new', 'delete',
+                      'void', 'throw', 'case', 'do', 'else', 'yield', 'await'}
+
+def _is_word_char(c):
+    return c.isalnum() or c in '_$\\' or ord(c) > 127
+
+def _end_of_string(source, start):
+    """Index just past the string or template literal starting at ``start``"""
+    quote = source[start]
+    i = start + 1
+    while i < len(source):
+        c = source[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == quote:
+            return i + 1
+        if c == '\n' and quote != '`':
+            break
+        i += 1
+    return i
+
+def _end_of_regex(source, start):
+    """Index just past the regular expression literal (and its flags) at ``start``"""
+    i = start + 1
+    in_class = False
+    while i < len(source):
+        c = source[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == '\n':
+            return i
+        if c == '[':
+            in_class = True
+        elif c == ']':
+            in_class = False
+        elif c == '/' and not in_class:
+            i += 1
+            break
+        i += 1
+    while i < len(source) and _is_word_char(source[i]):
+        i += 1
+    return i
+
+def minify_js(source):
+    """
+    Drop comments and indentation from a script, keeping strings, template
+    literals and regular expressions as written. Line breaks are kept
+    wherever automatic semicolon insertion could depend on them, so the
+    output always parses the same way as the input.
+    (Template literals containing nested template literals aren't supported.)
+    """
+    out = []
+    pending = ''
+    last = ''
+    last_word = ''
+    i = 0
+    n = len(source)
+    while i < n:
+        c = source[i]
+        if c in _WHITESPACE:
+            j = i
+            while j < n and source[j] in _WHITESPACE:
+                j += 1
+            pending = '\n' if '\n' in source[i:j] or pending == '\n' else ' '
+            i = j
+            continue
+        if c == '/' and source.startswith('//', i):
+            j = source.find('\n', i)
+            i = n if j == -1 else j
+            pending = pending or ' '
+            continue
+        if c == '/' and source.startswith('/*', i):
+            j = source.find('*/', i + 2)
+            j = n if j == -1 else j + 2
+            pending = '\n' if '\n' in source[i:j] or pending == '\n' else (pending or ' ')
+            i = j
+            continue
+
+        if c in '\'"`':
+            j = _end_of_string(source, i)
+        elif c == '/' and (not last or last in _REGEX_AFTER_CHARS or last_word in _REGEX_AFTER_WORDS):
+            j = _end_of_regex(source, i)
+        elif _is_word_char(c):
+            j = i + 1
+            while j < n and _is_word_char(source[j]):
+                j += 1
+        else:
+            j = i + 1
+        token = source[i:j]
+
+        if pending and out:
+            first = token[0]
+            if pending == '\n':
+                if last not in '{([,;' and first not in '})],;.':
+                    out.append('\n')
+            elif (_is_word_char(last) and _is_word_char(first)) or (last in '+-/' and first == last) \
+                    or (last in '+-' and first in '+-'):
+                out.append(' ')
+        pending = ''
+
+        out.append(token)
+        last = token[-1]
+        last_word = token if _is_word_char(token[0]) else ''
+        i = j
+    return ''.join(out)
+
+# ----------------------------------------------------------------------
+# HTML
+
+_HTML_TOKENS = re.compile(
+    r'<!--.*?-->'
+    r'|<(?P<raw>script|style|pre|textarea)\b[^>]*>.*?</(?P=raw)\s*>'
+    r'|<[^>]+>'
+    r'|[^<]+', re.S | re.I)
+_TAG_NAME = re.compile(r'</?([A-Za-z][A-Za-z0-9-]*)')
+_TAG_WHITESPACE = re.compile(r'("[^"]*"|\'[^\']*\')|\s+')
+_TEXT_WHITESPACE = re.compile(r'\s+')
+
+# Whitespace next to these tags never renders
+BLOCK_TAGS = {
+    'html', 'head', 'body', 'meta', 'link', 'title', 'base', 'style', 'script', 'noscript',
+    'div', 'section', 'main', 'header', 'footer', 'nav', 'aside', 'article', 'h1', 'h2',
+    'h3', 'h4', 'h5', 'h6', 'p', 'ul', 'ol', 'li', 'dl', 'dt', 'dd', 'table', 'thead',
+    'tbody', 'tr', 'td', 'th', 'form', 'fieldset', 'figure', 'figcaption', 'br', 'hr',
+    '!doctype',
+}
+
+JS_TYPES = {'', 'text/javascript', 'application/javascript', 'module'}
+
+def _tag_name(tag):
+    if tag.lower().startswith('<!doctype'):
+        return '!doctype'
+    match = _TAG_NAME.match(tag)
+    return match.group(1).lower() if match else ''
+
+def _minify_tag(tag):
+    """Collapse whitespace between attributes, leaving quoted values alone"""
+    tag = _TAG_WHITESPACE.sub(lambda match: match.group(1) or ' ', tag)
+    return tag[:-2] + '>' if tag.endswith(' >') else tag
+
+def _minify_raw(block, name):
+    """Minify a <script> or <style> block; <pre> and <textarea> keep their content"""
+    open_end = block.index('>') + 1
+    close_start = block.lower().rindex('</')
+    open_tag, body, close_tag = block[:open_end], block[open_end:close_start], block[close_start:]
+    if name == 'style':
+        body = minify_css(body)
+    elif name == 'script':
+        script_type = re.search(r'\btype\s*=\s*["\']?([^"\'\s>]*)', open_tag, re.I)
+        if (script_type.group(1).lower() if script_type else '') in JS_TYPES and '<!--' not in body:
+            body = minify_js(body).strip()
+    return _minify_tag(open_tag) + body + close_tag
+
+def minify_html(html):
+    """
+    Minify a page: comments go (except conditional ones), whitespace runs
+    collapse to one space and disappear next to block-level tags, and
+    inline <style> and <script> blocks are minified. <pre> and <textarea>
+    content and attribute values are kept as written.
+    """
+    tokens = [match.group(0) for match in _HTML_TOKENS.finditer(html)]
+    names = [_tag_name(token) if token.startswith('<') and not token.startswith('<!--') else None
+             for token in tokens]
+    out = []
+    for position, token in enumerate(tokens):
+        name = names[position]
+        if token.startswith('<!--'):
+            if token.startswith('<!--[if'):
+                out.append(token)
+            continue
+        if name in ('script', 'style', 'pre', 'textarea') and not token.startswith('</'):
+            out.append(_minify_raw(token, name))
+            continue
+        if name is not None:
+            out.append(_minify_tag(token))
+            continue
+
+        # Whitespace at the edge of a block never renders
+        text = _TEXT_WHITESPACE.sub(' ', token)
+        previous = next((names[k] for k in range(position - 1, -1, -1) if names[k] is not None), None)
+        following = next((names[k] for k in range(position + 1, len(tokens)) if names[k] is not None), None)
+        if previous is None or previous in BLOCK_TAGS:
+            text = text.lstrip()
+        if following is None or following in BLOCK_TAGS:
+            text = text.rstrip()
+        if text:
+            out.append(text)
+    return ''.join(out).strip()
+
+# ----------------------------------------------------------------------
+# Pipelines
+
+def page_pipeline(minify=True):
+    """Transforms for pages served by the Flask app"""
+    return compose(minify_html if minify else None)
+
+def github_pages_pipeline(github_pages_url, source_image_filename, minify=True):
+    """
+    Transforms adjusting a rendered page for GitHub Pages. In one pass they
+    make the fallback SVG URL relative, add a <base> tag, and point
+    og:image and twitter:image at the preview image that was actually
+    copied. Then the page is minified.
+    """
+    return compose(
+        replace_all({
+            # `/svg/layer-name.svg` -> `svg/layer-name.svg` (without leading slash)
+            'svgObject.data = layer.url || `/svg/': 'svgObject.data = layer.url || `svg/',
+            # Base tag for path resolution, right after <head>
+            '<head>': f'<head>\n  <base href="{github_pages_url}/">',
+            # Social cards need an absolute URL to the preview image we copied
+            f'{github_pages_url}/static/house-preview.png': f'{github_pages_url}/static/{source_image_filename}',
+        }),
+        minify_html if minify else None,
+    )
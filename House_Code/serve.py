@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Production server for the Flask app.
+
+Runs the app under gunicorn's pre-forking server. The app, its asset
+pack and its caches are loaded and warmed once in the master process
+before the workers fork, so workers share those memory pages and the
+first requests after a deploy don't pay for cold caches.
+
+    python serve.py --workers 4 --threads 8
+    python app.py serve            # same thing
+    SERVER_MODE=production python app.py
+
+Settings default to the environment: PORT (5000), BIND (0.0.0.0:$PORT),
+WEB_CONCURRENCY (workers, one per CPU) and THREADS (4 per worker).
+"""
+import argparse
+import os
+import sys
+
+def warm_up(application):
+    """
+    Fill the app's caches before any traffic arrives: the rendered index
+    page with its compressed variants, every layer SVG and each chapter's
+    composed SVG.
+    """
+    from site_data import CHAPTERS, LAYERS
+
+    client = application.test_client()
+    paths = ['/'] + [f"/svg/{layer['id']}.svg" for layer in LAYERS]
+    paths += [f"/svg/compose/{chapter['preset']}.svg" for chapter in CHAPTERS]
+
+    for path in paths:
+        response = client.get(path, headers={'Accept-Encoding': 'br, gzip'})
+        response.get_data()
+        response.close()
+        if response.status_code != 200:
+            raise RuntimeError(f"Warm-up request for {path} failed with {response.status_code}")
+    return paths
+
+def server_options(args):
+    """gunicorn settings for the parsed arguments"""
+    options = {
+        'bind': args.bind,
+        'workers': args.workers,
+        'threads': args.threads,
+        'worker_class': 'gthread' if args.threads > 1 else 'sync',
+        # Load the app (and its asset pack) once in the master, then fork
+        'preload_app': True,
+        'timeout': args.timeout,
+        'accesslog': '-' if args.access_log else None,
+        'errorlog': '-',
+    }
+    return {key: value for key, value in options.items() if value is not None}
+
+def parse_args(argv=None):
+    port = os.getenv('PORT', '5000')
+    parser = argparse.ArgumentParser(description="Run the app under a multi-worker production server")
+    parser.add_argument("--bind", default=os.getenv('BIND', f"0.0.0.0:{port}"),
+                        help="address to listen on (default: $BIND or 0.0.0.0:$PORT)")
+    parser.add_argument("--workers", type=int, default=int(os.getenv('WEB_CONCURRENCY', os.cpu_count() or 1)),
+                        help="worker processes (default: $WEB_CONCURRENCY or one per CPU)")
+    parser.add_argument("--threads", type=int, default=int(os.getenv('THREADS', '4')),
+                        help="threads per worker (default: $THREADS or 4)")
+    parser.add_argument("--timeout", type=int, default=int(os.getenv('WORKER_TIMEOUT', '30')),
+                        help="seconds before a silent worker is restarted (default: 30)")
+    parser.add_argument("--access-log", action="store_true",
+                        help="log every request to stdout")
+    parser.add_argument("--no-warm-up", dest="warm_up", action="store_false",
+                        help="skip filling the caches before accepting traffic")
+    return parser.parse_args(argv)
+
+def main(argv=None, application=None):
+    args = parse_args(argv)
+
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        print("ERROR: The production server needs gunicorn (pip install -r requirements.txt)")
+        return 1
+
+    if application is None:
+        from app import app as application
+
+    if args.warm_up:
+        paths = warm_up(application)
+        print(f"Warmed {len(paths)} routes before forking")
+        # Otherwise every worker would inherit and report the warm-up requests
+        import metrics
+        metrics.reset()
+
+    class ProductionServer(BaseApplication):
+        def load_config(self):
+            for key, value in server_options(args).items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return application
+
+    print(f"Starting {args.workers} workers x {args.threads} threads on {args.bind}")
+    ProductionServer().run()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
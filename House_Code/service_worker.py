@@ -0,0 +1,45 @@
+"""
+Service worker for the static site build.
+
+generate_static_site.py renders templates/service-worker.js with the list
+of files to precache: the pages, the fingerprinted layer SVGs, the
+composed chapters, the element indexes and the preview image, each with
+a revision taken from its content hash. The worker serves fingerprinted files cache-first,
+since their URL changes with their content. Everything else is served
+stale-while-revalidate. A redeploy installs a worker whose list differs
+only where content changed, so only those files are downloaded again.
+
+Only the static build registers the worker. The Flask app leaves
+service_worker_url unset, so development never serves from a cache.
+"""
+import fnmatch
+
+from asset_manifest import FINGERPRINT_LENGTH, parse_fingerprint
+
+SERVICE_WORKER_NAME = "service-worker.js"
+
+# Unfingerprinted files worth having offline, besides the preview image
+PRECACHE_PATTERNS = ('index.html', 'chapters/*/index.html', 'svg/compose/*.svg', 'api/layers/*/elements.json')
+
+def precache_entries(files, preview_image):
+    """
+    [{url, revision, hashed}] for the output ``files`` ({relpath: record})
+    the worker should precache, with URLs relative to the site root.
+    """
+    entries = []
+    for relpath in sorted(files):
+        directory, _, name = relpath.rpartition('/')
+        hashed = directory == 'svg' and parse_fingerprint(name) is not None
+        if not (hashed or relpath == f'static/{preview_image}'
+                or any(fnmatch.fnmatch(relpath, pattern) for pattern in PRECACHE_PATTERNS)):
+            continue
+        entries.append({
+            'url': relpath,
+            'revision': files[relpath]['sha256'][:FINGERPRINT_LENGTH],
+            'hashed': hashed
+        })
+    return entries
+
+def render_service_worker(template, entries):
+    """The worker script from the compiled service-worker.js template"""
+    return template.render(precache=entries)
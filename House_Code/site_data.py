@@ -0,0 +1,74 @@
+"""
+Layer and chapter data shared by the Flask app and the static site generator.
+
+This module must not import Flask so generate_static_site.py can use it
+in GitHub Actions without the app's dependencies.
+"""
+
+# Layer information, in drawing order (first is the bottom layer)
+LAYERS = [
+    {"id": "environment-layer", "name": "Environment", "default": True},
+    {"id": "house-structure", "name": "House Structure", "default": True},
+    {"id": "html-tags-layer", "name": "HTML Tags", "default": False},
+    {"id": "structure-layer", "name": "HTML Structure", "default": False},
+    {"id": "css-design-layer", "name": "CSS Design", "default": False},
+    {"id": "interactive-layer", "name": "JavaScript Interactivity", "default": False},
+    {"id": "systems-layer", "name": "Backend Systems", "default": False}
+]
+
+# Chapter presets
+CHAPTERS = [
+    {
+        "name": "Base House",
+        "preset": "base",
+        "description": "The complete house with all visual elements",
+        "layers": ["environment-layer", "house-structure"]
+    },
+    {
+        "name": "Chapter 1: HTML Tags",
+        "preset": "html-tags",
+        "description": "The blueprint layer showing HTML tags",
+        "layers": ["environment-layer", "house-structure", "html-tags-layer"]
+    },
+    {
+        "name": "Chapter 2: HTML Structure",
+        "preset": "html-structure",
+        "description": "The structural framing of the house",
+        "layers": ["environment-layer", "structure-layer"]
+    },
+    {
+        "name": "Chapter 3: CSS Design",
+        "preset": "css-design",
+        "description": "The design layer with visual styling",
+        "layers": ["environment-layer", "house-structure", "css-design-layer"]
+    },
+    {
+        "name": "Chapter 4: JavaScript",
+        "preset": "javascript",
+        "description": "The interactive elements that respond to events",
+        "layers": ["environment-layer", "house-structure", "interactive-layer"]
+    },
+    {
+        "name": "Chapter 5: Backend",
+        "preset": "backend",
+        "description": "The internal systems that power the house",
+        "layers": ["environment-layer", "house-structure", "systems-layer"]
+    }
+]
+
+LAYER_ORDER = {layer["id"]: position for position, layer in enumerate(LAYERS)}
+
+def normalize_layer_ids(layer_ids):
+    """
+    Return the requested layer ids as a tuple in canonical drawing order,
+    without blanks or duplicates. Raises ValueError for unknown ids.
+    """
+    requested = {layer_id.strip() for layer_id in layer_ids if layer_id.strip()}
+    unknown = sorted(requested - LAYER_ORDER.keys())
+    if unknown:
+        raise ValueError(f"Unknown layers: {', '.join(unknown)}")
+    return tuple(sorted(requested, key=LAYER_ORDER.get))
+
+def layers_for_chapter(chapter, layers=None):
+    """Copy of ``layers`` (default LAYERS) with exactly the chapter's layers marked visible"""
+    return [dict(layer, default=layer["id"] in chapter["layers"]) for layer in layers or LAYERS]
@@ -0,0 +1,103 @@
+"""
+Merge several layer SVGs into one document.
+
+Each layer keeps its own viewBox as a nested <svg>, and its ids are
+prefixed with the layer id so layers that reuse an id (house-structure
+appears in more than one file) don't collide once they share a document.
+
+inline_layer() applies the same scoping to a layer that is embedded in
+the HTML page, where its classes are scoped as well so the page's
+stylesheet can't reach into it.
+"""
+import re
+import xml.etree.ElementTree as ET
+
+SVG_NS = 'http://www.w3.org/2000/svg'
+XLINK_NS = 'http://www.w3.org/1999/xlink'
+
+ET.register_namespace('', SVG_NS)
+ET.register_namespace('xlink', XLINK_NS)
+
+DEFAULT_VIEWBOX = '0 0 800 600'
+
+_URL_REF = re.compile(r'url\(\s*#([^)\s]+)\s*\)')
+_HREF_ATTRS = ('href', f'{{{XLINK_NS}}}href')
+
+def scope_layer(layer_id, data, scope_classes=False):
+    """
+    Parse one layer SVG and prefix every id (and every reference to it)
+    with ``layer_id``. With scope_classes=True class names get the same
+    prefix. Returns the root <svg> element, now carrying the layer id itself.
+    """
+    root = ET.fromstring(bytes(data))
+    prefix = f'{layer_id}--'
+
+    ids = {element.get('id') for element in root.iter() if element.get('id')}
+    for element in root.iter():
+        if element.get('id'):
+            element.set('id', prefix + element.get('id'))
+        if scope_classes and element.get('class'):
+            element.set('class', ' '.join(prefix + name for name in element.get('class').split()))
+        for name, value in element.attrib.items():
+            if name in _HREF_ATTRS and value.startswith('#') and value[1:] in ids:
+                element.set(name, '#' + prefix + value[1:])
+            elif 'url(' in value:
+                element.set(name, _URL_REF.sub(
+                    lambda match: f'url(#{prefix}{match.group(1)})' if match.group(1) in ids else match.group(0),
+                    value))
+
+    root.set('id', layer_id)
+    return root
+
+def compose_layers(layers):
+    """
+    Merge ``(layer_id, svg_bytes)`` pairs into one SVG document.
+    Layers are drawn in the order given, so pass them bottom layer first.
+    """
+    nested = [scope_layer(layer_id, data) for layer_id, data in layers]
+    viewbox = nested[0].get('viewBox', DEFAULT_VIEWBOX) if nested else DEFAULT_VIEWBOX
+
+    document = ET.Element(f'{{{SVG_NS}}}svg', {'viewBox': viewbox})
+    for layer in nested:
+        layer.set('width', '100%')
+        layer.set('height', '100%')
+        document.append(layer)
+
+    return ET.tostring(document, encoding='utf-8', xml_declaration=False)
+
+def inline_layer(layer_id, data, label):
+    """
+    Markup for one layer embedded in the page as an inline <svg>, with the
+    id, class and accessible name the page's <object> layers have.
+    """
+    root = scope_layer(layer_id, data, scope_classes=True)
+    root.attrib.pop('width', None)
+    root.attrib.pop('height', None)
+    root.set('id', f'{layer_id}-svg')
+    root.set('class', 'svg-layer')
+    root.set('role', 'img')
+    root.set('aria-label', label)
+    title = ET.Element(f'{{{SVG_NS}}}title')
+    title.text = label
+    root.insert(0, title)
+    return ET.tostring(root, encoding='unicode')
+
+def inline_layers(layers, read):
+    """
+    {layer id: inline markup} for the layers visible on first paint, so
+    they draw with the HTML instead of waiting for a fetch each.
+    ``read(filename)`` returns a layer's SVG bytes or None. Layers that
+    can't be read or parsed are left out; the page loads those itself.
+    """
+    markup = {}
+    for layer in layers:
+        if not layer.get('default'):
+            continue
+        data = read(f"{layer['id']}.svg")
+        if data is None:
+            continue
+        try:
+            markup[layer['id']] = inline_layer(layer['id'], data, f"{layer['name']} visualization layer")
+        except ET.ParseError:
+            continue
+    return markup
@@ -0,0 +1,226 @@
+"""
+Element index of a layer SVG, for hit-testing and label search.
+
+The index lists every drawn element of a layer with its id, classes,
+parent, text and bounding box, so the page can find what is under the
+pointer or which element says "API" without walking the embedded
+document. app.py serves it from /api/layers/<id>/elements and
+generate_static_site.py writes the same JSON to
+api/layers/<id>/elements.json.
+
+Bounding boxes are [x, y, width, height] in the layer's viewBox units,
+after transforms, and leave strokes out like getBBox() does. Curves are
+boxed by their control points and arcs by their end points. Text is
+boxed from its font size, with an average glyph width of 0.6 em.
+Layers inlined into the page prefix ids and classes with "<layer>--"
+(see svg_compose); the index uses the names the layer file has.
+"""
+import json
+import math
+import re
+import xml.etree.ElementTree as ET
+
+# Bump when the same SVG would now index differently
+INDEX_VERSION = 1
+
+SVG_NS = '{http://www.w3.org/2000/svg}'
+
+# Elements that aren't drawn, or are only drawn through a reference
+SKIPPED = {'defs', 'title', 'desc', 'metadata', 'style', 'script', 'linearGradient', 'radialGradient',
+           'pattern', 'clipPath', 'mask', 'marker', 'symbol', 'filter', 'animate', 'animateTransform',
+           'animateMotion', 'set'}
+
+# Text layout is inherited from groups
+TEXT_STYLE = ('font-size', 'text-anchor')
+
+GLYPH_WIDTH = 0.6
+ASCENT, DESCENT = 0.8, 0.2
+
+_NUMBER = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+_TRANSFORM = re.compile(r'(matrix|translate|scale|rotate|skewX|skewY)\s*\(([^)]*)\)')
+_PATH_COMMAND = re.compile(r'([MmLlHhVvCcSsQqTtAaZz])([^MmLlHhVvCcSsQqTtAaZz]*)')
+
+IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+def _numbers(value):
+    return [float(number) for number in _NUMBER.findall(value or '')]
+
+def _number(element, name, default=0.0):
+    numbers = _numbers(element.get(name))
+    return numbers[0] if numbers else default
+
+def _multiply(m, n):
+    """The affine matrix applying n, then m"""
+    a, b, c, d, e, f = m
+    return (a * n[0] + c * n[1], b * n[0] + d * n[1],
+            a * n[2] + c * n[3], b * n[2] + d * n[3],
+            a * n[4] + c * n[5] + e, b * n[4] + d * n[5] + f)
+
+def parse_transform(value):
+    """(a, b, c, d, e, f) of an SVG transform attribute"""
+    matrix = IDENTITY
+    for name, arguments in _TRANSFORM.findall(value or ''):
+        args = _numbers(arguments)
+        if name == 'matrix' and len(args) == 6:
+            step = tuple(args)
+        elif name == 'translate' and args:
+            step = (1, 0, 0, 1, args[0], args[1] if len(args) > 1 else 0)
+        elif name == 'scale' and args:
+            step = (args[0], 0, 0, args[1] if len(args) > 1 else args[0], 0, 0)
+        elif name == 'rotate' and args:
+            cos, sin = math.cos(math.radians(args[0])), math.sin(math.radians(args[0]))
+            cx, cy = (args[1], args[2]) if len(args) == 3 else (0, 0)
+            step = (cos, sin, -sin, cos, cx - cos * cx + sin * cy, cy - sin * cx - cos * cy)
+        elif name == 'skewX' and args:
+            step = (1, 0, math.tan(math.radians(args[0])), 1, 0, 0)
+        elif name == 'skewY' and args:
+            step = (1, math.tan(math.radians(args[0])), 0, 1, 0, 0)
+        else:
+            continue
+        matrix = _multiply(matrix, step)
+    return matrix
+
+def path_points(d):
+    """End and control points of a path's segments, in absolute coordinates"""
+    points = []
+    x = y = start_x = start_y = 0.0
+    for command, arguments in _PATH_COMMAND.findall(d or ''):
+        args = _numbers(arguments)
+        relative = command.islower()
+        command = command.upper()
+        if command == 'Z':
+            x, y = start_x, start_y
+            continue
+        size = {'M': 2, 'L': 2, 'T': 2, 'H': 1, 'V': 1, 'C': 6, 'S': 4, 'Q': 4, 'A': 7}[command]
+        for offset in range(0, len(args) - size + 1, size):
+            group = args[offset:offset + size]
+            if command == 'H':
+                x = group[0] + (x if relative else 0)
+            elif command == 'V':
+                y = group[0] + (y if relative else 0)
+            elif command == 'A':
+                x, y = group[5] + (x if relative else 0), group[6] + (y if relative else 0)
+            else:
+                pairs = [(group[i] + (x if relative else 0), group[i + 1] + (y if relative else 0))
+                         for i in range(0, size, 2)]
+                points.extend(pairs[:-1])
+                x, y = pairs[-1]
+            points.append((x, y))
+            if command == 'M' and offset == 0:
+                start_x, start_y = x, y
+    return points
+
+def _text_box(element, style):
+    text = ' '.join(''.join(element.itertext()).split())
+    size = _numbers(style.get('font-size')) or [16.0]
+    width = len(text) * size[0] * GLYPH_WIDTH
+    x = _number(element, 'x')
+    x -= {'middle': width / 2, 'end': width}.get(style.get('text-anchor'), 0)
+    y = _number(element, 'y')
+    return [(x, y - size[0] * ASCENT), (x + width, y + size[0] * DESCENT)]
+
+def shape_points(tag, element, style):
+    """Points whose box bounds a basic shape, in its own coordinates, or None"""
+    if tag in ('rect', 'image', 'use', 'foreignObject'):
+        x, y = _number(element, 'x'), _number(element, 'y')
+        return [(x, y), (x + _number(element, 'width'), y + _number(element, 'height'))]
+    if tag in ('circle', 'ellipse'):
+        cx, cy = _number(element, 'cx'), _number(element, 'cy')
+        rx = _number(element, 'r') if tag == 'circle' else _number(element, 'rx')
+        ry = _number(element, 'r') if tag == 'circle' else _number(element, 'ry')
+        return [(cx - rx, cy - ry), (cx + rx, cy + ry)]
+    if tag == 'line':
+        return [(_number(element, 'x1'), _number(element, 'y1')), (_number(element, 'x2'), _number(element, 'y2'))]
+    if tag in ('polyline', 'polygon'):
+        values = _numbers(element.get('points'))
+        return list(zip(values[0::2], values[1::2]))
+    if tag == 'path':
+        return path_points(element.get('d'))
+    if tag == 'text':
+        return _text_box(element, style)
+    return None
+
+def _box(points, matrix):
+    """[x, y, width, height] of ``points`` after ``matrix``"""
+    a, b, c, d, e, f = matrix
+    xs = [a * x + c * y + e for x, y in points]
+    ys = [b * x + d * y + f for x, y in points]
+    return [min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys)]
+
+def _union(boxes):
+    boxes = [box for box in boxes if box]
+    if not boxes:
+        return None
+    left = min(box[0] for box in boxes)
+    top = min(box[1] for box in boxes)
+    return [left, top, max(box[0] + box[2] for box in boxes) - left, max(box[1] + box[3] for box in boxes) - top]
+
+def _index_element(element, parent, depth, matrix, style, elements):
+    if not isinstance(element.tag, str):
+        return None
+    tag = element.tag.replace(SVG_NS, '')
+    if tag in SKIPPED:
+        return None
+    matrix = _multiply(matrix, parse_transform(element.get('transform')))
+    style = dict(style, **{name: element.get(name) for name in TEXT_STYLE if element.get(name)})
+
+    entry = {'index': len(elements), 'tag': tag, 'parent': parent, 'depth': depth}
+    if element.get('id'):
+        entry['id'] = element.get('id')
+    if element.get('class'):
+        entry['classes'] = element.get('class').split()
+    elements.append(entry)
+
+    if tag == 'text':
+        text = ' '.join(''.join(element.itertext()).split())
+        if text:
+            entry['text'] = text
+    if tag in ('g', 'a', 'svg', 'switch'):
+        boxes = [_index_element(child, entry['index'], depth + 1, matrix, style, elements) for child in element]
+        box = _union(boxes)
+    else:
+        points = shape_points(tag, element, style)
+        box = _box(points, matrix) if points else None
+    entry['bbox'] = [round(value, 2) for value in box] if box else None
+    return box
+
+def element_index(layer_id, data):
+    """
+    Index of one layer SVG: {layer, version, viewBox, bbox, elements}.
+    ``elements`` lists drawn elements depth first, each with its index,
+    tag, parent index (None at the top), depth and bbox, plus id, classes
+    and text when it has them. Raises ET.ParseError for malformed SVG.
+    """
+    root = ET.fromstring(bytes(data))
+    viewbox = _numbers(root.get('viewBox'))
+    elements = []
+    boxes = [_index_element(child, None, 0, IDENTITY, {}, elements) for child in root]
+    box = _union(boxes)
+    return {
+        'layer': layer_id,
+        'version': INDEX_VERSION,
+        'viewBox': viewbox if len(viewbox) == 4 else None,
+        'bbox': [round(value, 2) for value in box] if box else None,
+        'elements': elements
+    }
+
+def element_index_json(layer_id, data):
+    """element_index() as compact JSON bytes"""
+    return json.dumps(element_index(layer_id, data), separators=(',', ':')).encode('utf-8')
+
+def layer_element_indexes(layers, read):
+    """
+    {layer id: index JSON} for ``layers``. ``read(filename)`` returns a
+    layer's SVG bytes or None; layers that can't be read or parsed are
+    left out.
+    """
+    indexes = {}
+    for layer in layers:
+        data = read(f"{layer['id']}.svg")
+        if data is None:
+            continue
+        try:
+            indexes[layer['id']] = element_index_json(layer['id'], data)
+        except ET.ParseError as e:
+            print(f"Could not index {layer['id']}.svg: {e}")
+    return indexes
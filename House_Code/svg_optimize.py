@@ -0,0 +1,221 @@
+"""
+Lossless-looking minification for the layer SVGs.
+
+Used by the static generator and by the Flask asset pack, so both serve
+the same bytes. Comments and formatting whitespace are dropped, numbers
+in geometry attributes are rounded, attributes that only restate a
+default are removed, and groups that add nothing are unwrapped.
+"""
+import re
+import xml.etree.ElementTree as ET
+
+# Importing svg_compose registers the SVG namespace as the default one
+import svg_compose  # noqa: F401
+
+DEFAULT_PRECISION = 2
+
+# Attributes whose numbers are safe to round
+NUMERIC_ATTRS = {
+    'x', 'y', 'width', 'height', 'cx', 'cy', 'r', 'rx', 'ry',
+    'x1', 'y1', 'x2', 'y2', 'points', 'd', 'transform',
+    'stroke-width', 'opacity', 'fill-opacity', 'stroke-opacity', 'font-size',
+}
+
+# Presentation attributes that inherit, with their initial values.
+# These can only be dropped if no ancestor sets something else, either as
+# an attribute or in its style. Elements a <use> points at inherit from
+# the <use> instead, and a <style> sheet can set them on any ancestor, so
+# nothing is dropped in those cases.
+INHERITED_DEFAULTS = {
+    'fill': {'#000', '#000000', 'black'},
+    'fill-opacity': {'1'},
+    'fill-rule': {'nonzero'},
+    'stroke': {'none'},
+    'stroke-opacity': {'1'},
+    'stroke-width': {'1'},
+    'stroke-linecap': {'butt'},
+    'stroke-linejoin': {'miter'},
+    'font-style': {'normal'},
+    'font-weight': {'normal'},
+    'visibility': {'visible'},
+}
+
+# Non-inherited attributes that do nothing at their default value
+ELEMENT_DEFAULTS = {
+    'opacity': {'1'},
+}
+
+# Elements whose x and y default to 0 (filters, masks and patterns don't)
+ZERO_ORIGIN_ELEMENTS = {'rect', 'text', 'use', 'image', 'svg', 'foreignObject'}
+
+# Attributes a wrapper <g> can hand down to its only child
+HOISTABLE_ATTRS = set(INHERITED_DEFAULTS) | {'opacity'}
+
+# Elements whose character data is content rather than formatting
+TEXT_ELEMENTS = {'text', 'tspan', 'textPath', 'title', 'desc'}
+
+# Elements whose character data is code, kept exactly as written
+RAW_TEXT_ELEMENTS = {'style', 'script'}
+
+XLINK_HREF = '{http://www.w3.org/1999/xlink}href'
+
+COLOR_ATTRS = {'fill', 'stroke', 'stop-color', 'flood-color', 'lighting-color'}
+
+_NUMBER = re.compile(r'-?(?:\d+\.\d*|\.\d+|\d+)(?:[eE][-+]?\d+)?')
+_LONG_HEX = re.compile(r'^#([0-9a-fA-F])\1([0-9a-fA-F])\2([0-9a-fA-F])\3$')
+_WHITESPACE = re.compile(r'\s+')
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+def format_number(value, precision=DEFAULT_PRECISION):
+    """Shortest form of a number rounded to ``precision`` decimals"""
+    text = f'{round(float(value), precision):.{precision}f}'
+    if '.' in text:
+        text = text.rstrip('0').rstrip('.')
+    if text in ('-0', ''):
+        text = '0'
+    if text.startswith('0.'):
+        text = text[1:]
+    elif text.startswith('-0.'):
+        text = '-' + text[2:]
+    return text
+
+def _round_numbers(value, precision):
+    return _NUMBER.sub(lambda match: format_number(match.group(0), precision), value)
+
+def _style_declarations(style):
+    """{property: value} for the declarations in a style attribute"""
+    declarations = {}
+    for declaration in style.split(';'):
+        name, colon, value = declaration.partition(':')
+        if colon:
+            declarations[name.strip().lower()] = value.strip()
+    return declarations
+
+def _use_references(root):
+    """Ids of the elements that a <use> in the document points at"""
+    referenced = set()
+    for element in root.iter():
+        if _local(element.tag) == 'use':
+            href = element.get('href') or element.get(XLINK_HREF) or ''
+            if href.startswith('#'):
+                referenced.add(href[1:])
+    return referenced
+
+def _shorten_color(value):
+    match = _LONG_HEX.match(value)
+    if match:
+        return '#' + ''.join(match.groups()).lower()
+    return value
+
+def _optimize_attributes(element, inherited, precision):
+    """Rewrite element's attributes in place; returns what its children inherit"""
+    zero_origin = _local(element.tag) in ZERO_ORIGIN_ELEMENTS
+    for name in list(element.attrib):
+        value = element.attrib[name].strip()
+        if name in NUMERIC_ATTRS:
+            value = _round_numbers(value, precision)
+        if name in COLOR_ATTRS:
+            value = _shorten_color(value)
+        if name == 'style':
+            value = _WHITESPACE.sub(' ', value).replace(': ', ':').replace('; ', ';').rstrip(';')
+
+        if name in ELEMENT_DEFAULTS and value in ELEMENT_DEFAULTS[name]:
+            del element.attrib[name]
+        elif zero_origin and name in ('x', 'y') and value == '0':
+            del element.attrib[name]
+        elif name in INHERITED_DEFAULTS and value in INHERITED_DEFAULTS[name] and name not in inherited:
+            del element.attrib[name]
+        else:
+            element.set(name, value)
+
+    children_inherit = dict(inherited)
+    for name in INHERITED_DEFAULTS:
+        if name in element.attrib:
+            children_inherit[name] = element.attrib[name]
+    # Style declarations override the attributes
+    for name, value in _style_declarations(element.get('style', '')).items():
+        if name in INHERITED_DEFAULTS:
+            children_inherit[name] = value
+    return children_inherit
+
+def _collapse_group(group, referenced):
+    """
+    Return the elements that should replace ``group`` in its parent:
+    the group itself, or its children if the group adds nothing.
+    """
+    if _local(group.tag) != 'g' or 'id' in group.attrib or 'class' in group.attrib:
+        return [group]
+
+    children = list(group)
+    if not group.attrib:
+        return children
+
+    # A styled wrapper around a single element can hand its styling down
+    if len(children) == 1 and set(group.attrib) <= HOISTABLE_ATTRS:
+        child = children[0]
+        # A <use> of the child would pick the styling up too
+        if not set(group.attrib) & set(child.attrib) and child.get('id') not in referenced:
+            for name, value in group.attrib.items():
+                child.set(name, value)
+            child.tail = group.tail
+            return [child]
+
+    return [group]
+
+def _optimize_element(element, inherited, precision, referenced, collapse=True):
+    if element.get('id') in referenced:
+        # What this inherits depends on the <use>, so keep every default
+        inherited = dict.fromkeys(INHERITED_DEFAULTS)
+    children_inherit = _optimize_attributes(element, inherited, precision)
+
+    # Style sheets and scripts keep their text exactly as written
+    is_raw = _local(element.tag) in RAW_TEXT_ELEMENTS
+    is_text = _local(element.tag) in TEXT_ELEMENTS
+    if is_text:
+        if element.text:
+            text = _WHITESPACE.sub(' ', element.text)
+            # Keep the space in front of a following <tspan>
+            element.text = (text.strip() if len(element) == 0 else text.lstrip()) or None
+    elif not is_raw and element.text is not None and not element.text.strip():
+        element.text = None
+
+    new_children = []
+    for child in list(element):
+        _optimize_element(child, children_inherit, precision, referenced, collapse)
+        if child.tail is not None and not is_raw:
+            # Between <tspan>s a run of whitespace still renders as one space
+            child.tail = _WHITESPACE.sub(' ', child.tail) if is_text else None
+        new_children.extend(_collapse_group(child, referenced) if collapse else [child])
+
+    if new_children != list(element):
+        for child in list(element):
+            element.remove(child)
+        element.extend(new_children)
+
+def optimize_svg(data, precision=DEFAULT_PRECISION):
+    """Return minified SVG bytes for ``data`` (bytes or str)"""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    root = ET.fromstring(bytes(data))
+    # Selectors in a <style> sheet can match any element, including groups
+    # that would otherwise be unwrapped, so such documents keep their
+    # structure and every default
+    styled = any(_local(element.tag) == 'style' for element in root.iter())
+    inherited = dict.fromkeys(INHERITED_DEFAULTS) if styled else {}
+    _optimize_element(root, inherited, precision, _use_references(root), collapse=not styled)
+    root.tail = None
+    return ET.tostring(root, encoding='utf-8', xml_declaration=False).replace(b' />', b'/>')
+
+def svg_transform(precision=DEFAULT_PRECISION):
+    """Asset transform for AssetStore: optimize .svg files, pass everything else through"""
+    def transform(name, data):
+        if not name.lower().endswith('.svg'):
+            return data
+        try:
+            return optimize_svg(data, precision)
+        except ET.ParseError:
+            # Serve malformed files as authored rather than not at all
+            return data
+    return transform
@@ -0,0 +1,255 @@
+"""
+Rasterize SVG images to PNG for places that need a bitmap, such as the
+social media preview card.
+
+cairosvg is used when it is installed. Otherwise a small pure-Python
+rasterizer draws the subset of SVG the generated images use: <rect>,
+<polygon>, <circle>, <line> and <text> inside <g> groups, with solid
+fill and stroke colours. Transforms, paths, gradients and opacity are
+not supported, and edges aren't anti-aliased. Text uses a built-in 5x7
+bitmap font with capital letters only, so it is legible but not typeset.
+"""
+import math
+import re
+import xml.etree.ElementTree as ET
+
+from png_optimize import PNGImage, encode_png
+
+try:
+    import cairosvg
+except (ImportError, OSError):
+    # cairosvg is optional (and raises OSError when libcairo is missing)
+    cairosvg = None
+
+SVG_NS = '{http://www.w3.org/2000/svg}'
+
+NAMED_COLORS = {
+    'black': (0, 0, 0), 'white': (255, 255, 255), 'red': (255, 0, 0), 'green': (0, 128, 0),
+    'blue': (0, 0, 255), 'yellow': (255, 255, 0), 'orange': (255, 165, 0), 'brown': (165, 42, 42),
+    'gray': (128, 128, 128), 'grey': (128, 128, 128), 'gold': (255, 215, 0),
+}
+
+# Presentation attributes children inherit from their group
+INHERITED = ('fill', 'stroke', 'stroke-width', 'font-size', 'font-weight', 'text-anchor')
+
+# 5x7 glyphs as five columns, bit 0 at the top
+FONT = {
+    ' ': (0x00, 0x00, 0x00, 0x00, 0x00), '!': (0x00, 0x00, 0x5F, 0x00, 0x00),
+    "'": (0x00, 0x05, 0x03, 0x00, 0x00), ',': (0x00, 0x50, 0x30, 0x00, 0x00),
+    '-': (0x08, 0x08, 0x08, 0x08, 0x08), '.': (0x00, 0x60, 0x60, 0x00, 0x00),
+    ':': (0x00, 0x36, 0x36, 0x00, 0x00), '?': (0x02, 0x01, 0x51, 0x09, 0x06),
+    '0': (0x3E, 0x51, 0x49, 0x45, 0x3E), '1': (0x00, 0x42, 0x7F, 0x40, 0x00),
+    '2': (0x42, 0x61, 0x51, 0x49, 0x46), '3': (0x21, 0x41, 0x45, 0x4B, 0x31),
+    '4': (0x18, 0x14, 0x12, 0x7F, 0x10), '5': (0x27, 0x45, 0x45, 0x45, 0x39),
+    '6': (0x3C, 0x4A, 0x49, 0x49, 0x30), '7': (0x01, 0x71, 0x09, 0x05, 0x03),
+    '8': (0x36, 0x49, 0x49, 0x49, 0x36), '9': (0x06, 0x49, 0x49, 0x29, 0x1E),
+    'A': (0x7E, 0x11, 0x11, 0x11, 0x7E), 'B': (0x7F, 0x49, 0x49, 0x49, 0x36),
+    'C': (0x3E, 0x41, 0x41, 0x41, 0x22), 'D': (0x7F, 0x41, 0x41, 0x22, 0x1C),
+    'E': (0x7F, 0x49, 0x49, 0x49, 0x41), 'F': (0x7F, 0x09, 0x09, 0x09, 0x01),
+    'G': (0x3E, 0x41, 0x49, 0x49, 0x7A), 'H': (0x7F, 0x08, 0x08, 0x08, 0x7F),
+    'I': (0x00, 0x41, 0x7F, 0x41, 0x00), 'J': (0x20, 0x40, 0x41, 0x3F, 0x01),
+    'K': (0x7F, 0x08, 0x14, 0x22, 0x41), 'L': (0x7F, 0x40, 0x40, 0x40, 0x40),
+    'M': (0x7F, 0x02, 0x0C, 0x02, 0x7F), 'N': (0x7F, 0x04, 0x08, 0x10, 0x7F),
+    'O': (0x3E, 0x41, 0x41, 0x41, 0x3E), 'P': (0x7F, 0x09, 0x09, 0x09, 0x06),
+    'Q': (0x3E, 0x41, 0x51, 0x21, 0x5E), 'R': (0x7F, 0x09, 0x19, 0x29, 0x46),
+    'S': (0x46, 0x49, 0x49, 0x49, 0x31), 'T': (0x01, 0x01, 0x7F, 0x01, 0x01),
+    'U': (0x3F, 0x40, 0x40, 0x40, 0x3F), 'V': (0x1F, 0x20, 0x40, 0x20, 0x1F),
+    'W': (0x3F, 0x40, 0x38, 0x40, 0x3F), 'X': (0x63, 0x14, 0x08, 0x14, 0x63),
+    'Y': (0x07, 0x08, 0x70, 0x08, 0x07), 'Z': (0x61, 0x51, 0x49, 0x45, 0x43),
+}
+
+_NUMBER = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+
+def parse_color(value):
+    """(r, g, b) for '#rgb', '#rrggbb', 'rgb(r, g, b)' or a basic colour name; None for 'none'"""
+    value = (value or '').strip().lower()
+    if value in ('', 'none', 'transparent'):
+        return None
+    if value.startswith('#') and len(value) == 4:
+        return tuple(int(c * 2, 16) for c in value[1:])
+    if value.startswith('#') and len(value) == 7:
+        return tuple(int(value[i:i + 2], 16) for i in (1, 3, 5))
+    if value.startswith('rgb('):
+        return tuple(min(255, int(float(n))) for n in _NUMBER.findall(value)[:3])
+    return NAMED_COLORS.get(value, (0, 0, 0))
+
+def _number(value, default=0.0):
+    match = _NUMBER.match((value or '').strip())
+    return float(match.group(0)) if match else default
+
+class Canvas:
+    """An RGBA bitmap drawn on with solid-colour spans"""
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.pixels = bytearray(width * height * 4)
+
+    def span(self, y, x0, x1, color):
+        """Fill pixels x0 <= x < x1 of row y"""
+        if not 0 <= y < self.height:
+            return
+        x0, x1 = max(0, x0), min(self.width, x1)
+        if x0 < x1:
+            offset = (y * self.width) * 4
+            self.pixels[offset + x0 * 4:offset + x1 * 4] = bytes(color) * (x1 - x0)
+
+    def rect(self, x0, y0, x1, y1, color):
+        """Fill the pixels whose centres fall inside the rectangle"""
+        for y in range(max(0, round(y0)), min(self.height, round(y1))):
+            self.span(y, round(x0), round(x1), color)
+
+    def polygon(self, points, color):
+        """Fill a polygon with the even-odd rule, sampling pixel centres"""
+        if len(points) < 3:
+            return
+        edges = list(zip(points, points[1:] + points[:1]))
+        top = max(0, math.floor(min(y for _, y in points)))
+        bottom = min(self.height, math.ceil(max(y for _, y in points)))
+        for y in range(top, bottom):
+            center = y + 0.5
+            crossings = sorted(
+                x0 + (center - y0) * (x1 - x0) / (y1 - y0)
+                for (x0, y0), (x1, y1) in edges
+                if (y0 <= center < y1) or (y1 <= center < y0))
+            for start, end in zip(crossings[0::2], crossings[1::2]):
+                self.span(y, round(start), round(end), color)
+
+    def ellipse(self, cx, cy, rx, ry, color, inner=None):
+        """Fill an ellipse, or the ring between it and ``inner`` (rx, ry)"""
+        if rx <= 0 or ry <= 0:
+            return
+        for y in range(max(0, math.floor(cy - ry)), min(self.height, math.ceil(cy + ry))):
+            dy = (y + 0.5 - cy) / ry
+            if abs(dy) >= 1:
+                continue
+            half = rx * math.sqrt(1 - dy * dy)
+            if inner and abs(y + 0.5 - cy) < inner[1]:
+                inner_half = inner[0] * math.sqrt(1 - ((y + 0.5 - cy) / inner[1]) ** 2)
+                self.span(y, round(cx - half), round(cx - inner_half), color)
+                self.span(y, round(cx + inner_half), round(cx + half), color)
+            else:
+                self.span(y, round(cx - half), round(cx + half), color)
+
+    def line(self, x0, y0, x1, y1, width, color):
+        """A line ``width`` wide with round ends"""
+        length = math.hypot(x1 - x0, y1 - y0)
+        radius = width / 2
+        if length:
+            nx, ny = -(y1 - y0) / length * radius, (x1 - x0) / length * radius
+            self.polygon([(x0 + nx, y0 + ny), (x1 + nx, y1 + ny), (x1 - nx, y1 - ny), (x0 - nx, y0 - ny)], color)
+        for x, y in ((x0, y0), (x1, y1)):
+            self.ellipse(x, y, radius, radius, color)
+
+    def text(self, x, y, text, size, color, anchor='start', bold=False):
+        """Draw ``text`` with its baseline at y; ``size`` is the font size in pixels"""
+        cell = size / 10
+        advance = 6 * cell
+        width = len(text) * advance - cell
+        if anchor == 'middle':
+            x -= width / 2
+        elif anchor == 'end':
+            x -= width
+        top = y - 7 * cell
+        weight = cell * 1.4 if bold else cell
+        for position, char in enumerate(text.upper()):
+            columns = FONT.get(char, FONT['?'])
+            left = x + position * advance
+            for column, bits in enumerate(columns):
+                for row in range(7):
+                    if bits >> row & 1:
+                        self.rect(left + column * cell, top + row * cell,
+                                  left + column * cell + weight, top + (row + 1) * cell, color)
+
+    def to_image(self):
+        return PNGImage(self.width, self.height, 6, bytes(self.pixels))
+
+def _style(element, inherited):
+    """Presentation attributes of ``element``, with the ones it inherits"""
+    style = dict(inherited)
+    for name in INHERITED:
+        if element.get(name) is not None:
+            style[name] = element.get(name)
+    for declaration in (element.get('style') or '').split(';'):
+        name, _, value = declaration.partition(':')
+        if name.strip() in INHERITED:
+            style[name.strip()] = value.strip()
+    return style
+
+def _draw(canvas, element, inherited, scale):
+    style = _style(element, inherited)
+    tag = element.tag.replace(SVG_NS, '')
+    fill = parse_color(style.get('fill', 'black'))
+    stroke = parse_color(style.get('stroke'))
+    stroke_width = _number(style.get('stroke-width'), 1.0) * scale
+    fill = fill and fill + (255,)
+    stroke = stroke and stroke + (255,)
+
+    def num(name):
+        return _number(element.get(name)) * scale
+
+    if tag == 'g':
+        for child in element:
+            _draw(canvas, child, style, scale)
+    elif tag == 'rect':
+        x, y, width, height = num('x'), num('y'), num('width'), num('height')
+        if fill:
+            canvas.rect(x, y, x + width, y + height, fill)
+        if stroke and stroke_width > 0:
+            corners = [(x, y), (x + width, y), (x + width, y + height), (x, y + height)]
+            _outline(canvas, corners, stroke_width, stroke)
+    elif tag == 'polygon':
+        values = [float(n) * scale for n in _NUMBER.findall(element.get('points', ''))]
+        points = list(zip(values[0::2], values[1::2]))
+        if fill:
+            canvas.polygon(points, fill)
+        if stroke and stroke_width > 0:
+            _outline(canvas, points, stroke_width, stroke)
+    elif tag == 'circle':
+        cx, cy, r = num('cx'), num('cy'), num('r')
+        if fill:
+            canvas.ellipse(cx, cy, r, r, fill)
+        if stroke and stroke_width > 0:
+            outer, inner = r + stroke_width / 2, max(0.0, r - stroke_width / 2)
+            canvas.ellipse(cx, cy, outer, outer, stroke, inner=(inner, inner))
+    elif tag == 'line':
+        if stroke and stroke_width > 0:
+            canvas.line(num('x1'), num('y1'), num('x2'), num('y2'), stroke_width, stroke)
+    elif tag == 'text':
+        text = ' '.join(''.join(element.itertext()).split())
+        if fill and text:
+            canvas.text(num('x'), num('y'), text, _number(style.get('font-size'), 16.0) * scale, fill,
+                        anchor=style.get('text-anchor', 'start'), bold=style.get('font-weight') in ('bold', '700'))
+
+def _outline(canvas, points, width, color):
+    for start, end in zip(points, points[1:] + points[:1]):
+        canvas.line(start[0], start[1], end[0], end[1], width, color)
+
+def _size(root, width, height):
+    """Output size and drawing scale from the requested size, the width/height attributes and the viewBox"""
+    viewbox = [float(n) for n in _NUMBER.findall(root.get('viewBox', ''))]
+    view_width = viewbox[2] if len(viewbox) == 4 else _number(root.get('width'), 300.0)
+    view_height = viewbox[3] if len(viewbox) == 4 else _number(root.get('height'), 150.0)
+    if width is None:
+        width = _number(root.get('width'), view_width)
+    if height is None:
+        height = width * view_height / view_width
+    return round(width), round(height), width / view_width
+
+def rasterize_svg(svg, width=None, height=None):
+    """
+    PNG bytes of an SVG document, ``width`` x ``height`` pixels (by default
+    the size the SVG declares). The PNG isn't optimized; see png_optimize.
+    """
+    if isinstance(svg, str):
+        svg = svg.encode('utf-8')
+    if cairosvg is not None:
+        return cairosvg.svg2png(bytestring=svg, output_width=width, output_height=height)
+
+    root = ET.fromstring(svg)
+    width, height, scale = _size(root, width, height)
+    canvas = Canvas(width, height)
+    for child in root:
+        _draw(canvas, child, _style(root, {}), scale)
+    # No filter search: callers optimize the result anyway
+    return encode_png(canvas.to_image(), strategies=('none',))
@@ -0,0 +1,65 @@
+"""
+Compiled templates shared by app.py and generate_static_site.py.
+
+Compiling index.html to Python code costs more than rendering it, and
+every fresh process (a scaled-up container, a CI job, a per-tenant build)
+used to pay for it. Both entry points now keep the compiled code in one
+on-disk Jinja bytecode cache. An entry is found by template name and
+path and stores a checksum of the source, so an edited template is
+recompiled. Inside a running process, edits are picked up by the
+loader's mtime check. The two environments autoescape the same way, so
+they compile identical code and can share entries.
+
+    python template_cache.py        # precompile, e.g. while building an image
+"""
+import os
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATES_DIR = os.path.join(CURRENT_DIR, "templates")
+
+# Compiled templates, kept between processes (TEMPLATE_CACHE_DIR overrides)
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR") or os.path.join(CURRENT_DIR, ".template-cache")
+
+# What Flask autoescapes; compiled code depends on it
+AUTOESCAPE_EXTENSIONS = ('html', 'htm', 'xml', 'xhtml', 'svg')
+
+class TemplateBytecodeCache(FileSystemBytecodeCache):
+    """FileSystemBytecodeCache that treats an unwritable directory as a cache miss"""
+
+    def dump_bytecode(self, bucket):
+        try:
+            super().dump_bytecode(bucket)
+        except OSError as e:
+            # A read-only cache only costs the next process a compile
+            print(f"Could not cache compiled template {bucket.key}: {e}")
+
+def bytecode_cache(directory=TEMPLATE_CACHE_DIR):
+    """The shared bytecode cache in ``directory``, or None if it is disabled or can't be created"""
+    if not directory:
+        return None
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError as e:
+        print(f"Template cache disabled: {e}")
+        return None
+    return TemplateBytecodeCache(directory)
+
+def template_environment(templates_dir=TEMPLATES_DIR, cache_dir=TEMPLATE_CACHE_DIR):
+    """A Jinja environment compiling the same code as Flask's, using the shared cache"""
+    return Environment(loader=FileSystemLoader(templates_dir),
+                       autoescape=select_autoescape(AUTOESCAPE_EXTENSIONS),
+                       bytecode_cache=bytecode_cache(cache_dir))
+
+def precompile(templates_dir=TEMPLATES_DIR, cache_dir=TEMPLATE_CACHE_DIR):
+    """Compile every template into the cache; returns their names"""
+    env = template_environment(templates_dir, cache_dir)
+    names = env.list_templates()
+    for name in names:
+        env.get_template(name)
+    return names
+
+if __name__ == '__main__':
+    names = precompile()
+    print(f"Precompiled {len(names)} templates into {TEMPLATE_CACHE_DIR}: {', '.join(names)}")
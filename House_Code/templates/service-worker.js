@@ -0,0 +1,116 @@
+// Service worker for the GitHub Pages build, generated by generate_static_site.py.
+// Fingerprinted files are served cache-first; pages and the other files are
+// served from the cache and revalidated in the background. Each deploy
+// refetches only the entries whose revision changed.
+
+// [{url, revision, hashed}], with URLs relative to the site root
+const PRECACHE = {{ precache | tojson }};
+
+// Several sites can share an origin (user.github.io/repo), so the cache is per scope
+const CACHE_NAME = 'house-code-precache:' + self.registration.scope;
+// The revision of each URL in the cache, stored in the cache itself
+const REVISIONS_URL = new URL('__precache-revisions', self.registration.scope).href;
+
+const ENTRIES = new Map(PRECACHE.map(entry => [new URL(entry.url, self.registration.scope).href, entry]));
+
+async function readRevisions(cache) {
+  const response = await cache.match(REVISIONS_URL);
+  return response ? response.json() : {};
+}
+
+self.addEventListener('install', event => {
+  event.waitUntil((async () => {
+    const cache = await caches.open(CACHE_NAME);
+    const revisions = await readRevisions(cache);
+    const stored = {};
+    await Promise.all([...ENTRIES].map(async ([url, entry]) => {
+      if (revisions[url] === entry.revision && await cache.match(url)) {
+        stored[url] = entry.revision;
+        return;
+      }
+      // Past the HTTP cache, which GitHub Pages lets keep files for ten minutes
+      const response = await fetch(url, {cache: 'reload'});
+      if (!response.ok) {
+        throw new Error(`Precaching ${url} failed with ${response.status}`);
+      }
+      await cache.put(url, response);
+      stored[url] = entry.revision;
+    }));
+    // Entries this worker doesn't list keep their old revision until activation removes them
+    await cache.put(REVISIONS_URL, new Response(JSON.stringify(Object.assign(revisions, stored)),
+                                                {headers: {'Content-Type': 'application/json'}}));
+  })());
+});
+
+self.addEventListener('activate', event => {
+  // Pages still open on the previous deploy are gone by now, so drop what it needed
+  event.waitUntil((async () => {
+    const cache = await caches.open(CACHE_NAME);
+    const revisions = await readRevisions(cache);
+    for (const request of await cache.keys()) {
+      if (request.url !== REVISIONS_URL && !ENTRIES.has(request.url)) {
+        await cache.delete(request);
+        delete revisions[request.url];
+      }
+    }
+    await cache.put(REVISIONS_URL, new Response(JSON.stringify(revisions),
+                                                {headers: {'Content-Type': 'application/json'}}));
+    await self.clients.claim();
+  })());
+});
+
+// The precache URL a request maps to: directories serve their index.html,
+// and page loads ignore the query string
+function cacheUrl(request) {
+  const url = new URL(request.url);
+  url.hash = '';
+  if (request.mode === 'navigate') {
+    url.search = '';
+  }
+  if (url.pathname.endsWith('/')) {
+    url.pathname += 'index.html';
+  }
+  return url.href;
+}
+
+async function cacheFirst(cache, url, request) {
+  const cached = await cache.match(url);
+  if (cached) {
+    return cached;
+  }
+  const response = await fetch(request);
+  if (response.ok) {
+    await cache.put(url, response.clone());
+  }
+  return response;
+}
+
+async function staleWhileRevalidate(event, cache, url, request) {
+  const cached = await cache.match(url);
+  const update = fetch(request).then(async response => {
+    if (response.ok && !response.redirected) {
+      await cache.put(url, response.clone());
+    }
+    return response;
+  });
+  if (!cached) {
+    return update;
+  }
+  // Offline, the cached copy is all there is
+  event.waitUntil(update.catch(() => undefined));
+  return cached;
+}
+
+self.addEventListener('fetch', event => {
+  const request = event.request;
+  if (request.method !== 'GET') {
+    return;
+  }
+  const url = cacheUrl(request);
+  const entry = ENTRIES.get(url);
+  if (!entry) {
+    return;
+  }
+  event.respondWith(caches.open(CACHE_NAME).then(cache =>
+    entry.hashed ? cacheFirst(cache, url, request) : staleWhileRevalidate(event, cache, url, request)));
+});
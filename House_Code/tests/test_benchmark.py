@@ -0,0 +1,45 @@
+from benchmark import compare_results, load_test, percentile
+
+def test_percentile_nearest_rank():
+    """Test that percentiles pick an observed value by nearest rank."""
+    values = list(range(1, 101))
+    assert percentile(values, 0.50) == 50
+    assert percentile(values, 0.99) == 99
+    assert percentile([7], 0.95) == 7
+    assert percentile([], 0.5) == 0.0
+
+def test_compare_results_flags_regressions():
+    """Test that slower timings and lower throughput beyond the threshold are reported."""
+    baseline = {
+        'micro': {'svg_hit': {'median_ms': 1.0}, 'build_full': {'median_ms': 100.0}},
+        'load': {'request_p50_ms': 2.0, 'request_p95_ms': 4.0, 'request_p99_ms': 5.0,
+                 'page_p95_ms': 30.0, 'requests_per_s': 1000.0},
+        'thresholds': {'build_full': 0.5},
+    }
+    results = {
+        'micro': {'svg_hit': {'median_ms': 1.5}, 'build_full': {'median_ms': 140.0}},
+        'load': dict(baseline['load'], requests_per_s=600.0),
+    }
+    regressions = compare_results(results, baseline, threshold=0.25)
+    
+    assert any(message.startswith('svg_hit:') for message in regressions)
+    assert any(message.startswith('load_requests_per_s:') for message in regressions)
+    # Within its own 50% threshold
+    assert not any(message.startswith('build_full:') for message in regressions)
+    assert compare_results(baseline, baseline) == []
+
+def test_load_test_over_loopback():
+    """Test that simulated browsers fetch the page and every layer without errors."""
+    result = load_test(browsers=2, page_loads=2)
+    assert result['errors'] == 0
+    assert result['page_loads'] == 4
+    assert result['requests'] == 4 * 8
+    assert result['request_p50_ms'] <= result['request_p99_ms']
+
+def test_startup_budgets():
+    """Test that warm startup phases over budget are reported and missing phases ignored."""
+    from benchmark import check_startup_budgets
+    startup = {'app': {'import': {'cold_ms': 300.0, 'warm_ms': 250.0},
+                       'template_compile': {'cold_ms': 30.0, 'warm_ms': 1.0}}}
+    budgets = {'app': {'import': 200, 'template_compile': 20, 'first_request': 300}, 'generator': {'total': 500}}
+    assert check_startup_budgets(startup, budgets) == ['app import: 250.0 ms (budget 200 ms)']
@@ -32,6 +32,18 @@ def test_svg_route(client):
     if response.status_code == 200:
         assert response.content_type in ['image/svg+xml', 'application/octet-stream']
 
+def test_assets_are_valid_wsgi_bodies():
+    """Test that packed assets reach any WSGI server as bytes, not memoryviews."""
+    from wsgiref.validate import validator
+    from werkzeug.test import Client
+    import app as app_module
+    client = Client(validator(app_module.app.wsgi_app))
+    for path in ('/svg/house-structure.svg', '/svg/houseCodePrints.png'):
+        response = client.get(path)
+        assert response.status_code == 200
+        assert response.get_data() == bytes(app_module.asset_store.get(path.rsplit('/', 1)[1]))
+        response.close()
+
 def test_environment_variables(app):
     """Test that environment variables are properly loaded."""
     # These should have default values if .env file is not found
@@ -68,3 +80,213 @@ def test_error_handling(client):
     """Test error handling for non-existent routes."""
     response = client.get('/non-existent-route')
     assert response.status_code == 404
+
+def test_index_etag_and_not_modified(client):
+    """Test that the index page sends a strong ETag and honors If-None-Match."""
+    from app import _index_cache
+    _index_cache.clear()
+    response = client.get('/')
+    etag = response.headers.get('ETag')
+    assert etag and not etag.startswith('W/')
+    
+    cached = client.get('/', headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.data == b''
+
+def test_index_compressed_variants(client):
+    """Test that gzip and brotli bodies decode to the same page."""
+    import gzip
+    plain = client.get('/').data
+    
+    response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.data) == plain
+    
+    brotli = pytest.importorskip('brotli')
+    response = client.get('/', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(response.data) == plain
+
+def test_index_cache_follows_config(client, monkeypatch):
+    """Test that the cached page is re-rendered when the GitHub config changes."""
+    client.get('/')
+    monkeypatch.setenv('GITHUB_USERNAME', 'cache-test-user')
+    response = client.get('/')
+    assert b'cache-test-user' in response.data
+
+def test_index_inlines_default_layers(client):
+    """Test that the default layers are inlined and the rest are left for the page to fetch."""
+    hints = []
+    response = client.get('/', environ_base={'wsgi.early_hints': hints.append})
+    html = response.data.decode('utf-8')
+    
+    for layer_id in ('environment-layer', 'house-structure'):
+        assert f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 800 600" id="{layer_id}-svg" class="svg-layer"' in html
+    assert 'id="html-tags-layer-svg"' not in html
+    assert '"html-tags-layer": {"inline": false, "url": "/svg/html-tags-layer.' in html
+    # Inlined layers need no preload
+    assert '<link rel="preload"' not in html
+    assert 'Link' not in response.headers
+    assert hints == []
+
+def test_index_hints_default_layers_not_inlined(client, monkeypatch):
+    """Test that a default layer left out of the page is hinted by a Link header and 103 Early Hints."""
+    import app as app_module
+    link = '</svg/house-structure.svg>; rel=preload; as=image; type="image/svg+xml"'
+    monkeypatch.setattr(app_module, 'INDEX_PRELOAD_LINK', link)
+    
+    hints = []
+    response = client.get('/', environ_base={'wsgi.early_hints': hints.append})
+    assert response.headers['Link'] == link
+    assert hints == [[('Link', link)]]
+    
+    revalidated = client.get('/', headers={'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
+    assert revalidated.headers['Link'] == link
+
+def test_preload_hints_for_layers_not_inlined():
+    """Test that only visible layers that weren't inlined get preload hints."""
+    from asset_manifest import layer_load_manifest, preload_link_header, preload_urls
+    layers = [
+        {'id': 'a', 'default': True, 'url': '/svg/a.1234abcd.svg'},
+        {'id': 'b', 'default': True, 'url': '/svg/b.svg'},
+        {'id': 'c', 'default': False, 'url': '/svg/c.svg'},
+    ]
+    assert preload_urls(layers) == ['/svg/a.1234abcd.svg', '/svg/b.svg']
+    assert preload_urls(layers, {'a'}) == ['/svg/b.svg']
+    assert preload_link_header(preload_urls(layers, {'a'})) == '</svg/b.svg>; rel=preload; as=image; type="image/svg+xml"'
+    assert layer_load_manifest(layers, {'a'})['a'] == {'url': '/svg/a.1234abcd.svg', 'inline': True}
+
+def test_inline_layer_scopes_ids_and_classes():
+    """Test that inlined layer markup can't collide with the page's ids or styles."""
+    from svg_compose import inline_layers
+    svg = b'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 10 10"><g id="a" class="container"><use href="#a"/></g></svg>'
+    layers = [{'id': 'one', 'name': 'One', 'default': True}, {'id': 'two', 'name': 'Two', 'default': False},
+              {'id': 'broken', 'name': 'Broken', 'default': True}]
+    markup = inline_layers(layers, lambda name: b'<svg' if name == 'broken.svg' else svg)
+    
+    assert list(markup) == ['one']
+    assert 'id="one-svg" class="svg-layer" role="img" aria-label="One visualization layer"' in markup['one']
+    assert '<title>One visualization layer</title>' in markup['one']
+    assert 'id="one--a" class="one--container"' in markup['one']
+    assert 'href="#one--a"' in markup['one']
+
+def test_svg_served_from_asset_pack(client):
+    """Test that packed SVGs and PNGs are served byte for byte."""
+    svg_path = os.path.join(flask_app.root_path, 'static', 'svg', 'systems-layer.svg')
+    if not os.path.exists(svg_path):
+        pytest.skip('layer SVGs not available')
+    
+    from svg_optimize import optimize_svg
+    
+    response = client.get('/svg/systems-layer.svg')
+    assert response.status_code == 200
+    with open(svg_path, 'rb') as f:
+        # Served minified, exactly as generate_static_site.py writes it
+        assert response.data == optimize_svg(f.read())
+    
+    png = client.get('/svg/houseCodePrints.png')
+    if png.status_code == 200 and png.content_type == 'image/png':
+        with open(os.path.join(flask_app.root_path, '..', '_svg_assets', 'houseCodePrints.png'), 'rb') as f:
+            assert png.data == f.read()
+    
+    cached = client.get('/svg/systems-layer.svg', headers={'If-None-Match': response.headers['ETag']})
+    assert cached.status_code == 304
+
+def test_svg_placeholder_for_missing_file(client):
+    """Test that unknown names get a placeholder SVG, cached after the first miss."""
+    from app import _placeholder_cache
+    
+    response = client.get('/svg/does-not-exist.svg')
+    assert response.status_code == 200
+    assert b'does-not-exist.svg (not found)' in response.data
+    assert 'does-not-exist.svg' in _placeholder_cache
+    assert client.get('/svg/does-not-exist.svg').data == response.data
+
+def test_asset_store_precedence(tmp_path):
+    """Test that the first source directory wins and the pack indexes every file."""
+    from asset_store import AssetStore
+    
+    first, second = tmp_path / 'first', tmp_path / 'second'
+    first.mkdir()
+    second.mkdir()
+    (first / 'a.svg').write_bytes(b'<svg>first</svg>')
+    (second / 'a.svg').write_bytes(b'<svg>second</svg>')
+    (second / 'b.png').write_bytes(b'\x89PNG')
+    (second / 'notes.txt').write_bytes(b'not an asset')
+    
+    store = AssetStore([str(first), str(second)], pack_path=str(tmp_path / 'assets.pack'))
+    assert bytes(store.get('a.svg')) == b'<svg>first</svg>'
+    assert bytes(store.get('b.png')) == b'\x89PNG'
+    assert store.get('notes.txt') is None
+    assert sorted(store.index) == ['a.svg', 'b.png']
+
+def test_compose_route_merges_layers_in_canonical_order(client):
+    """Test that /svg/compose merges layers bottom-up regardless of query order."""
+    response = client.get('/svg/compose?layers=systems-layer,environment-layer,house-structure')
+    assert response.status_code == 200
+    assert response.content_type == 'image/svg+xml'
+    
+    body = response.data.decode('utf-8')
+    assert body.index('id="environment-layer"') < body.index('id="house-structure"') < body.index('id="systems-layer"')
+    # Both house-structure.svg and systems-layer.svg use id="house-structure"
+    assert 'id="house-structure--house-structure"' in body
+    assert 'id="systems-layer--house-structure"' in body
+    
+    same = client.get('/svg/compose?layers=house-structure,environment-layer,systems-layer')
+    assert same.headers['ETag'] == response.headers['ETag']
+
+def test_compose_route_rejects_unknown_layers(client):
+    """Test that unknown or empty layer sets are rejected."""
+    assert client.get('/svg/compose?layers=basement-layer').status_code == 400
+    assert client.get('/svg/compose').status_code == 400
+
+def test_chapter_compose_route_matches_static_path(client):
+    """Test that /svg/compose/<preset>.svg serves the chapter's layers, and the page's preset buttons load it."""
+    response = client.get('/svg/compose/html-tags.svg')
+    assert response.status_code == 200
+    assert response.content_type == 'image/svg+xml'
+    
+    query = client.get('/svg/compose?layers=environment-layer,house-structure,html-tags-layer')
+    assert response.headers['ETag'] == query.headers['ETag']
+    assert client.get('/svg/compose/basement.svg').status_code == 404
+    
+    html = client.get('/').data.decode('utf-8')
+    assert '"url": "/svg/compose/html-tags.svg"' in html
+
+def test_fingerprinted_svg_urls(client):
+    """Test that fingerprinted SVG URLs are immutable while plain ones revalidate."""
+    from app import asset_manifest
+    if 'house-structure.svg' not in asset_manifest:
+        pytest.skip('layer SVGs not available')
+    fingerprinted = asset_manifest['house-structure.svg']
+    
+    page = client.get('/')
+    assert page.headers['Cache-Control'] == 'no-cache'
+    assert f'/svg/{fingerprinted}'.encode() in page.data
+    
+    response = client.get(f'/svg/{fingerprinted}')
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+    assert response.data == client.get('/svg/house-structure.svg').data
+    assert client.get('/svg/house-structure.svg').headers['Cache-Control'] == 'no-cache'
+    
+    # An outdated fingerprint still gets the current file, but not forever
+    stale = client.get('/svg/house-structure.00000000.svg')
+    assert stale.data == response.data
+    assert stale.headers['Cache-Control'] == 'no-cache'
+
+def test_layer_element_index_route(client):
+    """Test that a layer's element index is served as cached JSON with an ETag."""
+    response = client.get('/api/layers/html-tags-layer/elements')
+    assert response.status_code == 200
+    assert response.content_type == 'application/json'
+    index = response.get_json()
+    assert index['layer'] == 'html-tags-layer'
+    assert any('<header>' in element.get('text', '') for element in index['elements'])
+    assert all(element['parent'] is None or element['parent'] < element['index'] for element in index['elements'])
+    
+    etag = response.headers['ETag']
+    assert client.get('/api/layers/html-tags-layer/elements.json', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/api/layers/no-such-layer/elements').status_code == 404
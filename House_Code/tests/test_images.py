@@ -0,0 +1,94 @@
+import os
+import zlib
+from png_optimize import (PNGImage, _channels, _chunk, decode_png, downscale_png, encode_png, expand, optimize_png,
+                          png_size, read_chunks)
+from svg_rasterize import parse_color, rasterize_svg
+
+def _rgba_png(width, height, pixel, metadata=True):
+    """An unoptimized RGBA PNG with pixel(x, y) -> 4 bytes, plus a text chunk"""
+    pixels = b''.join(pixel(x, y) for y in range(height) for x in range(width))
+    png = encode_png(PNGImage(width, height, 6, pixels), strategies=('none',))
+    if metadata:
+        png = png[:-12] + _chunk(b'tEXt', b'Comment\x00made by a test') + png[-12:]
+    return png
+
+def test_optimize_png_is_lossless_and_strips_metadata():
+    """Test that recompression keeps every pixel, drops metadata and never grows the file."""
+    png = _rgba_png(64, 48, lambda x, y: bytes((x * 4, y * 5, (x * y) % 256, 255 if x < 60 else 128)))
+    optimized = optimize_png(png)
+
+    assert len(optimized) < len(png)
+    assert b'tEXt' not in [chunk_type for chunk_type, _ in read_chunks(optimized)]
+    assert expand(decode_png(optimized)).pixels == decode_png(png).pixels
+    assert optimize_png(optimized) == optimized
+
+def test_optimize_png_reduces_color_type():
+    """Test that opaque few-colour images get a palette and grey images become greyscale."""
+    few_colors = _rgba_png(32, 32, lambda x, y: bytes((255, 0, 0, 255)) if (x // 8 + y // 8) % 2 else bytes((0, 0, 255, 255)))
+    image = decode_png(optimize_png(few_colors))
+    assert image.color_type == 3
+    assert expand(image).pixels == _channels(decode_png(few_colors).pixels, 4, (0, 1, 2))
+
+    grey = _rgba_png(300, 4, lambda x, y: bytes((x % 256,) * 3 + (255,)))
+    assert decode_png(optimize_png(grey)).color_type == 0
+
+def test_optimize_png_recompresses_unsupported_formats():
+    """Test that PNGs the decoder can't read are still stripped and kept valid."""
+    # A 16-bit greyscale image
+    raw = b''.join(b'\x00' + bytes(8) for _ in range(4))
+    ihdr = (4).to_bytes(4, 'big') * 2 + bytes((16, 0, 0, 0, 0))
+    png = (b'\x89PNG\r\n\x1a\n' + _chunk(b'IHDR', ihdr) + _chunk(b'tIME', bytes(7))
+           + _chunk(b'IDAT', zlib.compress(raw, 0)) + _chunk(b'IEND', b''))
+    optimized = optimize_png(png)
+    assert [chunk_type for chunk_type, _ in read_chunks(optimized)] == [b'IHDR', b'IDAT', b'IEND']
+    assert len(optimized) < len(png)
+
+def test_downscale_png_averages_blocks():
+    """Test that each halving averages 2x2 blocks."""
+    png = _rgba_png(8, 6, lambda x, y: bytes((0, 0, 0, 255)) if x % 2 else bytes((200, 100, 50, 255)))
+    half = downscale_png(png, 1)
+    assert png_size(half) == (4, 3)
+    assert set(expand(decode_png(half)).pixels[i:i + 3] for i in range(0, 4 * 3 * 3, 3)) == {bytes((100, 50, 25))}
+    assert png_size(downscale_png(png, 2)) == (2, 1)
+
+def test_rasterize_preview_card():
+    """Test that the preview card SVG becomes a real 1200x630 PNG."""
+    from generate_static_site import preview_image_svg
+    png = rasterize_svg(preview_image_svg(), 1200, 630)
+    image = decode_png(png)
+
+    assert (image.width, image.height) == (1200, 630)
+
+    def pixel(x, y):
+        offset = (y * image.width + x) * 4
+        return tuple(image.pixels[offset:offset + 3])
+    assert pixel(10, 10) == parse_color('#4CAF50')
+    assert pixel(600, 560) == parse_color('#8B4513')
+    assert pixel(600, 300) == parse_color('#f5deb3')
+    # The title is drawn in white somewhere along its baseline
+    assert parse_color('#fff') in {pixel(x, 70) for x in range(300, 900)}
+
+def test_images_are_processed_once(tmp_path):
+    """Test that the image stage rasterizes a missing preview and reuses cached results."""
+    from build_output import BuildOutput
+    from generate_static_site import write_images
+    from image_pipeline import ImageCache
+
+    sources = tmp_path / 'svg'
+    sources.mkdir()
+    (sources / 'photo.png').write_bytes(_rgba_png(420, 10, lambda x, y: bytes((x % 256, y, 0, 255))))
+    cache = ImageCache(str(tmp_path / 'cache'))
+
+    output = BuildOutput(str(tmp_path / 'first'))
+    assert write_images(output, [str(sources)], cache=cache, workers=1) == 'house-preview.png'
+    assert png_size(open(output.path('static/house-preview.png'), 'rb').read()) == (1200, 630)
+    assert sorted(os.listdir(output.path('static'))) == [
+        'house-preview-300w.png', 'house-preview-600w.png', 'house-preview.png', 'house-preview.svg',
+        'photo-210w.png', 'photo.png']
+    assert cache.hits == 0
+
+    # A fresh output directory gets every image from the cache
+    second = BuildOutput(str(tmp_path / 'second'))
+    write_images(second, [str(sources)], cache=cache, workers=1)
+    assert cache.hits == 5
+    assert open(second.path('static/photo-210w.png'), 'rb').read() == open(output.path('static/photo-210w.png'), 'rb').read()
@@ -0,0 +1,84 @@
+import json
+import os
+import pytest
+import metrics
+from app import app as flask_app
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """Test client with fresh metrics written to a temporary directory."""
+    monkeypatch.setattr(metrics, 'METRICS_DIR', str(tmp_path))
+    metrics.reset()
+    yield flask_app.test_client()
+    metrics.set_enabled(True)
+    metrics.reset()
+
+def test_server_timing_header(client):
+    """Test that responses carry their phase timings and the total."""
+    response = client.get('/svg/does-not-exist.svg')
+    timing = response.headers['Server-Timing']
+    assert 'lookup;dur=' in timing
+    assert 'placeholder;dur=' in timing
+    assert timing.split(', ')[-1].startswith('total;dur=')
+
+def test_svg_results_counted_by_filename(client):
+    """Test that SVG hits, fallback hits and misses are exported per filename."""
+    client.get('/svg/house-structure.svg')
+    client.get('/svg/house-structure.svg')
+    client.get('/svg/houseCodePrints.png')
+    client.get('/svg/does-not-exist.svg')
+    
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'house_svg_requests_total{filename="house-structure.svg",result="hit"} 2' in body
+    assert 'house_svg_requests_total{filename="does-not-exist.svg",result="miss"} 1' in body
+    if os.path.exists(os.path.join(flask_app.root_path, '..', '_svg_assets', 'houseCodePrints.png')):
+        assert 'house_svg_requests_total{filename="houseCodePrints.png",result="fallback"} 1' in body
+    assert 'house_request_duration_seconds_count{route="/svg/<path:filename>"} 4' in body
+    assert 'house_request_duration_seconds_bucket{route="/svg/<path:filename>",le="+Inf"} 4' in body
+
+def test_metrics_add_up_across_workers(client, tmp_path):
+    """Test that /metrics includes the numbers other worker processes wrote."""
+    other_worker = {
+        'histograms': [['house_request_duration_seconds', [['route', '/']],
+                        [1] + [0] * len(metrics.LATENCY_BUCKETS), 0.0002]],
+        'counters': [['house_svg_requests_total', [['filename', 'house-structure.svg'], ['result', 'hit']], 5]],
+    }
+    with open(tmp_path / 'metrics-999999.json', 'w') as f:
+        json.dump(other_worker, f)
+    
+    client.get('/svg/house-structure.svg')
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'house_svg_requests_total{filename="house-structure.svg",result="hit"} 6' in body
+    assert 'house_request_duration_seconds_bucket{route="/",le="0.0005"} 1' in body
+    assert (tmp_path / f'metrics-{os.getpid()}.json').exists()
+
+def test_reset_removes_the_process_file(client, tmp_path):
+    """Test that numbers recorded before a reset, like the warm-up's, don't reach the workers."""
+    client.get('/svg/house-structure.svg')
+    metrics.flush()
+    assert (tmp_path / f'metrics-{os.getpid()}.json').exists()
+    
+    metrics.reset()
+    assert not (tmp_path / f'metrics-{os.getpid()}.json').exists()
+    assert metrics.collect() == ({}, {})
+
+def test_only_the_default_directory_is_removed(client, tmp_path, monkeypatch):
+    """Test that the exit cleanup removes the default directory but never a configured one."""
+    metrics.flush()
+    metrics._remove_default_dir()
+    assert (tmp_path / f'metrics-{os.getpid()}.json').exists()
+    
+    default_dir = str(tmp_path / 'default')
+    monkeypatch.setattr(metrics, 'DEFAULT_METRICS_DIR', default_dir)
+    monkeypatch.setattr(metrics, 'METRICS_DIR', default_dir)
+    metrics.flush()
+    metrics._remove_default_dir()
+    assert not os.path.exists(default_dir)
+
+def test_metrics_can_be_disabled(client):
+    """Test that disabled instrumentation adds no headers and hides /metrics."""
+    metrics.set_enabled(False)
+    response = client.get('/svg/house-structure.svg')
+    assert 'Server-Timing' not in response.headers
+    assert client.get('/metrics').status_code == 404
+    assert metrics.collect() == ({}, {})
@@ -0,0 +1,104 @@
+import os
+import re
+import shutil
+import subprocess
+import pytest
+from render_pipeline import (compose, github_pages_pipeline, minify_css, minify_html,
+                             minify_js, replace_all)
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates', 'index.html')
+
+def test_replace_all_is_one_pass():
+    """Test that replacements don't see each other's output and longer patterns win."""
+    transform = replace_all({'a': 'b', 'b': 'c', 'ab': 'X'})
+    assert transform('ab a b') == 'X b c'
+    assert replace_all({'same': 'same'}) is None
+    assert compose(None, str.upper)('x') == 'X'
+
+def test_github_pages_pipeline():
+    """Test the base tag, the relative SVG fallback and the social image rewrite."""
+    url = 'https://user.github.io/repo'
+    html = ('<html><head><meta property="og:image" content="https://user.github.io/repo/static/house-preview.png">'
+            '<meta property="twitter:image" content="https://user.github.io/repo/static/house-preview.png">'
+            '</head><body><script>svgObject.data = layer.url || `/svg/${layer.id}.svg`;</script></body></html>')
+    page = github_pages_pipeline(url, 'houseCodePrints_02.png', minify=False)(html)
+    
+    assert page.count('<base href="https://user.github.io/repo/">') == 1
+    assert page.count(f'content="{url}/static/houseCodePrints_02.png"') == 2
+    assert 'house-preview.png' not in page
+    assert '`svg/${layer.id}.svg`' in page
+
+def test_minify_html_keeps_content():
+    """Test that minification drops comments and formatting but not content."""
+    html = '''<!DOCTYPE html>
+    <html>
+      <head>
+        <!-- comment -->
+        <!--[if IE]><p>old</p><![endif]-->
+        <style>
+          /* layout */
+          a :hover { color: red; }
+        </style>
+      </head>
+      <body>
+        <p title="two  spaces">Hello
+           <b>world</b>  again</p>
+        <pre>  keep
+    this  </pre>
+      </body>
+    </html>'''
+    minified = minify_html(html)
+    
+    assert '<!-- comment -->' not in minified
+    assert '<!--[if IE]>' in minified
+    assert '<style>a :hover{color:red}</style>' in minified
+    assert '<p title="two  spaces">Hello <b>world</b> again</p>' in minified
+    assert '<pre>  keep\n    this  </pre>' in minified
+    assert '\n' not in minified.replace('<pre>  keep\n', '')
+
+def test_minify_js_preserves_semantics():
+    """Test that strings, regexes and line breaks needed for ASI survive."""
+    source = '''
+      // comment
+      const s = "a  // not a comment";   /* block */
+      const t = `x  ${s}  y`;
+      function f() {
+        return
+          1;
+      }
+      let n = a + +b - -c;
+      const re = /a\\/b  c/g.test(s);
+    '''
+    minified = minify_js(source)
+    assert 'comment' not in minified.replace('not a comment', '')
+    assert '"a  // not a comment"' in minified
+    assert '`x  ${s}  y`' in minified
+    assert 'return\n1' in minified
+    assert 'a+ +b- -c' in minified
+    assert '/a\\/b  c/g.test(s)' in minified
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='node not installed')
+def test_minified_page_script_parses(tmp_path):
+    """Test that the page's inline script still parses after minification."""
+    with open(TEMPLATE_PATH) as f:
+        script = re.search(r'<script>(.*?)</script>', f.read(), re.S).group(1)
+    # Jinja expressions become plain arrays for the syntax check
+    script = re.sub(r'\{\{.*?\}\}', '[]', script)
+    path = tmp_path / 'page.js'
+    path.write_text(minify_js(script))
+    assert subprocess.run(['node', '--check', str(path)], capture_output=True).returncode == 0
+
+def test_flask_page_transform(monkeypatch):
+    """Test that MINIFY_HTML pages are minified and cached like any other."""
+    import app as app_module
+    monkeypatch.setattr(app_module, 'PAGE_TRANSFORM', compose(minify_html))
+    app_module._index_cache.clear()
+    client = app_module.app.test_client()
+    
+    response = client.get('/')
+    html = response.get_data(as_text=True)
+    assert response.headers.get('ETag')
+    assert '<!--' not in html
+    assert "setAttribute('aria-label'" in html
+    assert minify_css('a { color: red; }') == 'a{color:red}'
+    app_module._index_cache.clear()
@@ -0,0 +1,26 @@
+from app import app as flask_app, _compose_cache, _index_cache
+from serve import server_options, parse_args, warm_up
+
+def test_warm_up_fills_caches():
+    """Test that warm-up renders the page and composes every chapter preset."""
+    _index_cache.clear()
+    _compose_cache.clear()
+    
+    paths = warm_up(flask_app)
+    
+    assert '/' in paths
+    assert len(_index_cache) == 1
+    assert len(_compose_cache) > 0
+
+def test_server_options(monkeypatch):
+    """Test that worker settings come from the environment and preload is on."""
+    monkeypatch.setenv('WEB_CONCURRENCY', '8')
+    monkeypatch.setenv('THREADS', '2')
+    monkeypatch.setenv('PORT', '8080')
+    
+    options = server_options(parse_args([]))
+    assert options['workers'] == 8
+    assert options['threads'] == 2
+    assert options['worker_class'] == 'gthread'
+    assert options['bind'] == '0.0.0.0:8080'
+    assert options['preload_app'] is True
@@ -0,0 +1,263 @@
+import json
+import os
+import re
+import pytest
+from build_output import BuildOutput, MANIFEST_NAME
+from generate_static_site import generate_site_variants, generate_static_site, load_site_configs
+
+@pytest.fixture
+def output_dir(tmp_path):
+    """Output directory for a generated site."""
+    return str(tmp_path / 'gh-pages')
+
+def test_full_build_copies_each_svg_once(output_dir):
+    """Test that SVGs found in both source directories are copied once."""
+    output = generate_static_site(output_dir=output_dir)
+    svg_outputs = [path for path in output.written if path.startswith('svg/') and '/compose/' not in path]
+    assert len(svg_outputs) == len(set(svg_outputs))
+    assert os.path.exists(os.path.join(output_dir, 'index.html'))
+    assert os.path.exists(os.path.join(output_dir, MANIFEST_NAME))
+
+def test_incremental_noop_build(output_dir):
+    """Test that an incremental rebuild with unchanged inputs writes nothing."""
+    generate_static_site(output_dir=output_dir)
+    output = generate_static_site(output_dir=output_dir, incremental=True)
+    assert output.written == []
+    assert output.removed == []
+
+def test_incremental_build_removes_only_stale_files(tmp_path):
+    """Test that stale outputs are removed and unknown files are left alone."""
+    source = tmp_path / 'layer.svg'
+    source.write_text('<svg/>')
+    site = tmp_path / 'site'
+    
+    output = BuildOutput(str(site))
+    output.copy_file('svg/layer.svg', str(source))
+    output.write_bytes('svg/old.svg', '<svg/>')
+    output.finish()
+    (site / 'CNAME').write_text('example.com')
+    
+    output = BuildOutput(str(site), incremental=True, hardlink=True)
+    output.copy_file('svg/layer.svg', str(source))
+    output.finish()
+    
+    assert output.skipped == ['svg/layer.svg']
+    assert output.removed == ['svg/old.svg']
+    assert not (site / 'svg' / 'old.svg').exists()
+    assert (site / 'CNAME').exists()
+
+def test_precompressed_siblings(output_dir):
+    """Test that text assets get gzip siblings that decode to the original."""
+    import gzip
+    generate_static_site(output_dir=output_dir, workers=2)
+    
+    with open(os.path.join(output_dir, 'index.html'), 'rb') as f:
+        html = f.read()
+    with open(os.path.join(output_dir, 'index.html.gz'), 'rb') as f:
+        assert gzip.decompress(f.read()) == html
+    # Images are never precompressed
+    assert not any(name.endswith('.png.gz') for name in os.listdir(os.path.join(output_dir, 'static')))
+
+def test_size_budget_failure(output_dir):
+    """Test that exceeding a size budget fails the build."""
+    from precompress import SizeBudgetError
+    with pytest.raises(SizeBudgetError):
+        generate_static_site(output_dir=output_dir, budgets={'total': None, 'files': {'svg/*.svg': 10}})
+
+def test_default_build_meets_the_default_budgets(output_dir):
+    """Test that the build the deploy workflow runs passes size_budgets.json."""
+    from generate_static_site import DEFAULT_BUDGETS_PATH
+    from precompress import load_budgets
+    generate_static_site(output_dir=output_dir, budgets=load_budgets(DEFAULT_BUDGETS_PATH))
+
+def test_budgets_use_the_most_specific_pattern_and_loaded_files(output_dir):
+    """Test that a specific pattern overrides a broad one and the total skips unreferenced copies."""
+    from precompress import budget_for, check_budgets, loaded_files, transfer_sizes
+    output = generate_static_site(output_dir=output_dir, budgets={'total': None, 'files': {'*.svg': 10,
+                                                                                           'svg/*.svg': 100000}})
+    assert budget_for('svg/compose/a.svg', {'svg/*.svg': 1, 'svg/compose/*.svg': 2}) == ('svg/compose/*.svg', 2)
+    
+    with open(os.path.join(output_dir, 'asset-manifest.json')) as f:
+        manifest = json.load(f)
+    loaded = loaded_files(output)
+    assert set(manifest.values()) <= loaded
+    assert not set(manifest) & loaded
+    assert {'index.html', 'service-worker.js', 'api/layers/systems-layer/elements.json',
+            'svg/compose/base.svg'} <= loaded
+    
+    sizes = transfer_sizes(output)
+    check_budgets(output, {'total': sum(sizes[relpath] for relpath in loaded), 'files': {}})
+
+def test_chapter_pages_are_prerendered(output_dir):
+    """Test that every chapter gets a page with its layers visible and inlined."""
+    from site_data import CHAPTERS, LAYERS
+    generate_static_site(output_dir=output_dir, workers=2)
+    
+    for chapter in CHAPTERS:
+        with open(os.path.join(output_dir, 'chapters', chapter['preset'], 'index.html')) as f:
+            html = f.read()
+        assert f'data-preset="{chapter["preset"]}"' in html
+        assert chapter['description'] in html
+        inlined = re.findall(r'<svg[^>]* id="([a-z-]+)-svg" class="svg-layer"', html)
+        assert inlined == [layer['id'] for layer in LAYERS if layer['id'] in chapter['layers']]
+        # The preset buttons load the composed SVGs at the app's paths, relative to <base href>
+        assert f'"url":"svg/compose/{chapter["preset"]}.svg"' in html
+        assert os.path.exists(os.path.join(output_dir, 'svg', 'compose', f'{chapter["preset"]}.svg'))
+    
+    with open(os.path.join(output_dir, 'chapters', 'css-design', 'index.html')) as f:
+        html = f.read()
+    assert re.search(r'class="toggle-btn active"\s*data-layer="css-design-layer"', html)
+    assert re.search(r'class="preset-btn active"\s*data-preset="css-design"', html)
+
+def test_index_inlines_default_layers(output_dir):
+    """Test that the generated index page inlines the default layers and defers the rest."""
+    generate_static_site(output_dir=output_dir, precompress=False, workers=1)
+    
+    with open(os.path.join(output_dir, 'index.html')) as f:
+        html = f.read()
+    inlined = re.findall(r'<svg[^>]* id="([a-z-]+)-svg" class="svg-layer"', html)
+    assert inlined == ['environment-layer', 'house-structure']
+    assert '<link rel="preload"' not in html
+    assert re.search(r'"systems-layer":\{"inline":false,"url":"svg/systems-layer\.[0-9a-f]{8}\.svg"\}', html)
+
+def test_pages_are_minified_with_social_image(output_dir):
+    """Test that pages are minified and their social cards name the copied preview image."""
+    generate_static_site(output_dir=output_dir, precompress=False, workers=1)
+    
+    with open(os.path.join(output_dir, 'index.html')) as f:
+        html = f.read()
+    assert '<!--' not in html
+    assert html.count('<base href=') == 1
+    with open(os.path.join(output_dir, 'image-manifest.json')) as f:
+        images = json.load(f)
+    preview = 'houseCodePrints_02.png' if 'static/houseCodePrints_02.png' in images else 'house-preview.png'
+    assert f'static/{preview}' in images
+    assert re.search(rf'property="og:image" content="https://[^"]+/static/{re.escape(preview)}"', html)
+    assert re.search(rf'property="twitter:image" content="https://[^"]+/static/{re.escape(preview)}"', html)
+
+def test_fingerprinted_assets_and_manifest(output_dir):
+    """Test that fingerprinted copies match the manifest and the page uses them."""
+    import json
+    generate_static_site(output_dir=output_dir, precompress=False)
+    
+    with open(os.path.join(output_dir, 'asset-manifest.json')) as f:
+        manifest = json.load(f)
+    with open(os.path.join(output_dir, 'index.html')) as f:
+        html = f.read()
+    
+    for plain, fingerprinted in manifest.items():
+        with open(os.path.join(output_dir, plain), 'rb') as a, open(os.path.join(output_dir, fingerprinted), 'rb') as b:
+            assert a.read() == b.read()
+    assert manifest['svg/house-structure.svg'] in html
+
+def test_site_variants_share_assets(tmp_path):
+    """Test that a batch build gives each site its own base href and hardlinks one set of assets."""
+    sites_file = tmp_path / 'sites.json'
+    sites_file.write_text(json.dumps({'sites': [
+        {'github_username': 'alice', 'repo_name': 'house'},
+        {'github_username': 'bob', 'repo_name': 'house', 'github_pages_url': 'https://bob.example',
+         'output_dir': 'bob-site'}
+    ]}))
+    root = tmp_path / 'sites'
+    sites = load_site_configs(str(sites_file))
+    outputs = generate_site_variants(sites, output_root=str(root), workers=2)
+    
+    assert sorted(outputs) == ['alice/house', 'bob-site']
+    alice, bob = root / 'alice' / 'house', root / 'bob-site'
+    assert '<base href="https://alice.github.io/house/">' in (alice / 'index.html').read_text()
+    assert '<base href="https://bob.example/">' in (bob / 'chapters' / 'backend' / 'index.html').read_text()
+    assert (bob / 'index.html.gz').exists()
+    
+    for relpath, record in outputs['bob-site'].files.items():
+        if relpath.startswith('svg/') and relpath.endswith('.svg'):
+            inodes = {os.stat(site / relpath).st_ino for site in (alice, bob, root / '_shared')}
+            assert len(inodes) == 1, relpath
+    
+    outputs = generate_site_variants(sites, output_root=str(root), incremental=True)
+    assert all(output.written == [] for output in outputs.values())
+
+def test_site_variants_compress_each_page_body_once(tmp_path, monkeypatch):
+    """Test that sites with the same URLs share compression work and a profile covers every site."""
+    import generate_static_site as generator
+    from build_profile import BuildProfile
+    from precompress import COMPRESSION_SETTINGS, compress_variants
+    from site_data import CHAPTERS
+    compressed = []
+    def counting_compress_bodies(bodies, workers=None):
+        compressed.extend(bodies)
+        return [compress_variants(body) for body in bodies]
+    monkeypatch.setattr(generator, 'compress_bodies', counting_compress_bodies)
+    
+    github = generator.github_config('alice', 'house', 'https://alice.example')
+    profile = BuildProfile()
+    generate_site_variants([('a', github), ('b', github)], output_root=str(tmp_path), workers=1, profile=profile)
+    
+    # One set of pages and one service worker for both sites; index.html is the base chapter's page
+    assert len(compressed) == len(set(compressed)) == len(CHAPTERS) + 1
+    assert (tmp_path / 'a' / 'index.html.gz').read_bytes() == (tmp_path / 'b' / 'index.html.gz').read_bytes()
+    stages = {record['name']: record for record in profile.stages}
+    assert stages['render']['outputs_written'] == 2 * (len(CHAPTERS) + 1)
+    assert stages['page_precompress']['outputs_written'] == 2 * len(COMPRESSION_SETTINGS) * (len(CHAPTERS) + 2)
+
+def test_site_configs_are_validated(tmp_path):
+    """Test that unusable site lists are rejected before anything is built."""
+    sites_file = tmp_path / 'sites.json'
+    for sites in ([{'github_username': 'alice'}],
+                  [{'github_username': 'alice', 'repo_name': 'house', 'output_dir': '../outside'}],
+                  [{'github_username': 'alice', 'repo_name': 'house'}] * 2):
+        sites_file.write_text(json.dumps(sites))
+        with pytest.raises(ValueError):
+            load_site_configs(str(sites_file))
+
+def test_element_indexes_match_the_app(output_dir):
+    """Test that the build writes the same element index the app serves."""
+    import app as app_module
+    generate_static_site(output_dir=output_dir)
+    with open(os.path.join(output_dir, 'api', 'layers', 'systems-layer', 'elements.json'), 'rb') as f:
+        assert f.read() == app_module.LAYER_ELEMENT_INDEXES['systems-layer'][0]
+
+def test_build_profile_reports_each_stage(output_dir, tmp_path):
+    """Test that a profiled build measures every stage and dumps the slowest one's stats."""
+    import pstats
+    from build_profile import BuildProfile
+    profile = BuildProfile(cprofile=True)
+    generate_static_site(output_dir=output_dir, workers=1, profile=profile)
+    
+    report = json.loads(json.dumps(profile.report(output_dir=output_dir)))
+    stages = {record['name']: record for record in report['stages']}
+    assert list(stages) == ['svg', 'compose', 'fingerprint', 'element_index', 'images', 'render', 'service_worker',
+                            'precompress', 'finish']
+    assert stages['render']['outputs_written'] == 7
+    assert stages['render']['jinja_s'] > 0 and stages['render']['postprocess_s'] > 0
+    assert all(record['wall_s'] >= 0 and record['peak_rss_kb'] > 0 for record in stages.values())
+    assert report['totals']['output_bytes'] == sum(record['output_bytes'] for record in stages.values())
+    
+    stats_path = str(tmp_path / 'slowest.pstats')
+    assert profile.dump_slowest(stats_path) == report['slowest_stage']
+    assert pstats.Stats(stats_path).total_calls > 0
+
+def test_service_worker_precaches_the_build(output_dir):
+    """Test that the pages register a worker whose precache list follows content hashes."""
+    import app as app_module
+    generate_static_site(output_dir=output_dir)
+    with open(os.path.join(output_dir, 'service-worker.js')) as f:
+        script = f.read()
+    with open(os.path.join(output_dir, 'asset-manifest.json')) as f:
+        manifest = json.load(f)
+    with open(os.path.join(output_dir, 'chapters', 'backend', 'index.html')) as f:
+        assert 'serviceWorker.register("service-worker.js")' in f.read()
+    assert b'serviceWorker' not in app_module.app.test_client().get('/').data
+    
+    precache = {entry['url']: entry for entry in json.loads(re.search(r'const PRECACHE = (.*);', script).group(1))}
+    assert all(precache[fingerprinted]['hashed'] for fingerprinted in manifest.values())
+    assert not precache['index.html']['hashed']
+    assert 'api/layers/systems-layer/elements.json' in precache
+    assert not any(url.endswith(('.gz', '.br')) or url in manifest for url in precache)
+    
+    # Only entries whose content changed get a new revision
+    from service_worker import precache_entries
+    files = dict(BuildOutput(output_dir, incremental=True).previous_files)
+    files['chapters/base/index.html'] = dict(files['chapters/base/index.html'], sha256='0' * 64)
+    revisions = {entry['url']: entry['revision'] for entry in precache_entries(files, 'unused.png')}
+    assert revisions['chapters/base/index.html'] != precache['chapters/base/index.html']['revision']
+    assert revisions['index.html'] == precache['index.html']['revision']
@@ -0,0 +1,43 @@
+from svg_index import element_index, path_points
+
+def test_index_lists_hierarchy_ids_classes_and_text():
+    """Test that drawn elements are listed depth first with their parents, names and labels."""
+    svg = '''<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 800 600">
+      <defs><linearGradient id="sky"><stop offset="0"/></linearGradient></defs>
+      <g id="pipes" class="system water" font-size="10">
+        <rect x="10" y="20" width="30" height="40"><animate attributeName="opacity" values="0;1"/></rect>
+        <text x="100" y="50" text-anchor="middle"> API
+          server </text>
+      </g>
+    </svg>'''
+    index = element_index('systems-layer', svg.encode())
+    
+    assert index['layer'] == 'systems-layer'
+    assert index['viewBox'] == [0, 0, 800, 600]
+    group, rect, text = index['elements']
+    assert (group['id'], group['classes'], group['parent'], group['depth']) == ('pipes', ['system', 'water'], None, 0)
+    assert (rect['tag'], rect['parent'], rect['bbox']) == ('rect', 0, [10, 20, 30, 40])
+    assert text['text'] == 'API server'
+    # 10 characters of 10px text centred on x=100, from the ascent to the descent
+    assert text['bbox'] == [70, 42, 60, 10]
+    assert group['bbox'] == [10, 20, 120, 40]
+    assert index['bbox'] == group['bbox']
+
+def test_bounding_boxes_follow_transforms():
+    """Test that transforms on groups and shapes are applied to the boxes."""
+    svg = '''<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 100 100">
+      <g transform="translate(10, 5) scale(2)">
+        <circle cx="5" cy="5" r="5"/>
+        <line x1="0" y1="0" x2="10" y2="0" transform="rotate(90)"/>
+      </g>
+    </svg>'''
+    group, circle, line = element_index('layer', svg.encode())['elements']
+    assert circle['bbox'] == [10, 5, 20, 20]
+    assert line['bbox'] == [10, 5, 0, 20]
+    assert group['bbox'] == [10, 5, 20, 20]
+
+def test_path_points_handle_relative_commands():
+    """Test that relative, horizontal/vertical and curve commands resolve to absolute points."""
+    assert path_points('M580,215 l0,10') == [(580, 215), (580, 225)]
+    assert path_points('m10 10 h5 v5 z L0 0') == [(10, 10), (15, 10), (15, 15), (0, 0)]
+    assert path_points('M0 0 C 0 10 20 10 20 0') == [(0, 0), (0, 10), (20, 10), (20, 0)]
@@ -0,0 +1,81 @@
+import xml.etree.ElementTree as ET
+from svg_optimize import format_number, optimize_svg
+
+def test_strips_comments_and_whitespace():
+    """Test that comments and formatting whitespace are removed."""
+    svg = '''<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 800 600">
+      <!-- Foundation -->
+      <rect x="200" y="350" width="400" height="50" fill="#8D6E63"/>
+    </svg>'''
+    assert optimize_svg(svg) == (b'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 800 600">'
+                                 b'<rect x="200" y="350" width="400" height="50" fill="#8D6E63"/></svg>')
+
+def test_rounds_numbers():
+    """Test that geometry numbers are rounded to the requested precision."""
+    assert format_number('367.5') == '367.5'
+    assert format_number('0.333333') == '.33'
+    assert format_number('-0.001') == '0'
+    assert format_number('1.0') == '1'
+    svg = '<svg xmlns="http://www.w3.org/2000/svg"><path d="M10.123456-5.5 L0.499 3"/></svg>'
+    assert b'd="M10.12-5.5 L.5 3"' in optimize_svg(svg)
+    assert b'd="M10.1-5.5 L.5 3"' in optimize_svg(svg, precision=1)
+
+def test_drops_defaults_only_when_not_inherited():
+    """Test that default attributes are dropped unless an ancestor overrides them."""
+    svg = '''<svg xmlns="http://www.w3.org/2000/svg">
+      <rect x="0" y="0" width="10" height="10" opacity="1" stroke-width="1"/>
+      <g id="outlines" stroke-width="2"><rect width="5" height="5" stroke-width="1"/></g>
+    </svg>'''
+    root = ET.fromstring(optimize_svg(svg))
+    plain, group = list(root)
+    assert plain.attrib == {'width': '10', 'height': '10'}
+    assert group[0].get('stroke-width') == '1'
+
+def test_keeps_defaults_under_styled_or_referenced_ancestors():
+    """Test that defaults survive an ancestor's style, a <use> reference or a style sheet."""
+    svg = '''<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink">
+      <g id="styled" style="stroke-width: 3; fill:red"><rect width="1" height="1" stroke-width="1" fill="black"/></g>
+      <rect id="stamp" width="1" height="1" fill="#000"/>
+      <g fill="blue"><rect id="tile" width="2" height="2"/></g>
+      <use xlink:href="#stamp" fill="green"/>
+      <use href="#tile"/>
+    </svg>'''
+    root = ET.fromstring(optimize_svg(svg))
+    styled, stamp, wrapper = list(root)[:3]
+    assert styled[0].get('stroke-width') == '1' and styled[0].get('fill') == 'black'
+    assert stamp.get('fill') == '#000'
+    # Hoisting blue onto the tile would recolor the <use> of it
+    assert wrapper.get('fill') == 'blue' and 'fill' not in wrapper[0].attrib
+    
+    sheet = '''<svg xmlns="http://www.w3.org/2000/svg"><style>.thick { stroke-width: 3 }</style>
+      <g><g class="thick"><rect width="1" height="1" stroke-width="1"/></g></g>
+    </svg>'''
+    root = ET.fromstring(optimize_svg(sheet))
+    assert root[1][0][0].get('stroke-width') == '1'
+
+def test_keeps_style_and_script_text():
+    """Test that style sheets and scripts are left exactly as written."""
+    script = "\n  // hide the label\n  document.querySelector('text').remove();\n"
+    style = "\n  rect {\n    fill: red;   /* brand */\n  }\n"
+    svg = f'''<svg xmlns="http://www.w3.org/2000/svg"><style>{style}</style>
+      <script>{script}</script></svg>'''
+    root = ET.fromstring(optimize_svg(svg))
+    assert root[0].text == style
+    assert root[1].text == script
+
+def test_collapses_redundant_groups():
+    """Test that empty groups are unwrapped and single-child styling is hoisted."""
+    svg = '''<svg xmlns="http://www.w3.org/2000/svg">
+      <g><g><circle r="5"/></g></g>
+      <g opacity="0.5"><rect width="1" height="1"/></g>
+      <g id="kept"><rect width="1" height="1"/></g>
+    </svg>'''
+    root = ET.fromstring(optimize_svg(svg))
+    tags = [child.tag.rsplit('}', 1)[-1] for child in root]
+    assert tags == ['circle', 'rect', 'g']
+    assert root[1].get('opacity') == '.5'
+
+def test_keeps_text_content():
+    """Test that text labels survive with their whitespace collapsed."""
+    svg = '<svg xmlns="http://www.w3.org/2000/svg"><text x="1">\n   &lt;div   class="x"&gt;\n </text></svg>'
+    assert b'<text x="1">&lt;div class="x"&gt;</text>' in optimize_svg(svg)
@@ -0,0 +1,43 @@
+import os
+from jinja2 import Environment
+from template_cache import precompile, template_environment
+
+def test_generator_and_app_share_compiled_templates(tmp_path, monkeypatch):
+    """Test that a template compiled by the generator is loaded, not recompiled, by Flask."""
+    import app as app_module
+    cache_dir = str(tmp_path / 'cache')
+    assert precompile(cache_dir=cache_dir) == ['index.html', 'service-worker.js']
+    assert len(os.listdir(cache_dir)) == 2
+    
+    compiled = []
+    original_compile = Environment.compile
+    def counting_compile(self, *args, **kwargs):
+        compiled.append(args)
+        return original_compile(self, *args, **kwargs)
+    monkeypatch.setattr(Environment, 'compile', counting_compile)
+    
+    flask_env = app_module.app.create_jinja_environment()
+    flask_env.bytecode_cache = template_environment(cache_dir=cache_dir).bytecode_cache
+    flask_env.get_template('index.html')
+    assert compiled == []
+    assert len(os.listdir(cache_dir)) == 2
+
+def test_edited_template_is_recompiled(tmp_path):
+    """Test that cache entries are checked against the template source."""
+    templates = tmp_path / 'templates'
+    templates.mkdir()
+    (templates / 'page.html').write_text('{{ name }} v1')
+    cache_dir = str(tmp_path / 'cache')
+    assert template_environment(str(templates), cache_dir).get_template('page.html').render(name='a') == 'a v1'
+    
+    (templates / 'page.html').write_text('{{ name }} v2')
+    assert template_environment(str(templates), cache_dir).get_template('page.html').render(name='<a>') == '&lt;a&gt; v2'
+
+def test_unwritable_cache_still_renders(tmp_path):
+    """Test that a cache directory that can't be written to only costs a compile."""
+    templates = tmp_path / 'templates'
+    templates.mkdir()
+    (templates / 'page.html').write_text('ok')
+    env = template_environment(str(templates), str(tmp_path / 'cache'))
+    env.bytecode_cache.directory = str(tmp_path / 'missing')
+    assert env.get_template('page.html').render() == 'ok'
@@ -0,0 +1,59 @@
+import shutil
+import threading
+import pytest
+import generate_static_site as generator
+from watch import PollingWatcher, make_watcher, wait_for_changes
+
+class ScriptedWatcher:
+    """Watcher returning a fixed sequence of change sets."""
+    def __init__(self, batches):
+        self.batches = list(batches)
+    
+    def wait(self, timeout=None):
+        return self.batches.pop(0) if self.batches else set()
+
+def test_polling_watcher_reports_changes(tmp_path):
+    """Test that the polling fallback notices modified and new files."""
+    (tmp_path / 'layer.svg').write_text('<svg/>')
+    watcher = PollingWatcher([str(tmp_path)], interval=0.01)
+    assert watcher.wait(0.05) == set()
+    
+    (tmp_path / 'layer.svg').write_text('<svg><rect/></svg>')
+    (tmp_path / 'new.svg').write_text('<svg/>')
+    assert watcher.wait(1.0) == {str(tmp_path / 'layer.svg'), str(tmp_path / 'new.svg')}
+
+def test_inotify_watcher_reports_saved_file(tmp_path):
+    """Test that inotify events arrive for a saved file."""
+    watcher = make_watcher([str(tmp_path)])
+    if watcher.kind != 'inotify':
+        pytest.skip('inotify not available')
+    try:
+        timer = threading.Timer(0.05, (tmp_path / 'index.html').write_text, args=('<html></html>',))
+        timer.start()
+        assert str(tmp_path / 'index.html') in watcher.wait(2.0)
+        timer.join()
+    finally:
+        watcher.close()
+
+def test_wait_for_changes_debounces_bursts():
+    """Test that a burst of events becomes one change set without editor swap files."""
+    watcher = ScriptedWatcher([{'/t/.index.html.swp'}, {'/t/index.html'}, {'/s/a.svg', '/s/a.svg~'}, set()])
+    assert wait_for_changes(watcher, debounce=0.01) == {'/t/index.html', '/s/a.svg'}
+
+def test_svg_edit_rebuilds_only_dependent_outputs(tmp_path, monkeypatch):
+    """Test that an incremental rebuild after one SVG edit leaves unrelated outputs alone."""
+    svg_dir = tmp_path / 'svg'
+    shutil.copytree(generator.SVG_SOURCE_DIRS[0], svg_dir)
+    monkeypatch.setattr(generator, 'SVG_SOURCE_DIRS', [str(svg_dir)])
+    output_dir = str(tmp_path / 'out')
+    generator.generate_static_site(output_dir=output_dir, precompress=False, workers=1)
+    
+    path = svg_dir / 'systems-layer.svg'
+    path.write_text(path.read_text().replace('</svg>', '<rect width="1" height="1"/></svg>'))
+    output = generator.generate_static_site(output_dir=output_dir, incremental=True, precompress=False, workers=1)
+    
+    assert 'svg/systems-layer.svg' in output.written
+    assert 'svg/compose/backend.svg' in output.written
+    assert 'svg/house-structure.svg' not in output.written
+    assert 'svg/compose/base.svg' not in output.written
+    assert not any(relpath.startswith('static/') for relpath in output.written)
@@ -0,0 +1,176 @@
+"""
+File watching for generate_static_site.py --watch.
+
+On Linux the watched directories are monitored with inotify (through
+ctypes, so there is nothing to install); elsewhere, or if inotify is
+unavailable, their modification times are polled. Bursts of events are
+debounced so that an editor saving several files, or one file in several
+steps, triggers a single rebuild.
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+# From <sys/inotify.h>
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+
+# IN_MODIFY fires for every write() call; IN_CLOSE_WRITE once the file is saved
+WATCH_MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+# Editor swap and backup files that never affect the build
+IGNORED_SUFFIXES = ('~', '.swp', '.swx', '.tmp')
+
+class InotifyWatcher:
+    """Watch directories (not recursively) with Linux inotify"""
+
+    kind = 'inotify'
+
+    def __init__(self, directories):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_init1 failed: {os.strerror(errno)}")
+        self._watches = {}
+        for directory in directories:
+            if not os.path.isdir(directory):
+                continue
+            wd = libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                self.close()
+                raise OSError(errno, f"Cannot watch {directory}: {os.strerror(errno)}")
+            self._watches[wd] = directory
+        self.directories = list(self._watches.values())
+
+    def wait(self, timeout=None):
+        """Return the paths changed within ``timeout`` seconds (None waits for the first change)"""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped; treat every directory as changed
+                changed.update(self.directories)
+            elif wd in self._watches and name:
+                changed.add(os.path.join(self._watches[wd], os.fsdecode(name)))
+        return changed
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+class PollingWatcher:
+    """Watch directories by comparing file modification times and sizes"""
+
+    kind = 'polling'
+
+    def __init__(self, directories, interval=0.2):
+        self.directories = [directory for directory in directories if os.path.isdir(directory)]
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self):
+        state = {}
+        for directory in self.directories:
+            try:
+                names = os.listdir(directory)
+            except OSError:
+                continue
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                state[path] = (stat.st_mtime_ns, stat.st_size)
+        return state
+
+    def wait(self, timeout=None):
+        """Return the paths changed within ``timeout`` seconds (None waits for the first change)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            current = self._scan()
+            changed = {path for path in current.keys() | self._snapshot.keys()
+                       if current.get(path) != self._snapshot.get(path)}
+            self._snapshot = current
+            if changed:
+                return changed
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return set()
+                time.sleep(min(self.interval, remaining))
+            else:
+                time.sleep(self.interval)
+
+    def close(self):
+        pass
+
+def make_watcher(directories, polling=False):
+    """An InotifyWatcher where possible, otherwise a PollingWatcher"""
+    if not polling and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(directories)
+        except (OSError, AttributeError):
+            # No libc inotify (or the watch limit is reached): poll instead
+            pass
+    return PollingWatcher(directories)
+
+def is_relevant(path):
+    name = os.path.basename(path)
+    return not name.startswith('.') and not name.endswith(IGNORED_SUFFIXES)
+
+def wait_for_changes(watcher, debounce=0.1, max_delay=1.0):
+    """
+    Block until a relevant file changes, then keep collecting changes until
+    none arrive for ``debounce`` seconds (or ``max_delay`` has passed).
+    Returns the set of changed paths.
+    """
+    changed = set()
+    while not changed:
+        changed = {path for path in watcher.wait(None) if is_relevant(path)}
+
+    first = time.monotonic()
+    while time.monotonic() - first < max_delay:
+        more = {path for path in watcher.wait(debounce) if is_relevant(path)}
+        if not more:
+            break
+        changed |= more
+    return changed
+
+def watch(directories, rebuild, debounce=0.1, polling=False):
+    """Call rebuild(sorted changed paths) after every debounced burst of changes, until Ctrl+C"""
+    watcher = make_watcher(directories, polling=polling)
+    print(f"Watching {', '.join(watcher.directories)} ({watcher.kind}); press Ctrl+C to stop")
+    try:
+        while True:
+            rebuild(sorted(wait_for_changes(watcher, debounce=debounce)))
+    except KeyboardInterrupt:
+        print("Stopped watching")
+    finally:
+        watcher.close()